@@ -0,0 +1,80 @@
+"""
+Per-call cost of parsing and rendering dates.
+
+Compares `parse_flexible_date` with the strptime loop it replaced, Gregorian ->
+Jalali rendering through the `gregorian_to_jalali` memo with plain jdatetime,
+and reports the cost of `parse_deadline` over the natural-date corpus in
+`tests/data/natural_dates.json`.
+
+    python benchmarks/dates.py --rounds 2000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+
+import jdatetime  # noqa: E402
+
+from utils import date_utils  # noqa: E402
+from utils.natural_dates import parse_deadline  # noqa: E402
+
+CORPUS = ROOT_DIR / "tests" / "data" / "natural_dates.json"
+
+
+def strptime_parse(date_str):
+    """The parser before the regex dispatch, kept as the baseline."""
+    cleaned = date_str.strip()
+    try:
+        return jdatetime.datetime.strptime(cleaned, "%Y-%m-%d").togregorian()
+    except Exception:
+        pass
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(cleaned, fmt)
+        except Exception:
+            continue
+    return None
+
+
+def jdatetime_string(dt):
+    """Uncached Gregorian -> Jalali rendering, the baseline of the memo."""
+    return jdatetime.datetime.fromgregorian(datetime=dt).strftime("%Y-%m-%d")
+
+
+def per_call_us(func, items: list, rounds: int) -> float:
+    return timeit.timeit(lambda: [func(item) for item in items], number=rounds) / (rounds * len(items)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+    rounds = args.rounds
+
+    inputs = ["1403-05-20", "1403/05/20", "20.05.2025", "05/01/2025", "not a date"]
+    deadlines = [datetime(2025, 1, day % 28 + 1, day % 24) for day in range(50)]
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    today = datetime.strptime(corpus["today"], "%Y-%m-%d").date()
+    texts = [text for text, _ in corpus["cases"]]
+
+    print(f"{'case':<16} {'before us':>10} {'after us':>9}")
+    for name, before, after, items in (
+        ("parse date", strptime_parse, date_utils.parse_flexible_date, inputs),
+        ("to jalali", jdatetime_string, date_utils.gregorian_to_jalali, deadlines),
+    ):
+        print(f"{name:<16} {per_call_us(before, items, rounds):10.1f} {per_call_us(after, items, rounds):9.1f}")
+    deadline_us = per_call_us(lambda text: parse_deadline(text, today=today), texts, max(rounds // 10, 1))
+    print(f"{'parse deadline':<16} {'':>10} {deadline_us:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Per-update cost of building and serializing the task keyboards.
+
+Compares building the admin task view and the status picker as fresh pydantic
+models (as the handlers did before) with the keyboard factory in
+`handlers.keyboards`, both for a task seen for the first time and for a task
+whose keyboard was rendered before. Serialization is measured the way the bot
+session prepares `reply_markup` and the way the no-op edit check fingerprints it.
+
+    python benchmarks/keyboards.py --rounds 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+
+from aiogram import Bot  # noqa: E402
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+from handlers.keyboards import reset_keyboards  # noqa: E402
+from handlers.task_handlers.edit import STATUS_CHOICES, _status_picker_template, _task_view_template  # noqa: E402
+from middlewares.edits import _markup_fingerprint  # noqa: E402
+from utils.texts import t  # noqa: E402
+
+
+def fresh_task_view(task_id: int) -> InlineKeyboardMarkup:
+    show_type = "view_task"
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=t("btn_back"), callback_data="back"), InlineKeyboardButton(text=t("btn_delete_task"), callback_data=f"delete_task|{task_id}")],
+        [InlineKeyboardButton(text=t("btn_add_user"), callback_data=f"add_user|{task_id}"), InlineKeyboardButton(text=t("btn_remove_users"), callback_data=f"del_users|{task_id}")],
+        [InlineKeyboardButton(text=t("btn_view_assigned"), callback_data=f"view_task_users|{task_id}"), InlineKeyboardButton(text=t("btn_set_deadline"), callback_data=f"edit_end|{task_id}")],
+        [InlineKeyboardButton(text=t("btn_set_group"), callback_data=f"edit_group|{task_id}"), InlineKeyboardButton(text=t("btn_set_topic"), callback_data=f"edit_topic|{task_id}")],
+        [InlineKeyboardButton(text=t("btn_edit_desc"), callback_data=f"edit_desc|{task_id}"), InlineKeyboardButton(text=t("btn_edit_name"), callback_data=f"edit_name|{task_id}")],
+        [InlineKeyboardButton(text=t("btn_add_attachment"), callback_data=f"add_attachment|{task_id}"), InlineKeyboardButton(text=t("btn_get_attachments"), callback_data=f"get_attachments|{task_id}")],
+        [InlineKeyboardButton(text=t("btn_update_status"), callback_data=f"choose_status|{task_id}|{show_type}")],
+    ])
+
+
+def fresh_status_picker(task_id: int, version: int) -> InlineKeyboardMarkup:
+    show_type = "view_task"
+    rows = []
+    for i in range(0, len(STATUS_CHOICES), 2):
+        rows.append([
+            InlineKeyboardButton(text=label, callback_data=f"change_status|{task_id}|{value}|{show_type}|{version}")
+            for value, label in STATUS_CHOICES[i:i+2]
+        ])
+    rows.append([InlineKeyboardButton(text=t("btn_cancel"), callback_data=f"{show_type}|{task_id}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def per_call_us(func, rounds: int) -> float:
+    return timeit.timeit(func, number=rounds) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+    rounds = args.rounds
+    bot = Bot(token="123456:benchmark")
+
+    def serialize(markup):
+        bot.session.prepare_value(markup, bot=bot, files={})
+        _markup_fingerprint(markup)
+
+    counter = iter(range(10**9))
+    cases = {
+        "task view": (
+            lambda: fresh_task_view(42),
+            lambda: _task_view_template(True, "view_task").render(task_id=next(counter)),
+            lambda: _task_view_template(True, "view_task").render(task_id=42),
+        ),
+        "status picker": (
+            lambda: fresh_status_picker(42, 3),
+            lambda: _status_picker_template("view_task").render(task_id=next(counter), version=3),
+            lambda: _status_picker_template("view_task").render(task_id=42, version=3),
+        ),
+    }
+
+    reset_keyboards()
+    print(f"{'keyboard':<14} {'variant':<16} {'build us':>9} {'serialize us':>13} {'total us':>9}")
+    for name, (fresh, first_render, repeat_render) in cases.items():
+        baseline = None
+        for variant, build in (("fresh", fresh), ("factory, new id", first_render), ("factory, cached", repeat_render)):
+            build_us = per_call_us(build, rounds)
+            serialize_us = per_call_us(lambda: serialize(build()), rounds) - build_us
+            total = build_us + serialize_us
+            baseline = baseline or total
+            print(f"{name:<14} {variant:<16} {build_us:9.1f} {serialize_us:13.1f} {total:9.1f}  saved {baseline - total:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
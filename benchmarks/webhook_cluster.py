@@ -0,0 +1,128 @@
+"""
+Local throughput benchmark of the multi-process webhook mode.
+
+Posts synthetic message updates from many chats to a `WebhookCluster` front and
+measures how long the workers need to handle all of them. Each update runs a
+handler that waits `--latency` ms, standing in for a database call or a Bot API
+round-trip, plus optional CPU work for rendering. No Telegram token or network
+access is needed.
+
+    python benchmarks/webhook_cluster.py --updates 2000 --workers 1 2 4
+    python benchmarks/webhook_cluster.py --latency 0 --work 200000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from aiogram import Bot, Dispatcher, Router  # noqa: E402
+from aiogram.types import Message  # noqa: E402
+from aiohttp import ClientSession, web  # noqa: E402
+
+from utils.webhook_cluster import WebhookCluster, consume_updates  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+def run_benchmark_worker(index, updates, done, latency, work, concurrency):
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        # Simulated I/O wait, then CPU work
+        await asyncio.sleep(latency)
+        total = 0
+        for i in range(work):
+            total += i * i
+        with done.get_lock():
+            done.value += 1
+
+    async def run():
+        dp = Dispatcher()
+        dp.include_router(router)
+        bot = Bot(token="123456:benchmark")
+        try:
+            await consume_updates(updates, dp, bot, concurrency=concurrency)
+        finally:
+            await bot.session.close()
+
+    asyncio.run(run())
+
+
+def make_update(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "group", "title": "bench"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "bench"},
+            "text": "hello",
+        },
+    }
+
+
+async def measure(workers: int, total: int, chats: int, latency: float, work: int, concurrency: int) -> float:
+    done = multiprocessing.get_context("spawn").Value("i", 0)
+    cluster = WebhookCluster(
+        run_benchmark_worker,
+        workers=workers,
+        queue_size=total + chats,
+        args=(done, latency, work, concurrency),
+    )
+    app = web.Application()
+    cluster.register(app, path="/webhook")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, PORT).start()
+
+    try:
+        # Warm every chat's worker up before the clock starts
+        async with ClientSession() as session:
+            for chat in range(chats):
+                await session.post(f"http://{HOST}:{PORT}/webhook", data=json.dumps(make_update(0, -chat - 1)))
+            while done.value < chats:
+                await asyncio.sleep(0.05)
+
+            started = time.perf_counter()
+            for update_id in range(1, total + 1):
+                body = json.dumps(make_update(update_id, -(update_id % chats) - 1))
+                async with session.post(f"http://{HOST}:{PORT}/webhook", data=body) as response:
+                    response.raise_for_status()
+            while done.value < total + chats:
+                await asyncio.sleep(0.01)
+            return time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=50, help="simulated I/O wait per update (ms)")
+    parser.add_argument("--work", type=int, default=0, help="loop iterations per update")
+    parser.add_argument("--concurrency", type=int, default=64, help="chats handled at once per worker")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        elapsed = asyncio.run(
+            measure(workers, args.updates, args.chats, args.latency / 1000, args.work, args.concurrency)
+        )
+        rate = args.updates / elapsed
+        baseline = baseline or rate
+        print(f"workers={workers:<3} {rate:8.1f} updates/s  x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
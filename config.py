@@ -16,5 +16,67 @@ class Config:
     BOT_USERNAME = os.getenv("BOT_USERNAME", "my_bot")
     INITIAL_ADMIN_ID = os.getenv("INITIAL_ADMIN_ID")
     INITIAL_ADMIN_USERNAME = os.getenv("INITIAL_ADMIN_USERNAME")
+    # Store for callback payloads that exceed Telegram's 64-byte callback_data limit
+    PAYLOAD_STORE_BACKEND: Literal["memory", "db"] = os.getenv("PAYLOAD_STORE_BACKEND", "memory")
+    PAYLOAD_STORE_MAX_SIZE = int(os.getenv("PAYLOAD_STORE_MAX_SIZE", 10000))
+    PAYLOAD_STORE_TTL = int(os.getenv("PAYLOAD_STORE_TTL", 86400))
+    PAYLOAD_STORE_MAX_BYTES = int(os.getenv("PAYLOAD_STORE_MAX_BYTES", 8 * 1024 * 1024))
+    # How often expired entries are swept out of the in-memory caches (seconds)
+    CACHE_SWEEP_INTERVAL = int(os.getenv("CACHE_SWEEP_INTERVAL", 60))
+    # Where conversation (FSM) state lives; "db" keeps it across restarts and workers
+    FSM_STORAGE: Literal["memory", "db"] = os.getenv("FSM_STORAGE", "memory")
+    FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", 86400))
+    FSM_FLUSH_DELAY = float(os.getenv("FSM_FLUSH_DELAY", 0.05))
+    # Sent by Telegram in every webhook request; requests without it are rejected
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    # Recently handled update ids kept to drop Telegram redeliveries
+    WEBHOOK_SEEN_UPDATES = int(os.getenv("WEBHOOK_SEEN_UPDATES", 10000))
+    # Webhook worker processes; more than 1 routes updates to workers by chat id
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 1))
+    WEBHOOK_WORKER_QUEUE_SIZE = int(os.getenv("WEBHOOK_WORKER_QUEUE_SIZE", 1000))
+    # "queue": answer Telegram at once and handle updates from a bounded queue,
+    # "background": aiogram's default of one unbounded task per update,
+    # "reply": wait for the handler and send its final call in the webhook response
+    WEBHOOK_MODE: Literal["queue", "background", "reply"] = os.getenv("WEBHOOK_MODE", "queue")
+    UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+    # Updates handled at the same time across chats; one chat is always handled in order
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 64))
+    # Consumers of the update queue, each serving one chat lane at a time
+    UPDATE_QUEUE_CONSUMERS = int(os.getenv("UPDATE_QUEUE_CONSUMERS", UPDATE_CONCURRENCY))
+    # Long polling (DEV mode): seconds Telegram holds a getUpdates request, updates per request (1-100)
+    POLLING_TIMEOUT = int(os.getenv("POLLING_TIMEOUT", 30))
+    POLLING_LIMIT = int(os.getenv("POLLING_LIMIT", 100))
+    # Database connection pool (ignored for SQLite)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+    # Updates handled at once; defaults to the pool capacity. Above it callbacks get a
+    # "busy" toast and other updates wait up to ADMISSION_DEADLINE seconds
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", DB_POOL_SIZE + DB_MAX_OVERFLOW))
+    ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", 1000))
+    ADMISSION_DEADLINE = float(os.getenv("ADMISSION_DEADLINE", 10))
+    # Token buckets per user (rate per second, burst); a chat gets THROTTLE_CHAT_FACTOR times more
+    THROTTLE_HEAVY_RATE = float(os.getenv("THROTTLE_HEAVY_RATE", 0.2))
+    THROTTLE_HEAVY_BURST = int(os.getenv("THROTTLE_HEAVY_BURST", 3))
+    THROTTLE_CALLBACK_RATE = float(os.getenv("THROTTLE_CALLBACK_RATE", 3))
+    THROTTLE_CALLBACK_BURST = int(os.getenv("THROTTLE_CALLBACK_BURST", 10))
+    THROTTLE_CHAT_FACTOR = float(os.getenv("THROTTLE_CHAT_FACTOR", 5))
+    THROTTLE_MAX_KEYS = int(os.getenv("THROTTLE_MAX_KEYS", 10000))
+    # Repeated taps on delete/status buttons within this many seconds are ignored
+    CALLBACK_DEDUPE_TTL = float(os.getenv("CALLBACK_DEDUPE_TTL", 5))
+    # Messages whose rendered text/keyboard is remembered to skip no-op edits
+    EDIT_CACHE_SIZE = int(os.getenv("EDIT_CACHE_SIZE", 5000))
+    # Inline mode: Telegram caches each user's answers this many seconds,
+    # the bot keeps each user's last results for narrowing keystrokes
+    INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 30))
+    INLINE_RESULT_TTL = float(os.getenv("INLINE_RESULT_TTL", 15))
+    INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", 2000))
+    # Done tasks are archived (left out of listings) after this many days, 0 disables it;
+    # the job runs every ARCHIVE_INTERVAL seconds, ARCHIVE_BATCH_SIZE tasks per transaction
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+    ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", 3600))
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+    # Seconds the open/overdue counts on group and topic buttons are cached
+    TASK_COUNTS_TTL = float(os.getenv("TASK_COUNTS_TTL", 30))
 
 config = Config()
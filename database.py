@@ -2,7 +2,16 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from config import config
 
-engine = create_engine(config.DATABASE_URL)
+engine_options = {}
+if not config.DATABASE_URL.startswith("sqlite"):
+    # Handlers keep their session for the whole update; AdmissionMiddleware keeps
+    # in-flight updates within this pool
+    engine_options.update(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+    )
+engine = create_engine(config.DATABASE_URL, **engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
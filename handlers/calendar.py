@@ -0,0 +1,92 @@
+from __future__ import annotations
+from datetime import date, datetime
+
+import jdatetime
+from aiogram.types import InlineKeyboardMarkup
+
+from utils.date_utils import JALALI_MONTH_NAMES
+from utils.texts import t
+from .keyboards import KeyboardTemplate, static_keyboard
+
+# Callback data (Jalali dates): cal_pick|<task_id>|<YYYYMMDD>|<version>, cal_nav|<task_id>|<YYYYMM>|<version>,
+# at most ~40 bytes; the version is the task's when the calendar was opened
+CALENDAR_PICK = "cal_pick"
+CALENDAR_NAV = "cal_nav"
+CALENDAR_NOOP = "cal_noop"
+
+# Jalali weeks start on Saturday
+WEEKDAY_HEADER = ("ش", "ی", "د", "س", "چ", "پ", "ج")
+# Navigation outside these years is ignored
+MIN_YEAR, MAX_YEAR = 1300, 1500
+
+
+def _days_in_month(year: int, month: int) -> int:
+    if month < 7:
+        return 31
+    if month < 12:
+        return 30
+    return 30 if jdatetime.date(year, 1, 1).isleap() else 29
+
+
+@static_keyboard
+def _month_template(year: int, month: int) -> KeyboardTemplate:
+    """Grid of one Jalali month; only the task id and version are filled in per message."""
+    prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    rows = [
+        [
+            ("»", f"{CALENDAR_NAV}|{{task_id}}|{prev_year:04d}{prev_month:02d}|{{version}}"),
+            (f"{JALALI_MONTH_NAMES[month - 1]} {year}", CALENDAR_NOOP),
+            ("«", f"{CALENDAR_NAV}|{{task_id}}|{next_year:04d}{next_month:02d}|{{version}}"),
+        ],
+        [(day_name, CALENDAR_NOOP) for day_name in WEEKDAY_HEADER],
+    ]
+
+    # Saturday is weekday() 0 in jdatetime
+    cells = [(" ", CALENDAR_NOOP)] * jdatetime.date(year, month, 1).weekday()
+    cells += [
+        (str(day), f"{CALENDAR_PICK}|{{task_id}}|{year:04d}{month:02d}{day:02d}|{{version}}")
+        for day in range(1, _days_in_month(year, month) + 1)
+    ]
+    cells += [(" ", CALENDAR_NOOP)] * (-len(cells) % 7)
+    rows += [cells[i:i + 7] for i in range(0, len(cells), 7)]
+
+    rows.append([(t("btn_back"), "view_task|{task_id}")])
+    return KeyboardTemplate(f"calendar:{year}:{month}", rows)
+
+
+def calendar_keyboard(
+    task_id: int,
+    version: int,
+    year: int | None = None,
+    month: int | None = None,
+) -> InlineKeyboardMarkup | None:
+    """
+    Jalali month picker for a task's deadline, the current month by default.
+    A pick only applies while the task is still at `version`.
+    Returns None for a month outside the supported range.
+    """
+    if year is None or month is None:
+        today = jdatetime.date.today()
+        year, month = today.year, today.month
+    if not (MIN_YEAR <= year <= MAX_YEAR and 1 <= month <= 12):
+        return None
+    return _month_template(year, month).render(task_id=task_id, version=version)
+
+
+def parse_calendar_month(value: str) -> tuple[int, int] | None:
+    """(year, month) of a `cal_nav` payload (YYYYMM)."""
+    if len(value) != 6 or not value.isdigit():
+        return None
+    return int(value[:4]), int(value[4:])
+
+
+def parse_calendar_day(value: str) -> datetime | None:
+    """Gregorian datetime of a `cal_pick` payload (Jalali YYYYMMDD)."""
+    if len(value) != 8 or not value.isdigit():
+        return None
+    try:
+        picked: date = jdatetime.date(int(value[:4]), int(value[4:6]), int(value[6:])).togregorian()
+    except ValueError:
+        return None
+    return datetime.combine(picked, datetime.min.time())
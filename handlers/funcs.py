@@ -5,7 +5,10 @@ from aiogram import F
 from logger import logger
 import asyncio
 from aiogram.types import Message, CallbackQuery
+from aiogram.methods import TelegramMethod
 from utils.decorators import exception_decorator
+from utils.webhook_reply import current_reply_slot
+from .keyboards import static_keyboard
 
 
 
@@ -38,9 +41,11 @@ def chat_type_filter(chat_type):
 
 
 @exception_decorator
+@static_keyboard
 def get_main_menu_keyboard(chat_type: ChatType, is_admin: bool = False) -> ReplyKeyboardMarkup:
     """
     Generate the main menu keyboard depending on the chat type.
+    Built once per (chat_type, is_admin) and shared afterwards.
     """
 
     keyboards = []
@@ -51,7 +56,7 @@ def get_main_menu_keyboard(chat_type: ChatType, is_admin: bool = False) -> Reply
             keyboards.append(
             [
                 KeyboardButton(text="تسک های من"), 
-
+                KeyboardButton(text="جستجوی تسک"),
             ])
             keyboards.append(
             [
@@ -63,15 +68,15 @@ def get_main_menu_keyboard(chat_type: ChatType, is_admin: bool = False) -> Reply
             keyboards.append(
                 [
                     KeyboardButton(text="تسک های من"),
-
+                    KeyboardButton(text="جستجوی تسک"),
                 ])
 
     else:
         if is_admin:
-            keyboards.append([KeyboardButton(text="مدیریت تسک ها")])
+            keyboards.append([KeyboardButton(text="مدیریت تسک ها"), KeyboardButton(text="جستجوی تسک")])
             keyboards.append([KeyboardButton(text="افزودن تسک"), KeyboardButton(text="مدیریت کاربران")])
         else:
-            keyboards.append([KeyboardButton(text="تسک های من")])
+            keyboards.append([KeyboardButton(text="تسک های من"), KeyboardButton(text="جستجوی تسک")])
 
     keyboard = ReplyKeyboardMarkup(
         keyboard=keyboards,
@@ -83,8 +88,34 @@ def get_main_menu_keyboard(chat_type: ChatType, is_admin: bool = False) -> Reply
     return keyboard
 
 
+# Scheduled deletions, referenced until they finish
+_pending_deletions: set[asyncio.Task] = set()
+
+
+def menu_texts() -> set[str]:
+    """Every text a user can send from the main menu keyboards."""
+    texts = {"commands", "menu"}
+    for chat_type in (ChatType.PRIVATE, ChatType.GROUP):
+        for is_admin in (True, False):
+            keyboard = get_main_menu_keyboard(chat_type, is_admin)
+            texts.update(button.text for row in keyboard.keyboard for button in row)
+    return texts
+
+
 @exception_decorator
 async def del_message(sleep: float = 3.0, *args: Message) -> True | None :
+    """
+    Delete the given messages after `sleep` seconds in the background, so the
+    calling handler (and the chat's update lane) is not held up by the wait.
+    """
+    task = asyncio.create_task(_delete_later(sleep, *args))
+    _pending_deletions.add(task)
+    task.add_done_callback(_pending_deletions.discard)
+    return True
+
+
+@exception_decorator
+async def _delete_later(sleep: float, *args: Message) -> True | None :
     await asyncio.sleep(sleep)
     errors = 0
     for i in args:
@@ -97,3 +128,20 @@ async def del_message(sleep: float = 3.0, *args: Message) -> True | None :
         logger.exception(f"Failed to delete {errors} {"message" if errors == 1 else "messages"} from chat")
 
     return True
+
+
+async def answer_last(method):
+    """
+    Perform the final Bot API call of a handler, e.g. `answer_last(callback_query.answer(...))`.
+
+    With WEBHOOK_MODE=reply the call is sent back inside the webhook response
+    instead of a separate request. Its result is not available to the handler,
+    so only use it for a call nothing else depends on.
+    """
+    slot = current_reply_slot()
+    if slot is None or not isinstance(method, TelegramMethod):
+        return await method
+    if slot.method is not None:
+        # Keep calls in order: the earlier one is no longer the last
+        await slot.method
+    slot.method = method
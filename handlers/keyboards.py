@@ -0,0 +1,62 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Callable, TypeVar
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from utils.cache import TTLCache
+
+BuilderT = TypeVar("BuilderT", bound=Callable)
+
+# aiogram types are frozen, so built keyboards can be shared between updates
+_static_builders: list = []
+_rendered = TTLCache("keyboards", max_size=2048, ttl=3600)
+
+
+def static_keyboard(builder: BuilderT) -> BuilderT:
+    """
+    Memoize a keyboard builder whose result only depends on its arguments,
+    e.g. `(chat_type, is_admin)`. The keyboard is built once per argument set.
+    """
+    cached = lru_cache(maxsize=None)(builder)
+    _static_builders.append(cached)
+    return cached
+
+
+def reset_keyboards():
+    """Forget every memoized keyboard, e.g. after the texts changed."""
+    for builder in _static_builders:
+        builder.cache_clear()
+    _rendered.clear()
+
+
+class KeyboardTemplate:
+    """
+    Inline keyboard with a fixed layout where only ids in callback data vary.
+
+    Rows are given as `(text, callback_data)` pairs; callback data may contain
+    `str.format` placeholders such as `{task_id}`. The skeleton buttons are
+    validated once, `render(**ids)` copies only the buttons with placeholders
+    and reuses the rest. Rendered keyboards are memoized per ids.
+    """
+
+    def __init__(self, name: str, rows: list[list[tuple[str, str]]]):
+        self.name = name
+        self._rows = [
+            [(InlineKeyboardButton(text=text, callback_data=data), "{" in data) for text, data in row]
+            for row in rows
+        ]
+
+    def render(self, **ids) -> InlineKeyboardMarkup:
+        key = (self.name, *sorted(ids.items()))
+        markup = _rendered.get(key)
+        if markup is None:
+            markup = InlineKeyboardMarkup(inline_keyboard=[
+                [
+                    button.model_copy(update={"callback_data": button.callback_data.format(**ids)}) if templated else button
+                    for button, templated in row
+                ]
+                for row in self._rows
+            ])
+            _rendered.set(key, markup)
+        return markup
@@ -1,5 +1,5 @@
 from .. import main_router as router
-from .. import chat_type_filter, get_main_menu_keyboard, del_message
+from .. import chat_type_filter, get_main_menu_keyboard, del_message, answer_last
 from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from aiogram.filters import Command
 from aiogram.enums import ChatType
@@ -336,7 +336,7 @@ async def handle_confirm_submit(callback_query: CallbackQuery, state: FSMContext
             title=title,
         )
         if not task:
-            await callback_query.answer(t("task_create_failed"), show_alert=True)
+            await answer_last(callback_query.answer(t("task_create_failed"), show_alert=True))
             return
 
         keyboard = get_main_menu_keyboard(
@@ -401,7 +401,7 @@ async def handle_confirm_add_more(callback_query: CallbackQuery, state: FSMConte
             title=title,
         )
         if not task:
-            await callback_query.answer(t("task_create_failed"), show_alert=True)
+            await answer_last(callback_query.answer(t("task_create_failed"), show_alert=True))
             return
 
         for msg_id in data.get("message_ids", []):
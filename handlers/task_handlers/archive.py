@@ -0,0 +1,91 @@
+from aiogram import F
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+
+from database import get_db
+from logger import logger
+from services.task_services import TaskService
+from services.user_services import UserService
+from utils.texts import t
+from .. import main_router as router
+from .. import answer_last
+
+ARCHIVE_PAGE_SIZE = 10
+
+
+def _archive_scope(scope: str, is_admin: bool, user_id: int) -> dict:
+    """
+    Filters of an `archived|<scope>|<page>` callback: "all", "g<group_id>",
+    "t<topic_id>" for admins; everyone else only sees their own tasks ("mine").
+    """
+    if not is_admin or scope == "mine":
+        return {"user_id": user_id}
+    if scope[:1] == "t" and scope[1:].isdigit():
+        return {"topic_id": int(scope[1:])}
+    if scope[:1] == "g" and scope[1:].isdigit():
+        return {"group_id": int(scope[1:])}
+    return {}
+
+
+# ====== Archived tasks: 'archived|<scope>|<page>' ======
+@router.callback_query(F.data.startswith("archived|"))
+async def handle_archived_tasks(callback_query: CallbackQuery):
+    db = None
+    try:
+        _, scope, page = callback_query.data.split("|")
+        page = max(int(page), 0)
+
+        db = next(get_db())
+        user = UserService.get_user(
+            db=db,
+            user_tID=str(callback_query.from_user.id),
+            username=callback_query.from_user.username,
+        )
+        if not user:
+            await answer_last(callback_query.answer(t("search_not_registered"), show_alert=True))
+            return
+        is_admin = bool(user.is_admin)
+
+        tasks = TaskService.get_archived_tasks(
+            db=db,
+            **_archive_scope(scope, is_admin, user.id),
+            # One extra row tells whether there is a next page
+            limit=ARCHIVE_PAGE_SIZE + 1,
+            offset=page * ARCHIVE_PAGE_SIZE,
+        )
+        if not tasks:
+            await answer_last(callback_query.answer(t("archived_tasks_none"), show_alert=True))
+            return
+
+        show_type = "view_task" if is_admin and scope != "mine" else "show_task"
+        rows = [
+            [InlineKeyboardButton(text=task.title, callback_data=f"{show_type}|{task.id}")]
+            for task in tasks[:ARCHIVE_PAGE_SIZE]
+        ]
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton(text=t("btn_prev_page"), callback_data=f"archived|{scope}|{page - 1}"))
+        if len(tasks) > ARCHIVE_PAGE_SIZE:
+            nav.append(InlineKeyboardButton(text=t("btn_next_page"), callback_data=f"archived|{scope}|{page + 1}"))
+        if nav:
+            rows.append(nav)
+        rows.append([InlineKeyboardButton(text=t("btn_back"), callback_data="back_show" if show_type == "show_task" else "back")])
+
+        await callback_query.message.edit_text(
+            t("archived_tasks_title", page=page + 1),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=rows)
+        )
+        await callback_query.answer()
+
+    except Exception:
+        logger.exception("Unexpected error occurred in handle_archived_tasks")
+        try:
+            await callback_query.answer(t("generic_error"))
+        except Exception:
+            logger.exception("Failed to send error message")
+
+    finally:
+        if db is not None:
+            try:
+                db.close()
+            except Exception:
+                logger.exception("Failed to close DB session in handle_archived_tasks")
@@ -1,6 +1,8 @@
 from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from aiogram.filters import Command
-from .. import admin_require, del_message, get_callback, chat_type_filter
+from .. import admin_require, del_message, get_callback, chat_type_filter, answer_last
+from ..keyboards import KeyboardTemplate, static_keyboard
+from ..calendar import CALENDAR_NAV, CALENDAR_NOOP, CALENDAR_PICK, calendar_keyboard, parse_calendar_day, parse_calendar_month
 from .. import main_router as router
 from database import get_db
 from aiogram.enums import ChatType
@@ -16,12 +18,13 @@ import asyncio
 import datetime
 from aiogram.exceptions import TelegramBadRequest
 import re
-import uuid
+from types import SimpleNamespace
 from config import config
-from utils.date_utils import gregorian_to_jalali, jalali_to_gregorian, is_future_date, parse_flexible_date
+from utils.date_utils import gregorian_to_jalali, is_future_date
+from utils.natural_dates import parse_deadline
+from utils.payload_store import payload_store
 from utils.texts import t
 
-media_cache = {}
 INLINE_COMMAND_ACTIONS = {
     "add_task": ("add", "افزودن تسک"),
     "assign_user": ("user", "تخصیص کاربر"),
@@ -29,6 +32,7 @@ INLINE_COMMAND_ACTIONS = {
     "desc": ("desc", "تغییر شرح"),
     "deadline": ("time", "تغییر ددلاین"),
     "attach": ("attach", "افزودن پیوست"),
+    "search": ("search", "جستجوی تسک"),
 }
 
 
@@ -46,6 +50,7 @@ async def _is_user_in_chat(bot, chat_id: int, telegram_user_id: int) -> bool:
         return False
 
 
+@static_keyboard
 def _build_teledo_keyboard(is_admin: bool) -> InlineKeyboardMarkup:
     """
     Build the Teledo menu keyboard.
@@ -70,6 +75,7 @@ def _build_teledo_keyboard(is_admin: bool) -> InlineKeyboardMarkup:
         ])
 
     rows.append([InlineKeyboardButton(text="تسک های من", callback_data="teledo|my_tasks")])
+    rows.append([_inline_cmd_button("search")])
     rows.append([InlineKeyboardButton(text="لغو", callback_data="teledo|cancel")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
@@ -175,22 +181,66 @@ def chunk_list(lst:list, chunk_size: int) -> List[List] | None:
     return [lst[i:i + chunk_size] for i in range(0, len(lst), chunk_size)]
 
 
+# Task listing filters travel in callback data as "<status>[s]": the status chip
+# ("a" for all) and "s" when sorted by deadline, e.g. "ps" = pending by deadline
+LIST_STATUS_FILTERS = {"a": None, "p": "pending", "i": "in_progress", "b": "blocked", "d": "done"}
+DEFAULT_LIST_FILTER = "a"
+
+
+def parse_list_filter(value: str | None) -> Tuple[str, str | None, str | None]:
+    """(normalized filter, status, sort) of a listing filter; unknown values mean all tasks."""
+    value = value or DEFAULT_LIST_FILTER
+    key, by_deadline = value[:1], value[1:] == "s"
+    if key not in LIST_STATUS_FILTERS or value[1:] not in ("", "s"):
+        return DEFAULT_LIST_FILTER, None, None
+    return value, LIST_STATUS_FILTERS[key], "deadline" if by_deadline else None
+
+
+@static_keyboard
+def _filter_chips_template(list_filter: str) -> KeyboardTemplate:
+    """Status chips and the deadline sort toggle; `{target}` is the listing's callback prefix."""
+    key, by_deadline = list_filter[:1], list_filter[1:] == "s"
+    sort_flag = "s" if by_deadline else ""
+    status_labels = dict(STATUS_CHOICES)
+    labels = {k: status_labels[status] if status else t("chip_all") for k, status in LIST_STATUS_FILTERS.items()}
+    chips = [(("• " if k == key else "") + labels[k], f"{{target}}|{k}{sort_flag}") for k in LIST_STATUS_FILTERS]
+    sort = [(("• " if by_deadline else "") + t("chip_sort_deadline"), f"{{target}}|{key}{'' if by_deadline else 's'}")]
+    return KeyboardTemplate(f"filter_chips:{list_filter}", [chips[:3], chips[3:] + sort])
+
+
+def filter_chip_rows(target: str, list_filter: str) -> list:
+    return _filter_chips_template(list_filter).render(target=target).inline_keyboard
+
+
+def counted_label(name: str, counts: dict | None, place_id: int | None) -> str:
+    """A group/topic button text with its open and overdue task counts, if any."""
+    place = (counts or {}).get(place_id)
+    if not place:
+        return name
+    if place.overdue:
+        return t("nav_counts_overdue", name=name, open=place.open, overdue=place.overdue)
+    return t("nav_counts", name=name, open=place.open)
+
+
 def task_manage_keyboard(
     db,
     group_id: int | None = None,
     topic_id: int | None = None,
     group_name: str | None = None,
     topic_name: str | None = None,
+    list_filter: str | None = None,
 ) -> Tuple[List[str], InlineKeyboardMarkup]:
     text = []
     keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+    list_filter, status, sort = parse_list_filter(list_filter)
     
     # If we are inside a specific topic, only show tasks from that topic.
     if topic_id is not None:
-        tasks = TaskService.get_all_tasks(db=db, topic_id=topic_id) or []
+        tasks = TaskService.get_all_tasks(db=db, topic_id=topic_id, status=status, sort=sort) or []
         title = f"تسک های تاپیک {topic_name}" if topic_name else "تسک های این تاپیک"
         text.append(title)
         text.append(f"تعداد: {len(tasks)}")
+        keyboard.inline_keyboard.extend(filter_chip_rows(f"view_topic|{topic_id}", list_filter))
         keyboard.inline_keyboard.extend(
             [
                 [InlineKeyboardButton(text=task.title, callback_data=f"view_task|{task.id}") for task in chunk]
@@ -203,24 +253,26 @@ def task_manage_keyboard(
     if group_id is not None:
         topics = TaskService.get_all_topics(db=db, group_id=group_id) or []
         if topics:
+            counts = TaskService.get_task_counts(db=db, by="topic", group_id=group_id)
             text.append(f"تاپیک های گروه {group_name}" if group_name else "تاپیک های گروه")
             text.append(f"تعداد: {len(topics)}")
             keyboard.inline_keyboard.extend(
                 [
-                    [InlineKeyboardButton(text=tp.name, callback_data=f"view_topic|{tp.id}") for tp in chunk]
+                    [InlineKeyboardButton(text=counted_label(tp.name, counts, tp.id), callback_data=f"view_topic|{tp.id}") for tp in chunk]
                     for chunk in chunk_list(topics, 2) or []
                 ]
             )
             keyboard.inline_keyboard.append(
                 [
                     InlineKeyboardButton(text="باز گشت 🔙", callback_data="back"),
-                    InlineKeyboardButton(text="سایر ...", callback_data=f"view_topic|OTHER|{group_id}"),
+                    InlineKeyboardButton(text=counted_label("سایر ...", counts, None), callback_data=f"view_topic|OTHER|{group_id}"),
                 ]
             )
         else:
-            tasks = TaskService.get_all_tasks(db=db, group_id=group_id) or []
+            tasks = TaskService.get_all_tasks(db=db, group_id=group_id, status=status, sort=sort) or []
             text.append(f"تسک های گروه {group_name}" if group_name else "تسک های گروه")
             text.append(f"تعداد: {len(tasks)}")
+            keyboard.inline_keyboard.extend(filter_chip_rows(f"view_group|{group_id}", list_filter))
             keyboard.inline_keyboard.extend(
                 [
                     [InlineKeyboardButton(text=task.title, callback_data=f"view_task|{task.id}") for task in chunk]
@@ -233,9 +285,11 @@ def task_manage_keyboard(
     groups = TaskService.get_all_groups(db=db)
     if not groups:
         text.append("⚠️ هیچ گروهی برای نمایش وجود ندارد ⚠️")
-        tasks = TaskService.get_all_tasks(db=db) or []
-        if tasks:
+        tasks = TaskService.get_all_tasks(db=db, status=status, sort=sort) or []
+        if tasks or status:
             text.append(f"تسک ها : \n تعداد: {len(tasks)}")
+            # Without groups every task is group-less, listed by view_group|OTHER
+            keyboard.inline_keyboard.extend(filter_chip_rows("view_group|OTHER", list_filter))
             keyboard.inline_keyboard.extend(
                 [
                     [InlineKeyboardButton(text=task.title, callback_data=f"view_task|{task.id}") for task in chunk]
@@ -244,15 +298,17 @@ def task_manage_keyboard(
             )
         return text, keyboard
 
+    # One grouped count for every group button instead of a listing per group
+    counts = TaskService.get_task_counts(db=db, by="group")
     text.append(f"گروه ها : \n تعداد: {len(groups)}")
     keyboard.inline_keyboard.extend(
         [
-            [InlineKeyboardButton(text=b.name, callback_data=f"view_group|{b.id}") for b in c]
+            [InlineKeyboardButton(text=counted_label(b.name, counts, b.id), callback_data=f"view_group|{b.id}") for b in c]
             for c in chunk_list(groups, 2)
         ]
     )
     keyboard.inline_keyboard.append(
-        [InlineKeyboardButton(text="سایر ...", callback_data=f"view_group|OTHER")]
+        [InlineKeyboardButton(text=counted_label("سایر ...", counts, None), callback_data=f"view_group|OTHER")]
     )
 
     return text, keyboard
@@ -266,9 +322,11 @@ async def handle_view_group_tasks(callback_query: CallbackQuery):
         # Get database session
         db = next(get_db())
 
-        # Extract group's ID
+        # Extract group's ID and the listing filter ('view_group|<id>|<filter>')
         try:
-            group_ID = callback_query.data.split("|")[1]
+            parts = callback_query.data.split("|")
+            group_ID = parts[1]
+            list_filter, status, sort = parse_list_filter(parts[2] if len(parts) > 2 else None)
             if group_ID != "OTHER":
                 group_ID = int(group_ID)
                 group = TaskService.get_group(db=db, id=group_ID)
@@ -279,7 +337,7 @@ async def handle_view_group_tasks(callback_query: CallbackQuery):
                 group_ID = False
         except Exception:
             logger.exception("Failed to extract group's ID from callback_query")
-            await callback_query.answer("❌ مشکلی در پیدا کردن این گروه به وجود آمد")
+            await answer_last(callback_query.answer("❌ مشکلی در پیدا کردن این گروه به وجود آمد"))
             return
         
         topics = None
@@ -287,27 +345,30 @@ async def handle_view_group_tasks(callback_query: CallbackQuery):
         if group:
             topics = TaskService.get_all_topics(db=db, group_id=group.id)
         if topics and len(topics) > 0:
+            counts = TaskService.get_task_counts(db=db, by="topic", group_id=group.id)
             keyboard = InlineKeyboardMarkup(inline_keyboard=[])
             keyboard.inline_keyboard.extend(
                 [
-                    [InlineKeyboardButton(text=b.name, callback_data=f"view_topic|{b.id}") for b in c]
+                    [InlineKeyboardButton(text=counted_label(b.name, counts, b.id), callback_data=f"view_topic|{b.id}") for b in c]
                     for c in chunk_list(topics, 2)
                 ]
             )
             keyboard.inline_keyboard.append(
                 [
                     InlineKeyboardButton(text="باز گشت 🔙", callback_data="back"),
-                    InlineKeyboardButton(text="سایر ...", callback_data=f"view_topic|OTHER|{group.id}"),
+                    InlineKeyboardButton(text=counted_label("سایر ...", counts, None), callback_data=f"view_topic|OTHER|{group.id}"),
                 ]
             )
         
         else:
-            tasks = TaskService.get_all_tasks(db=db, group_id=group_ID)
-            if not tasks:
-                await callback_query.answer("⚠️ تسکی برای این گروه پیدا نشد ⚠️")
+            tasks = TaskService.get_all_tasks(db=db, group_id=group_ID, status=status, sort=sort)
+            # An empty filtered list is still shown, so another chip can be picked
+            if tasks is None or (not tasks and status is None):
+                await answer_last(callback_query.answer("⚠️ تسکی برای این گروه پیدا نشد ⚠️"))
                 return
             
             keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+            keyboard.inline_keyboard.extend(filter_chip_rows(f"view_group|{group.id if group else 'OTHER'}", list_filter))
             keyboard.inline_keyboard.extend(
                 [
                     [InlineKeyboardButton(text=b.title, callback_data=f"view_task|{b.id}") for b in c]
@@ -319,8 +380,8 @@ async def handle_view_group_tasks(callback_query: CallbackQuery):
             )
             
         await callback_query.message.edit_text(
-            f"{"تسک" if tasks else "تاپیک"}{f"های گروه {group.name}" if group else " های سایر"}: \n"
-            f"تعداد: {len(tasks) if tasks else len(topics)}\n\n",
+            f"{"تسک" if tasks is not None else "تاپیک"}{f"های گروه {group.name}" if group else " های سایر"}: \n"
+            f"تعداد: {len(tasks) if tasks is not None else len(topics)}\n\n",
             reply_markup=keyboard
         )
     
@@ -349,27 +410,38 @@ async def handle_view_topic_tasks(callback_query: CallbackQuery):
         # Get database session
         db = next(get_db())
 
-        # Extract topic's ID
+        # Extract topic's ID and the listing filter
+        # ('view_topic|<id>|<filter>' or 'view_topic|OTHER|<group_id>|<filter>')
         try:
-            topic_ID = callback_query.data.split("|")[1]
+            parts = callback_query.data.split("|")
+            topic_ID = parts[1]
             if topic_ID == "OTHER":
-                group_ID = int(callback_query.data.split("|")[2])
+                group_ID = int(parts[2])
                 topic = None
                 topic_ID = False
+                target = f"view_topic|OTHER|{group_ID}"
+                list_filter = parts[3] if len(parts) > 3 else None
+            else:
+                topic_ID = int(topic_ID)
+                target = f"view_topic|{topic_ID}"
+                list_filter = parts[2] if len(parts) > 2 else None
+            list_filter, status, sort = parse_list_filter(list_filter)
         except Exception:
             logger.exception("Failed to extract topic's ID from callback_query")
-            await callback_query.answer("❌ مشکلی در پیدا کردن این تاپیک به وجود آمد")
+            await answer_last(callback_query.answer("❌ مشکلی در پیدا کردن این تاپیک به وجود آمد"))
             return
 
         if topic_ID == False:
-            tasks = TaskService.get_all_tasks(db=db, topic_id=topic_ID, group_id=group_ID)
+            tasks = TaskService.get_all_tasks(db=db, topic_id=topic_ID, group_id=group_ID, status=status, sort=sort)
         else:
-            tasks = TaskService.get_all_tasks(db=db, topic_id=topic_ID)
-        if not tasks:
-            await callback_query.answer("⚠️ تسکی برای این تاپیک پیدا نشد ⚠️")
+            tasks = TaskService.get_all_tasks(db=db, topic_id=topic_ID, status=status, sort=sort)
+        # An empty filtered list is still shown, so another chip can be picked
+        if tasks is None or (not tasks and status is None):
+            await answer_last(callback_query.answer("⚠️ تسکی برای این تاپیک پیدا نشد ⚠️"))
             return
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+        keyboard.inline_keyboard.extend(filter_chip_rows(target, list_filter))
         keyboard.inline_keyboard.extend(
             [
                 [InlineKeyboardButton(text=b.title, callback_data=f"view_task|{b.id}") for b in c]
@@ -461,7 +533,9 @@ async def handle_task_manage(event: Message | CallbackQuery):
         )
 
         text="\n".join(text)
-        # Add cancel option to exit menu
+        # Archived tasks of the same scope, then cancel option to exit menu
+        scope = f"t{topic_ctx.id}" if topic_ctx else f"g{group_ctx.id}" if group_ctx else "all"
+        keyboard.inline_keyboard.append([InlineKeyboardButton(text=t("btn_archived_tasks"), callback_data=f"archived|{scope}|0")])
         keyboard.inline_keyboard.append([InlineKeyboardButton(text="لغو", callback_data="teledo|cancel")])
         if isinstance(event, CallbackQuery):
             await event.message.edit_text(text=text, reply_markup=keyboard)
@@ -489,6 +563,35 @@ async def handle_task_manage(event: Message | CallbackQuery):
             except Exception:
                 logger.exception("Failed to close db")
 
+@static_keyboard
+def _task_view_template(is_admin: bool, show_type: str) -> KeyboardTemplate:
+    """Buttons under the task view; admins get the full edit grid on `view_task`."""
+    if is_admin and show_type == "view_task":
+        rows = [
+            [(t("btn_back"), "back"), (t("btn_delete_task"), "delete_task|{task_id}")],
+            [(t("btn_add_user"), "add_user|{task_id}"), (t("btn_remove_users"), "del_users|{task_id}")],
+            [(t("btn_view_assigned"), "view_task_users|{task_id}"), (t("btn_set_deadline"), "edit_end|{task_id}")],
+            [(t("btn_set_group"), "edit_group|{task_id}"), (t("btn_set_topic"), "edit_topic|{task_id}")],
+            [(t("btn_edit_desc"), "edit_desc|{task_id}"), (t("btn_edit_name"), "edit_name|{task_id}")],
+            [(t("btn_add_attachment"), "add_attachment|{task_id}"), (t("btn_get_attachments"), "get_attachments|{task_id}")],
+            [(t("btn_update_status"), f"choose_status|{{task_id}}|{show_type}")],
+        ]
+    else:
+        back_cb = "back_show" if show_type == "show_task" else "back"
+        rows = [
+            [(t("btn_back"), back_cb)],
+            [(t("btn_add_attachment"), "add_attachment|{task_id}"), (t("btn_get_attachments"), "get_attachments|{task_id}")],
+            [(t("btn_update_status"), f"choose_status|{{task_id}}|{show_type}")],
+        ]
+    return KeyboardTemplate(f"task_view:{int(is_admin)}:{show_type}", rows)
+
+
+@static_keyboard
+def _task_card_template() -> KeyboardTemplate:
+    """Button under a task shared through inline mode; it (re)loads the task in place."""
+    return KeyboardTemplate("task_card", [[(t("btn_open_task"), "show_task|{task_id}")]])
+
+
 # ====== Task View Menu ======
 @router.callback_query(F.data.startswith("view_task|"))
 @router.callback_query(F.data.startswith("show_task|"))
@@ -505,7 +608,7 @@ async def handle_view_task(callback_query: CallbackQuery, state: FSMContext = No
         task = TaskService.get_task_by_id(db=db, id=task_id)
 
         if not task:
-            await callback_query.answer(t("task_not_found"))
+            await answer_last(callback_query.answer(t("task_not_found")))
             return
 
         admin = UserService.get_user(db, user_ID=task.admin_id)
@@ -520,32 +623,14 @@ async def handle_view_task(callback_query: CallbackQuery, state: FSMContext = No
         is_assigned = bool(current_user and TaskService.is_user_assigned(db=db, task_id=task_id, user_id=current_user.id))
 
         if not admin:
-            await callback_query.answer(t("admin_not_found"))
+            await answer_last(callback_query.answer(t("admin_not_found")))
             return
 
         if not is_admin and not is_assigned and show_type != "view_task":
-            await callback_query.answer(t("access_denied_task"), show_alert=True)
-            return
-
-        if is_admin and show_type == "view_task":
-            keyboard_buttons = [
-                [InlineKeyboardButton(text=t("btn_back"), callback_data="back"), InlineKeyboardButton(text=t("btn_delete_task"), callback_data=f"delete_task|{task.id}")],
-                [InlineKeyboardButton(text=t("btn_add_user"), callback_data=f"add_user|{task.id}"), InlineKeyboardButton(text=t("btn_remove_users"), callback_data=f"del_users|{task.id}")],
-                [InlineKeyboardButton(text=t("btn_view_assigned"), callback_data=f"view_task_users|{task.id}"), InlineKeyboardButton(text=t("btn_set_deadline"), callback_data=f"edit_end|{task.id}")],
-                [InlineKeyboardButton(text=t("btn_set_group"), callback_data=f"edit_group|{task.id}"), InlineKeyboardButton(text=t("btn_set_topic"), callback_data=f"edit_topic|{task.id}")],
-                [InlineKeyboardButton(text=t("btn_edit_desc"), callback_data=f"edit_desc|{task.id}"), InlineKeyboardButton(text=t("btn_edit_name"), callback_data=f"edit_name|{task.id}")],
-                [InlineKeyboardButton(text=t("btn_add_attachment"), callback_data=f"add_attachment|{task.id}"), InlineKeyboardButton(text=t("btn_get_attachments"), callback_data=f"get_attachments|{task.id}")],
-                [InlineKeyboardButton(text=t("btn_update_status"), callback_data=f"choose_status|{task.id}|{show_type}")],
-            ]
-        else:
-            back_cb = "back_show" if show_type == "show_task" else "back"
-            keyboard_buttons = [
-                [InlineKeyboardButton(text=t("btn_back"), callback_data=back_cb)],
-                [InlineKeyboardButton(text=t("btn_add_attachment"), callback_data=f"add_attachment|{task.id}"), InlineKeyboardButton(text=t("btn_get_attachments"), callback_data=f"get_attachments|{task.id}")],
-                [InlineKeyboardButton(text=t("btn_update_status"), callback_data=f"choose_status|{task.id}|{show_type}")],
-            ]
+            await answer_last(callback_query.answer(t("access_denied_task"), show_alert=True))
+            return
 
-        inline_keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+        inline_keyboard = _task_view_template(is_admin, show_type).render(task_id=task.id)
 
         assigned_users = TaskService.get_task_users(db=db, task_id=task_id)
         if assigned_users:
@@ -572,7 +657,19 @@ async def handle_view_task(callback_query: CallbackQuery, state: FSMContext = No
             users=users_text,
         )
 
-        await callback_query.message.edit_text(body, reply_markup=inline_keyboard)
+        if callback_query.message is None:
+            # A message sent through inline mode lives in someone else's chat: it only shows the task
+            try:
+                await callback_query.bot.edit_message_text(
+                    text=body,
+                    inline_message_id=callback_query.inline_message_id,
+                    reply_markup=_task_card_template().render(task_id=task.id),
+                )
+            except TelegramBadRequest as e:
+                if "message is not modified" not in e.message:
+                    raise
+        else:
+            await callback_query.message.edit_text(body, reply_markup=inline_keyboard)
         await callback_query.answer()
 
     except Exception:
@@ -598,6 +695,20 @@ STATUS_CHOICES = [
 ]
 
 
+@static_keyboard
+def _status_picker_template(show_type: str) -> KeyboardTemplate:
+    """Status buttons for `choose_status`; task id and version are filled in per task."""
+    rows = [
+        [
+            (status_label, f"change_status|{{task_id}}|{status_value}|{show_type}|{{version}}")
+            for status_value, status_label in STATUS_CHOICES[i:i+2]
+        ]
+        for i in range(0, len(STATUS_CHOICES), 2)
+    ]
+    rows.append([(t("btn_cancel"), f"{show_type}|{{task_id}}")])
+    return KeyboardTemplate(f"status_picker:{show_type}", rows)
+
+
 @router.callback_query(F.data.startswith("choose_status|"))
 async def handle_choose_status(callback_query: CallbackQuery):
     """Show status options for admins or assigned users."""
@@ -605,7 +716,7 @@ async def handle_choose_status(callback_query: CallbackQuery):
     try:
         parts = callback_query.data.split("|")
         task_id = int(parts[1])
-        show_type = parts[2] if len(parts) > 2 else "view_task"
+        show_type = "show_task" if len(parts) > 2 and parts[2] == "show_task" else "view_task"
 
         db = next(get_db())
         task = TaskService.get_task_by_id(db=db, id=task_id)
@@ -618,29 +729,15 @@ async def handle_choose_status(callback_query: CallbackQuery):
         is_assigned = bool(user and TaskService.is_user_assigned(db=db, task_id=task_id, user_id=user.id)) if user else False
 
         if not task:
-            await callback_query.answer(t("task_not_found"))
+            await answer_last(callback_query.answer(t("task_not_found")))
             return
         if not is_admin and not is_assigned:
-            await callback_query.answer(t("status_update_forbidden"), show_alert=True)
+            await answer_last(callback_query.answer(t("status_update_forbidden"), show_alert=True))
             return
 
-        keyboard_rows = []
-        for i in range(0, len(STATUS_CHOICES), 2):
-            row = []
-            for status_value, status_label in STATUS_CHOICES[i:i+2]:
-                row.append(
-                    InlineKeyboardButton(
-                        text=status_label,
-                        callback_data=f"change_status|{task_id}|{status_value}|{show_type}"
-                    )
-                )
-            keyboard_rows.append(row)
-
-        keyboard_rows.append([InlineKeyboardButton(text=t("btn_cancel"), callback_data=f"{show_type}|{task_id}")])
-
         await callback_query.message.answer(
             t("choose_status_prompt"),
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
+            reply_markup=_status_picker_template(show_type).render(task_id=task_id, version=task.version)
         )
         await callback_query.answer()
 
@@ -667,6 +764,9 @@ async def handle_change_status(callback_query: CallbackQuery):
         task_id = int(parts[1])
         new_status = parts[2]
         show_type = parts[3] if len(parts) > 3 else "view_task"
+        # Version of the task when the status picker was shown
+        expected_version = int(parts[4]) if len(parts) > 4 else None
+        target = "show_task" if show_type == "show_task" else "view_task"
 
         db = next(get_db())
         task = TaskService.get_task_by_id(db=db, id=task_id)
@@ -679,18 +779,23 @@ async def handle_change_status(callback_query: CallbackQuery):
         is_assigned = bool(user and TaskService.is_user_assigned(db=db, task_id=task_id, user_id=user.id)) if user else False
 
         if not task:
-            await callback_query.answer(t("task_not_found"))
+            await answer_last(callback_query.answer(t("task_not_found")))
             return
         if not is_admin and not is_assigned:
-            await callback_query.answer(t("status_update_forbidden"), show_alert=True)
+            await answer_last(callback_query.answer(t("status_update_forbidden"), show_alert=True))
             return
 
-        res = TaskService.update_status(db=db, task_id=task_id, status=new_status)
+        res = TaskService.update_status(db=db, task_id=task_id, status=new_status, expected_version=expected_version)
         if res == "NOT_EXIST":
-            await callback_query.answer(t("task_not_found"))
+            await answer_last(callback_query.answer(t("task_not_found")))
+            return
+        if res == "CONFLICT":
+            # Someone else changed the task meanwhile: show what it looks like now
+            await callback_query.answer(t("task_edit_conflict"), show_alert=True)
+            await handle_view_task(get_callback(callback_query, f"{target}|{task_id}"))
             return
         if not res:
-            await callback_query.answer(t("status_update_failed"))
+            await answer_last(callback_query.answer(t("status_update_failed")))
             return
 
         await callback_query.answer(t("status_updated"))
@@ -709,7 +814,6 @@ async def handle_change_status(callback_query: CallbackQuery):
         except Exception:
             logger.exception("Failed to delete status selection message")
         # Refresh the task view
-        target = "show_task" if show_type == "show_task" else "view_task"
         mock_callback = get_callback(callback_query, f"{target}|{task_id}")
         await handle_view_task(mock_callback)
 
@@ -844,7 +948,7 @@ async def handle_select_group(callback_query: CallbackQuery):
         group = TaskService.get_group(db=db, id=group_id_val) if group_id_val else None
         res = TaskService.edit_task(db=db, task_id=task_id, group_id=group_id_val)
         if res == "NOT_EXIST":
-            await callback_query.answer(t("task_not_found"), show_alert=True)
+            await answer_last(callback_query.answer(t("task_not_found"), show_alert=True))
             return
         group_name = group.name if group else t("group_other_label")
 
@@ -979,10 +1083,10 @@ async def handle_edit_topic(callback_query: CallbackQuery, state: FSMContext):
         db = next(get_db())
         task = TaskService.get_task_by_id(db=db, id=task_id)
         if not task:
-            await callback_query.answer(t("task_not_found"), show_alert=True)
+            await answer_last(callback_query.answer(t("task_not_found"), show_alert=True))
             return
         if not task.group_id:
-            await callback_query.answer(t("task_topic_requires_group"), show_alert=True)
+            await answer_last(callback_query.answer(t("task_topic_requires_group"), show_alert=True))
             return
 
         topics = TaskService.get_all_topics(db=db, group_id=task.group_id) or []
@@ -1038,7 +1142,7 @@ async def handle_select_topic(callback_query: CallbackQuery):
         topic = TaskService.get_topic(db=db, id=topic_id_val) if topic_id_val else None
         res = TaskService.edit_task(db=db, task_id=task_id, topic_id=topic_id_val)
         if res == "NOT_EXIST":
-            await callback_query.answer(t("task_not_found"), show_alert=True)
+            await answer_last(callback_query.answer(t("task_not_found"), show_alert=True))
             return
         topic_name = topic.name if topic else t("topic_other_label")
 
@@ -1078,7 +1182,7 @@ async def handle_create_topic_prompt(callback_query: CallbackQuery, state: FSMCo
         db = next(get_db())
         task = TaskService.get_task_by_id(db=db, id=task_id)
         if not task or not task.group_id:
-            await callback_query.answer(t("task_topic_requires_group"), show_alert=True)
+            await answer_last(callback_query.answer(t("task_topic_requires_group"), show_alert=True))
             return
 
         await state.update_data(task_id=task_id, prompt_msg_id=callback_query.message.message_id)
@@ -1181,6 +1285,18 @@ async def process_new_topic_name(message: Message, state: FSMContext):
                 logger.exception("Failed to close db in process_new_topic_name")
 
 
+async def _show_conflicting_task(message: Message, message_id: int, task_id: int):
+    """
+    Tell the user their edit lost a version conflict and re-render the task view
+    into the prompt message `message_id`, so they see what it looks like now.
+    """
+    em = await message.answer(t("task_edit_conflict"))
+    await del_message(5, em)
+    prompt = Message(message_id=message_id, date=message.date, chat=message.chat).as_(message.bot)
+    origin = SimpleNamespace(message=prompt, from_user=message.from_user, id=None)
+    await handle_view_task(get_callback(origin, f"view_task|{task_id}"))
+
+
 # ====== Edit Task Name ======
 @router.callback_query(F.data.startswith("edit_name|"))
 async def handle_edit_name(callback_query: CallbackQuery, state: FSMContext):
@@ -1191,10 +1307,10 @@ async def handle_edit_name(callback_query: CallbackQuery, state: FSMContext):
         task = TaskService.get_task_by_id(db=db, id=task_id)
 
         if not task:
-            await callback_query.answer("❌ تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ تسک یافت نشد"))
             return
         
-        await state.update_data(task_id=task_id, prompt_msg_id=callback_query.message.message_id)
+        await state.update_data(task_id=task_id, task_version=task.version, prompt_msg_id=callback_query.message.message_id)
 
         await state.set_state(EditTaskStates.waiting_for_name)
         
@@ -1238,11 +1354,16 @@ async def process_edit_name(message: Message, state: FSMContext):
         prompt_msg_id = data.get("prompt_msg_id")
 
         db = next(get_db())
-        res = TaskService.edit_task(db=db, task_id=task_id, name=new_name)
+        res = TaskService.edit_task(db=db, task_id=task_id, name=new_name, expected_version=data.get("task_version"))
 
         # پیام کاربر پاک بشه
         await message.delete()
 
+        if res == "CONFLICT":
+            await state.clear()
+            await _show_conflicting_task(message, prompt_msg_id, task_id)
+            return
+
         if res:
             text = "✅ نام تسک تغییر کرد"
         elif res == "NOT_EXIST":
@@ -1315,10 +1436,10 @@ async def handle_edit_desc(callback_query: CallbackQuery, state: FSMContext):
         task = TaskService.get_task_by_id(db=db, id=task_id)
 
         if not task:
-            await callback_query.answer("❌ تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ تسک یافت نشد"))
             return
         
-        await state.update_data(task_id=task_id, prompt_msg_id=callback_query.message.message_id)
+        await state.update_data(task_id=task_id, task_version=task.version, prompt_msg_id=callback_query.message.message_id)
 
         await state.set_state(EditTaskStates.waiting_for_desc)
         
@@ -1362,11 +1483,16 @@ async def process_edit_desc(message: Message, state: FSMContext):
         prompt_msg_id = data.get("prompt_msg_id")
 
         db = next(get_db())
-        res = TaskService.edit_task(db=db, task_id=task_id, description=new_des)
+        res = TaskService.edit_task(db=db, task_id=task_id, description=new_des, expected_version=data.get("task_version"))
 
         # پیام کاربر پاک بشه
         await message.delete()
 
+        if res == "CONFLICT":
+            await state.clear()
+            await _show_conflicting_task(message, prompt_msg_id, task_id)
+            return
+
         if res:
             text = "✅ توضیحات تسک تغییر کرد"
         elif res == "NOT_EXIST":
@@ -1448,29 +1574,23 @@ async def handle_edit_end(callback_query: CallbackQuery, state: FSMContext):
 
         # If task does not exist
         if not task:
-            await callback_query.answer(t("task_not_found"))
+            await answer_last(callback_query.answer(t("task_not_found")))
             return
         
         # Save task_id and the message_id of the bot's message into FSM state
         await state.update_data(
             task_id=task_id,
+            task_version=task.version,
             callback_message_id=callback_query.message.message_id
         )
 
         # Set FSM state to wait for user input (new end date)
         await state.set_state(EditTaskStates.waiting_for_end)
         
-        # Ask user to enter new date
+        # Ask user to pick a day from the calendar or type a date
         await callback_query.message.edit_text(
             t("deadline_prompt", title=task.title),
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[[
-                    InlineKeyboardButton(
-                        text=t("btn_back"),
-                        callback_data=f"view_task|{task_id}"
-                    )
-                ]]
-            )
+            reply_markup=calendar_keyboard(task_id, task.version)
         )
         await callback_query.answer()
 
@@ -1507,8 +1627,8 @@ async def process_edit_end(message: Message, state: FSMContext):
         callback_message_id = data.get("callback_message_id")
         prev_error_msg_id = data.get("error_message_id")
 
-        # Try to parse Jalali date (YYYY-MM-DD) and ensure it is in the future
-        new_end = jalali_to_gregorian(date_text)
+        # Numeric (Jalali/Gregorian) or natural date such as "فردا" or "+3d", must be in the future
+        new_end = parse_deadline(date_text)
         error_key = None
         if not new_end:
             error_key = "deadline_invalid_format"
@@ -1546,11 +1666,14 @@ async def process_edit_end(message: Message, state: FSMContext):
         res = TaskService.edit_task(
             db=db,
             task_id=task_id,
-            end_date=new_end
+            end_date=new_end,
+            expected_version=data.get("task_version")
         )
 
         # Decide response text based on result
-        if res:
+        if res == "CONFLICT":
+            text = t("task_edit_conflict")
+        elif res:
             text = t("deadline_update_success")
             try:
                 task = TaskService.get_task_by_id(db=db, id=task_id)
@@ -1579,6 +1702,12 @@ async def process_edit_end(message: Message, state: FSMContext):
             except Exception:
                 logger.exception("Could not delete previous error message after success")
 
+        # The task changed while the user was typing: show its current state instead
+        if res == "CONFLICT" and callback_message_id:
+            await state.clear()
+            await _show_conflicting_task(message, callback_message_id, task_id)
+            return
+
         # Edit the original bot message with success info + back button
         if callback_message_id:
             try:
@@ -1633,6 +1762,128 @@ async def process_edit_end(message: Message, state: FSMContext):
                 logger.exception("Failed to close DB session in process_edit_end")
 
 
+# ====== Deadline calendar ======
+@router.callback_query(F.data.startswith(f"{CALENDAR_NAV}|"))
+async def handle_calendar_nav(callback_query: CallbackQuery):
+    """
+    Show another month of the deadline calendar: 'cal_nav|<task_id>|<YYYYMM>|<version>'.
+    """
+    try:
+        _, task_id, month_value, version = callback_query.data.split("|")
+        month = parse_calendar_month(month_value)
+        keyboard = calendar_keyboard(int(task_id), int(version), *month) if month else None
+        if keyboard is None:
+            await callback_query.answer()
+            return
+        await callback_query.message.edit_reply_markup(reply_markup=keyboard)
+        await callback_query.answer()
+    except Exception:
+        logger.exception("Unexpected error occurred in handle_calendar_nav")
+        try:
+            await callback_query.answer(t("generic_error"))
+        except Exception:
+            logger.exception("Failed to send error message")
+
+
+@router.callback_query(F.data == CALENDAR_NOOP)
+async def handle_calendar_noop(callback_query: CallbackQuery):
+    # Month title, weekday names and blank cells
+    await callback_query.answer()
+
+
+@router.callback_query(F.data.startswith(f"{CALENDAR_PICK}|"))
+async def handle_calendar_pick(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Set the deadline to the day picked from the calendar: 'cal_pick|<task_id>|<YYYYMMDD>|<version>'.
+    Admins only; the pick is applied only while the task is still at the version
+    it had when the calendar was opened.
+    """
+    db = None
+    try:
+        _, task_id, day_value, expected_version = callback_query.data.split("|")
+        task_id = int(task_id)
+        expected_version = int(expected_version)
+        new_end = parse_calendar_day(day_value)
+        if not new_end:
+            await callback_query.answer(t("deadline_invalid_format"), show_alert=True)
+            return
+        if not is_future_date(new_end):
+            await callback_query.answer(t("deadline_past_date"), show_alert=True)
+            return
+
+        db = next(get_db())
+        # The calendar stays in the chat, so anyone can tap it
+        user = UserService.get_user(
+            db=db,
+            user_tID=str(callback_query.from_user.id),
+            username=callback_query.from_user.username,
+        )
+        if not (user and user.is_admin):
+            await answer_last(callback_query.answer(t("deadline_update_forbidden"), show_alert=True))
+            return
+
+        # A stale calendar must not touch another conversation's state
+        data = await state.get_data()
+        same_edit = (
+            await state.get_state() == EditTaskStates.waiting_for_end.state
+            and data.get("task_id") == task_id
+        )
+
+        res = TaskService.edit_task(
+            db=db,
+            task_id=task_id,
+            end_date=new_end,
+            expected_version=expected_version
+        )
+        if same_edit:
+            await state.clear()
+
+        # The task changed since the calendar was opened: show its current state instead
+        if res == "CONFLICT":
+            await callback_query.answer(t("task_edit_conflict"), show_alert=True)
+            await handle_view_task(get_callback(callback_query, f"view_task|{task_id}"))
+            return
+        if res == "NOT_EXIST":
+            await callback_query.answer(t("deadline_update_not_exist"), show_alert=True)
+            return
+        if not res:
+            await callback_query.answer(t("deadline_update_failed"), show_alert=True)
+            return
+
+        try:
+            task = TaskService.get_task_by_id(db=db, id=task_id)
+            await _notify_assigned_users(task, callback_query.bot, "notify_task_updated_by_admin")
+        except Exception:
+            logger.exception("Failed to notify users about deadline change")
+
+        await callback_query.message.edit_text(
+            t("deadline_update_success"),
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[[
+                    InlineKeyboardButton(
+                        text=t("btn_back"),
+                        callback_data=f"view_task|{task_id}"
+                    )
+                ]]
+            )
+        )
+        await callback_query.answer()
+
+    except Exception:
+        logger.exception("Unexpected error occurred in handle_calendar_pick")
+        try:
+            await callback_query.answer(t("generic_error"))
+        except Exception:
+            logger.exception("Failed to send error message")
+
+    finally:
+        if db is not None:
+            try:
+                db.close()
+            except Exception:
+                logger.exception("Failed to close DB session in handle_calendar_pick")
+
+
 # ====== Add User to Task ======
 @router.callback_query(F.data.startswith("add_user|"))
 async def handle_add_user(callback_query: CallbackQuery, state: FSMContext):
@@ -1645,7 +1896,7 @@ async def handle_add_user(callback_query: CallbackQuery, state: FSMContext):
         task = TaskService.get_task_by_id(db=db, id=task_id)
         
         if not task:
-            await callback_query.answer("❌ تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ تسک یافت نشد"))
             return
         
         # Store task info in state
@@ -1657,7 +1908,7 @@ async def handle_add_user(callback_query: CallbackQuery, state: FSMContext):
         # Get suggested users from database
         suggested_users = list(UserService.get_all_users(db, user_tID=callback_query.from_user.id, task_id=task_id))
         if len(suggested_users) == 0:
-            await callback_query.answer("⚠️ کاربری برای نمایش وجود ندارد ⚠️")
+            await answer_last(callback_query.answer("⚠️ کاربری برای نمایش وجود ندارد ⚠️"))
             return
         suggested_users = [user.username for user in suggested_users]
             
@@ -1721,12 +1972,12 @@ async def handle_select_user(callback_query: CallbackQuery, state: FSMContext):
         data = await state.get_data()
         task_id_str = data.get('task_id')
         if not task_id_str:
-            await callback_query.answer("❌ اطلاعات تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ اطلاعات تسک یافت نشد"))
             return
         task_id = int(task_id_str)
         
         if not task_id:
-            await callback_query.answer("❌ اطلاعات تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ اطلاعات تسک یافت نشد"))
             return
         
         db = next(get_db())
@@ -1792,7 +2043,7 @@ async def handle_view_task_users(callback_query: CallbackQuery):
         # Get task information
         task = TaskService.get_task_by_id(db=db, id=task_id)
         if not task:
-            await callback_query.answer("❌ تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ تسک یافت نشد"))
             return
         
         # Get all users assigned to this task
@@ -1866,7 +2117,7 @@ async def handle_delete_user_menu(callback_query: CallbackQuery, state: FSMConte
         
         if not task:
             # Task not found
-            await callback_query.answer("❌ تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ تسک یافت نشد"))
             return
         
         # Get all users assigned to this task
@@ -1874,7 +2125,7 @@ async def handle_delete_user_menu(callback_query: CallbackQuery, state: FSMConte
         
         if not assigned_users:
             # No users to delete
-            await callback_query.answer("⚠️ هیچ کاربری در این تسک وجود ندارد")
+            await answer_last(callback_query.answer("⚠️ هیچ کاربری در این تسک وجود ندارد"))
             return
         
         # Store task info and assigned users in FSM state
@@ -1950,7 +2201,7 @@ async def handle_delete_user_final(callback_query: CallbackQuery, state: FSMCont
         task_id = int(data.get('task_id'))
         
         if not task_id:
-            await callback_query.answer("❌ اطلاعات تسک یافت نشد")
+            await answer_last(callback_query.answer("❌ اطلاعات تسک یافت نشد"))
             return
         
         # Open a database session
@@ -1961,7 +2212,7 @@ async def handle_delete_user_final(callback_query: CallbackQuery, state: FSMCont
         task = TaskService.get_task_by_id(db=db, id=task_id)
         
         if not user_to_delete or not task:
-            await callback_query.answer("❌ اطلاعات یافت نشد")
+            await answer_last(callback_query.answer("❌ اطلاعات یافت نشد"))
             return
         
         # Attempt to delete the user from the task
@@ -2045,10 +2296,10 @@ async def handle_add_attachment(callback_query: CallbackQuery, state: FSMContext
         is_assigned = bool(user and TaskService.is_user_assigned(db=db, task_id=task_id, user_id=user.id)) if user else False
 
         if not task:
-            await callback_query.answer(t("task_not_found"))
+            await answer_last(callback_query.answer(t("task_not_found")))
             return
         if not is_admin and not is_assigned:
-            await callback_query.answer(t("attachments_add_forbidden"), show_alert=True)
+            await answer_last(callback_query.answer(t("attachments_add_forbidden"), show_alert=True))
             return
 
         # Store in state that we are adding attachments for this task
@@ -2176,17 +2427,17 @@ async def handle_get_attachments(callback_query: CallbackQuery):
         is_assigned = bool(user and TaskService.is_user_assigned(db=db, task_id=task_id, user_id=user.id)) if user else False
 
         if not task:
-            await callback_query.answer(t("task_not_found"))
+            await answer_last(callback_query.answer(t("task_not_found")))
             return
         if not is_admin and not is_assigned:
-            await callback_query.answer(t("attachments_view_forbidden"), show_alert=True)
+            await answer_last(callback_query.answer(t("attachments_view_forbidden"), show_alert=True))
             return
 
         # Get all attachments for the task
         attachments = TaskAttachmentService.get_attachments(db=db, task_id=task_id)
 
         if not attachments:
-            await callback_query.answer(t("attachments_none"), show_alert=True)
+            await answer_last(callback_query.answer(t("attachments_none"), show_alert=True))
             return
 
         # Send each attachment using the correct method
@@ -2229,12 +2480,14 @@ async def handle_get_attachments(callback_query: CallbackQuery):
 
 
 # ====== Show user's tasks ======
-async def handle_my_tasks(event: Message | CallbackQuery):
+async def handle_my_tasks(event: Message | CallbackQuery, list_filter: str | None = None):
     """
-    Show all tasks assigned to the current user with inline buttons.
+    Show all tasks assigned to the current user with inline buttons,
+    narrowed by the status chip / deadline sort in `list_filter`.
     """
     db = None
     try:
+        list_filter, status, sort = parse_list_filter(list_filter)
         # Assuming telegram_id is unique for users
         telegram_id = event.from_user.id
         db = next(get_db())
@@ -2249,9 +2502,9 @@ async def handle_my_tasks(event: Message | CallbackQuery):
                 await del_message(3, em)
             return
 
-        # Get tasks assigned to this user
-        tasks = TaskService.get_tasks_for_user(db=db, user_id=user.id)
-        if not tasks:
+        # Get tasks assigned to this user; an empty filtered list is still shown with its chips
+        tasks = TaskService.get_tasks_for_user(db=db, user_id=user.id, status=status, sort=sort)
+        if tasks is None or (not tasks and status is None):
             if isinstance(event, CallbackQuery):
                 await event.answer("⚠️ هیچ تسکی برای شما وجود ندارد", show_alert=True)
             else:
@@ -2260,7 +2513,7 @@ async def handle_my_tasks(event: Message | CallbackQuery):
             return
 
         # Build inline keyboard
-        keyboard_buttons = []
+        keyboard_buttons = list(filter_chip_rows("my_tasks", list_filter))
         for task in tasks:
             keyboard_buttons.append([
                 InlineKeyboardButton(
@@ -2268,6 +2521,7 @@ async def handle_my_tasks(event: Message | CallbackQuery):
                     callback_data=f"show_task|{task.id}"
                 )
             ])
+        keyboard_buttons.append([InlineKeyboardButton(text=t("btn_archived_tasks"), callback_data="archived|mine|0")])
         keyboard_buttons.append([InlineKeyboardButton(text="لغو", callback_data="teledo|cancel")])
         inline_keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
 
@@ -2317,8 +2571,11 @@ async def handle_my_tasks_message(message: Message):
     await del_message(3, message)
 
 @router.callback_query(F.data == "back_show")
+@router.callback_query(F.data.startswith("my_tasks|"))
 async def handle_my_tasks_callback(callback: CallbackQuery):
-    await handle_my_tasks(event=callback)
+    # 'my_tasks|<filter>' from the filter chips
+    list_filter = callback.data.split("|")[1] if callback.data.startswith("my_tasks|") else None
+    await handle_my_tasks(event=callback, list_filter=list_filter)
 
 
 @router.message(Command("teledo"))
@@ -2389,11 +2646,11 @@ async def handle_teledo_callbacks(callback_query: CallbackQuery):
                 )
             )
         else:
-            await callback_query.answer(t("invalid_command"))
+            await answer_last(callback_query.answer(t("invalid_command")))
             return
 
         if not is_admin:
-            await callback_query.answer(t("teledo_admin_only"), show_alert=True)
+            await answer_last(callback_query.answer(t("teledo_admin_only"), show_alert=True))
             return
 
         # Cancel: remove menu message
@@ -2402,7 +2659,7 @@ async def handle_teledo_callbacks(callback_query: CallbackQuery):
                 await callback_query.message.delete()
             except Exception:
                 pass
-            await callback_query.answer()
+            await answer_last(callback_query.answer())
             return
 
         if action == "users":
@@ -2420,7 +2677,7 @@ async def handle_teledo_callbacks(callback_query: CallbackQuery):
 
         admin_only_actions = {"add_task", "assign_user", "title", "desc", "deadline", "attach", "tasks", "users"}
         if action in admin_only_actions and not is_admin:
-            await callback_query.answer(t("no_permission_cmd"), show_alert=True)
+            await answer_last(callback_query.answer(t("no_permission_cmd"), show_alert=True))
             return
 
         if action in INLINE_COMMAND_ACTIONS:
@@ -2433,7 +2690,7 @@ async def handle_teledo_callbacks(callback_query: CallbackQuery):
             )
             helper_text = f"{label}\nدستور در نوار نوشتار قرار گرفت، متن یا فایل را بعد از آن اضافه و ارسال کنید."
             await callback_query.message.edit_text(helper_text, reply_markup=keyboard)
-            await callback_query.answer()
+            await answer_last(callback_query.answer())
             return
 
         await callback_query.answer(t("invalid_command"))
@@ -2573,21 +2830,21 @@ async def _handle_short_edits(message: Message, allow_without_reply: bool = Fals
                 em = await message.answer(t("invalid_command"))
                 await del_message(3, em, message)
                 return
-            callback_text = f"short_edit|name|{value_text}"
+            callback_text = f"short_edit|name|{payload_store.put(value_text)}"
 
         elif command_used in ("desc", "des"):
             if not value_text:
                 em = await message.answer(t("invalid_command"))
                 await del_message(3, em, message)
                 return
-            callback_text = f"short_edit|des|{value_text}"
+            callback_text = f"short_edit|des|{payload_store.put(value_text)}"
 
         elif command_used == "time":
             if not value_text:
                 em = await message.answer(t("deadline_invalid_format"))
                 await del_message(3, em, message)
                 return
-            parsed = parse_flexible_date(value_text)
+            parsed = parse_deadline(value_text)
             if not parsed:
                 em = await message.answer(t("deadline_invalid_format"))
                 await del_message(3, em, message)
@@ -2596,7 +2853,8 @@ async def _handle_short_edits(message: Message, allow_without_reply: bool = Fals
                 em = await message.answer(t("deadline_past_date"))
                 await del_message(3, em, message)
                 return
-            callback_text = f"short_edit|time|{value_text}"
+            # Relative dates are resolved now, so confirming later keeps the same day
+            callback_text = f"short_edit|time|{payload_store.put(gregorian_to_jalali(parsed))}"
 
         elif command_used in ("attach", "atach"):
             file_ids = []
@@ -2625,13 +2883,9 @@ async def _handle_short_edits(message: Message, allow_without_reply: bool = Fals
             collect_media(message)
 
             if file_ids:
-                media_key = str(uuid.uuid4())
-                media_cache[media_key] = file_ids
-                callback_text = f"short_edit|attach|{media_key}"
+                callback_text = f"short_edit|attach|{payload_store.put(file_ids)}"
             elif value_text:
-                media_key = str(uuid.uuid4())
-                media_cache[media_key] = [f"text:{value_text}"]
-                callback_text = f"short_edit|attach|{media_key}"
+                callback_text = f"short_edit|attach|{payload_store.put([f'text:{value_text}'])}"
             else:
                 em = await message.answer("لطفاً یک متن یا فایل را بعد از /attach ارسال کنید.")
                 await del_message(3, em, message)
@@ -2684,7 +2938,7 @@ async def _handle_short_edits(message: Message, allow_without_reply: bool = Fals
         keyboard = []
         for task_item in tasks:
             keyboard.append([
-                InlineKeyboardButton(text=task_item.title, callback_data=f"{callback_text}|{task_item.id}")
+                InlineKeyboardButton(text=task_item.title, callback_data=f"{callback_text}|{task_item.id}|{task_item.version}")
             ])
         keyboard.append([InlineKeyboardButton(text=t("btn_cancel"), callback_data="teledo|cancel")])
 
@@ -2888,18 +3142,18 @@ async def handle_assign_user_direct(callback_query: CallbackQuery):
             user_id = int(user_id_str)
             task_id = int(task_id_str)
         except Exception:
-            await callback_query.answer(t("generic_error"))
+            await answer_last(callback_query.answer(t("generic_error")))
             return
 
         target_user = UserService.get_user(db=db, user_ID=user_id)
         task = TaskService.get_task_by_id(db=db, id=task_id)
         if not target_user or not task:
-            await callback_query.answer(t("no_tasks_found"))
+            await answer_last(callback_query.answer(t("no_tasks_found")))
             return
 
         res = UserService.assign_user_to_task(db=db, user_ID=user_id, task_id=task_id)
         if not res:
-            await callback_query.answer(t("generic_error"))
+            await answer_last(callback_query.answer(t("generic_error")))
             return
 
         confirm_text = f"{target_user.username or 'User'} به تسک «{task.title}» اضافه شد."
@@ -2951,12 +3205,12 @@ async def handle_assign_user_pick(callback_query: CallbackQuery):
             group_id = int(group_id_str)
             topic_thread_id = None if topic_thread == "NONE" else topic_thread
         except Exception:
-            await callback_query.answer(t("generic_error"))
+            await answer_last(callback_query.answer(t("generic_error")))
             return
 
         target_user = UserService.get_user(db=db, user_ID=user_id)
         if not target_user:
-            await callback_query.answer(t("user_not_found"))
+            await answer_last(callback_query.answer(t("user_not_found")))
             return
 
         # Fetch tasks depending on group/topic
@@ -2968,7 +3222,7 @@ async def handle_assign_user_pick(callback_query: CallbackQuery):
             tasks = TaskService.get_all_tasks(db=db, group_id=group.id, topic_id=False) if group else None
 
         if not tasks:
-            await callback_query.answer(t("no_tasks_found"), show_alert=True)
+            await answer_last(callback_query.answer(t("no_tasks_found"), show_alert=True))
             return
 
         keyboard = []
@@ -3003,10 +3257,11 @@ async def short_edit_confirm(callback_query: CallbackQuery):
     """
     Handles the callback when a user selects a task to apply a short edit.
     Triggered by inline buttons from handle_short_edits.
-    Expected callback format: short_edit|<type>|<value>|<task_id>
+    Expected callback format: short_edit|<type>|<token>|<task_id>|<version>
     - <type>: name, des, time, attach
-    - <value>: new value or list of file IDs for attachments
+    - <token>: payload store token of the new value or list of file IDs for attachments
     - <task_id>: the task to apply the change to
+    - <version>: task version the list was built from; the edit is rejected if it changed since
     """
     db = None
     try:
@@ -3017,38 +3272,44 @@ async def short_edit_confirm(callback_query: CallbackQuery):
 
         # Determine type of edit and value(s)
         edit_type = data_parts[1]
-        edit_value = data_parts[2]
-        task_id = int(data_parts[-1])
+        payload_token = data_parts[2]
+        task_id = int(data_parts[3])
+        expected_version = int(data_parts[4]) if len(data_parts) > 4 else None
 
         if not task_id:
-            await callback_query.answer("❌ Task ID missing")
+            await answer_last(callback_query.answer("❌ Task ID missing"))
+            return
+
+        # Resolve the stored value; it is gone once the payload expired
+        edit_value = payload_store.get(payload_token)
+        if edit_value is None:
+            await answer_last(callback_query.answer(t("short_edit_expired"), show_alert=True))
             return
 
         # Handle changing the task's name
         if edit_type == "name":
-            result = TaskService.edit_task(db=db, task_id=task_id, name=edit_value)
+            result = TaskService.edit_task(db=db, task_id=task_id, name=edit_value, expected_version=expected_version)
             success_message = f"✅ نام تسک تغییر کرد به: {edit_value}"
 
         # Handle changing the task's description
         elif edit_type == "des":
-            result = TaskService.edit_task(db=db, task_id=task_id, description=edit_value)
+            result = TaskService.edit_task(db=db, task_id=task_id, description=edit_value, expected_version=expected_version)
             success_message = "✅ توضیحات تغییر کرد"
 
         # Handle changing the task's end date
         elif edit_type == "time":
-            end_date = parse_flexible_date(edit_value)
+            end_date = parse_deadline(edit_value)
             if not end_date:
-                await callback_query.answer(t("deadline_invalid_format"))
+                await answer_last(callback_query.answer(t("deadline_invalid_format")))
                 return
             if not is_future_date(end_date):
-                await callback_query.answer(t("deadline_past_date"))
+                await answer_last(callback_query.answer(t("deadline_past_date")))
                 return
-            result = TaskService.edit_task(db=db, task_id=task_id, end_date=end_date)
+            result = TaskService.edit_task(db=db, task_id=task_id, end_date=end_date, expected_version=expected_version)
             success_message = f"??? ????? ????? ??? ?? {edit_value} ????? ???"
         elif edit_type == "attach":
             result = True
-            media_key = edit_value
-            file_ids = media_cache.get(media_key, [])
+            file_ids = edit_value
             added_count = 0
             added_ids = []
 
@@ -3064,12 +3325,12 @@ async def short_edit_confirm(callback_query: CallbackQuery):
 
             # Notify user if no files were added
             if added_count == 0:
-                await callback_query.answer("❌ هیچ پیوستی اضافه نشد")
+                await answer_last(callback_query.answer("❌ هیچ پیوستی اضافه نشد"))
                 return
 
-            # Inform user about successful attachments and remove cache
+            # Inform user about successful attachments and forget the stored payload
             success_message = f"✅ تعداد {added_count} پیوست به تسک اضافه شد"
-            file_ids = media_cache.__delitem__(media_key)
+            payload_store.pop(payload_token)
 
             # Send notifications with only new files
             task = TaskService.get_task_by_id(db=db, id=task_id)
@@ -3095,12 +3356,17 @@ async def short_edit_confirm(callback_query: CallbackQuery):
 
         # Handle invalid edit types
         else:
-            await callback_query.answer("❌ دستور نامعتبر است")
+            await answer_last(callback_query.answer("❌ دستور نامعتبر است"))
             return
 
         # Check the result and notify the user
         if result == "NOT_EXIST":
-            await callback_query.answer("❌ این تسک وجود ندارد")
+            await answer_last(callback_query.answer("❌ این تسک وجود ندارد"))
+            return
+        elif result == "CONFLICT":
+            # The task changed after the list was shown: nothing was written, show its current state
+            await callback_query.answer(t("task_edit_conflict"), show_alert=True)
+            await handle_view_task(get_callback(callback_query, f"view_task|{task_id}"))
             return
         elif result:
             # Confirm the edit and provide buttons to view task or finish
@@ -0,0 +1,127 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import NamedTuple
+
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+
+from config import config
+from database import get_db
+from logger import logger
+from services.task_services import MAX_SEARCH_TERMS, TaskService, search_terms
+from services.user_services import UserService
+from utils.cache import TTLCache
+from utils.date_utils import gregorian_to_jalali
+from utils.texts import t
+from .. import main_router as router
+from .. import answer_last
+from .edit import _task_card_template
+
+# Telegram shows at most 50 results per answer
+INLINE_RESULTS_LIMIT = 50
+
+
+class _Hit(NamedTuple):
+    id: int
+    title: str
+    status: str
+    end_date: datetime | None
+    # Words of the title and description, to narrow a lookup without the database
+    words: frozenset[str]
+
+
+class _Recent(NamedTuple):
+    terms: tuple[str, ...]
+    # Whether `hits` holds every match of `terms`, not only the first page
+    complete: bool
+    hits: list[_Hit]
+
+
+# Each user's last lookup. Keystrokes arrive as one inline query per
+# character; a query that only narrows the previous one ("گز" -> "گزارش")
+# is filtered from here instead of going back to the database.
+_recent = TTLCache("inline_results", max_size=config.INLINE_CACHE_SIZE, ttl=config.INLINE_RESULT_TTL)
+
+
+def _narrows(previous: tuple[str, ...], terms: tuple[str, ...]) -> bool:
+    """Every match of `terms` is a match of `previous` (each old word is a prefix of a new one)."""
+    return all(any(term.startswith(old) for term in terms) for old in previous)
+
+
+def _matches(hit: _Hit, terms: tuple[str, ...]) -> bool:
+    return all(any(word.startswith(term) for word in hit.words) for term in terms)
+
+
+def lookup(db, telegram_id: int, query: str) -> list[_Hit]:
+    """
+    Tasks matching an inline query, best first; all tasks for admins, the
+    assigned ones for everyone else. Served from the user's last lookup when
+    the query repeats or narrows it.
+    """
+    terms = tuple(search_terms(query)[:MAX_SEARCH_TERMS])
+    if not terms:
+        return []
+
+    recent = _recent.get(telegram_id)
+    if recent is not None:
+        if recent.terms == terms:
+            return recent.hits
+        if recent.complete and _narrows(recent.terms, terms):
+            hits = [hit for hit in recent.hits if _matches(hit, terms)]
+            _recent.set(telegram_id, _Recent(terms, True, hits))
+            return hits
+
+    user = UserService.get_user(db=db, user_tID=str(telegram_id))
+    if not user:
+        return []
+    tasks = TaskService.search_tasks(
+        db=db,
+        query=" ".join(terms),
+        user_id=None if user.is_admin else user.id,
+        limit=INLINE_RESULTS_LIMIT + 1,
+    )
+    if tasks is None:
+        return []
+    hits = [
+        _Hit(task.id, task.title, task.status, task.end_date, frozenset(search_terms(f"{task.title} {task.description or ''}")))
+        for task in tasks[:INLINE_RESULTS_LIMIT]
+    ]
+    _recent.set(telegram_id, _Recent(terms, len(tasks) <= INLINE_RESULTS_LIMIT, hits))
+    return hits
+
+
+def _article(hit: _Hit) -> InlineQueryResultArticle:
+    end = gregorian_to_jalali(hit.end_date)
+    return InlineQueryResultArticle(
+        id=str(hit.id),
+        title=hit.title,
+        description=t("inline_task_description", status=hit.status, end=end),
+        input_message_content=InputTextMessageContent(
+            message_text=t("inline_task_message", title=hit.title, status=hit.status, end=end)
+        ),
+        reply_markup=_task_card_template().render(task_id=hit.id),
+    )
+
+
+# ====== Inline mode: '@bot <query>' ======
+@router.inline_query()
+async def handle_inline_query(inline_query: InlineQuery):
+    db = None
+    try:
+        db = next(get_db())
+        hits = lookup(db, inline_query.from_user.id, inline_query.query)
+        results = [_article(hit) for hit in hits]
+    except Exception:
+        logger.exception("Unexpected error occurred in handle_inline_query")
+        results = []
+    finally:
+        if db is not None:
+            try:
+                db.close()
+            except Exception:
+                logger.exception("Failed to close DB session in handle_inline_query")
+
+    try:
+        # Results depend on who asks, so Telegram must cache them per user
+        await answer_last(inline_query.answer(results, cache_time=config.INLINE_CACHE_TIME, is_personal=True))
+    except Exception:
+        logger.exception("Failed to answer inline query")
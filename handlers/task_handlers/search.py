@@ -0,0 +1,177 @@
+from aiogram import F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from database import get_db
+from logger import logger
+from services.task_services import TaskService
+from services.user_services import UserService
+from utils.payload_store import payload_store
+from utils.texts import t
+from .. import main_router as router
+from .. import answer_last, del_message
+
+SEARCH_PAGE_SIZE = 8
+
+
+class SearchStates(StatesGroup):
+    waiting_for_query = State()
+
+
+def _search_scope(db, message: Message) -> dict | None:
+    """
+    Group/topic the search is limited to: the current topic or group in group
+    chats, everything in private chats. None when the chat has no tasks at all.
+    """
+    if message.chat.type not in ("group", "supergroup"):
+        return {}
+    if message.is_topic_message:
+        topic = TaskService.get_topic(db=db, tID=str(message.message_thread_id))
+        return {"topic_id": topic.id} if topic else None
+    group = TaskService.get_group(db=db, tID=str(message.chat.id))
+    return {"group_id": group.id} if group else None
+
+
+def _results_keyboard(tasks, token: str, page: int, has_next: bool, is_admin: bool) -> InlineKeyboardMarkup:
+    # Admins get the management view, members the read-only one
+    show_type = "view_task" if is_admin else "show_task"
+    rows = [[InlineKeyboardButton(text=task.title, callback_data=f"{show_type}|{task.id}")] for task in tasks]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text=t("btn_prev_page"), callback_data=f"search|{token}|{page - 1}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text=t("btn_next_page"), callback_data=f"search|{token}|{page + 1}"))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text=t("btn_cancel"), callback_data="search_cancel")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def _search_page(db, telegram_user, search: dict, page: int) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Text and keyboard of one page of results, the caller's own tasks only for non-admins."""
+    user = UserService.get_user(db=db, user_tID=str(telegram_user.id), username=telegram_user.username)
+    if not user:
+        return t("search_not_registered"), None
+    is_admin = bool(user.is_admin)
+
+    tasks = TaskService.search_tasks(
+        db=db,
+        query=search["query"],
+        group_id=search.get("group_id"),
+        topic_id=search.get("topic_id"),
+        user_id=None if is_admin else user.id,
+        # One extra row tells whether there is a next page
+        limit=SEARCH_PAGE_SIZE + 1,
+        offset=page * SEARCH_PAGE_SIZE,
+    )
+    if tasks is None:
+        return t("generic_error"), None
+    if not tasks:
+        return t("search_no_results", query=search["query"]), None
+
+    token = search.get("token") or payload_store.put(search)
+    keyboard = _results_keyboard(tasks[:SEARCH_PAGE_SIZE], token, page, len(tasks) > SEARCH_PAGE_SIZE, is_admin)
+    return t("search_results", query=search["query"], page=page + 1), keyboard
+
+
+async def _answer_search(message: Message, query: str):
+    db = None
+    try:
+        db = next(get_db())
+        scope = _search_scope(db, message)
+        if scope is None:
+            em = await message.answer(t("no_tasks_found"))
+            await del_message(3, em)
+            return
+
+        text, keyboard = _search_page(db, message.from_user, {"query": query[:200], **scope}, 0)
+        if keyboard is None:
+            em = await message.answer(text)
+            await del_message(3, em)
+            return
+        await message.answer(text, reply_markup=keyboard)
+
+    except Exception:
+        logger.exception("Unexpected error occurred in task search")
+        try:
+            await message.answer(t("generic_error"))
+        except Exception:
+            logger.exception("Failed to send error message")
+
+    finally:
+        if db is not None:
+            try:
+                db.close()
+            except Exception:
+                logger.exception("Failed to close DB session in task search")
+
+
+# ====== /search <query> and the menu button ======
+@router.message(Command("search"))
+@router.message(F.text == "جستجوی تسک")
+async def handle_search(message: Message, state: FSMContext, command: CommandObject = None):
+    query = (command.args or "").strip() if command else ""
+    if not query:
+        # Ask for the query and take the next message as it
+        await state.set_state(SearchStates.waiting_for_query)
+        await message.answer(
+            t("search_prompt"),
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[[InlineKeyboardButton(text=t("btn_cancel"), callback_data="search_cancel")]]
+            )
+        )
+        return
+    await _answer_search(message, query)
+    await del_message(3, message)
+
+
+@router.message(SearchStates.waiting_for_query, F.text)
+async def process_search_query(message: Message, state: FSMContext):
+    await state.clear()
+    await _answer_search(message, message.text.strip())
+
+
+# ====== Result pages: 'search|<token>|<page>' ======
+@router.callback_query(F.data.startswith("search|"))
+async def handle_search_page(callback_query: CallbackQuery):
+    db = None
+    try:
+        _, token, page = callback_query.data.split("|")
+        search = payload_store.get(token)
+        if not search:
+            await answer_last(callback_query.answer(t("search_expired"), show_alert=True))
+            return
+
+        db = next(get_db())
+        text, keyboard = _search_page(db, callback_query.from_user, {**search, "token": token}, max(int(page), 0))
+        if keyboard is None:
+            await answer_last(callback_query.answer(text, show_alert=True))
+            return
+        await callback_query.message.edit_text(text, reply_markup=keyboard)
+        await callback_query.answer()
+
+    except Exception:
+        logger.exception("Unexpected error occurred in handle_search_page")
+        try:
+            await callback_query.answer(t("generic_error"))
+        except Exception:
+            logger.exception("Failed to send error message")
+
+    finally:
+        if db is not None:
+            try:
+                db.close()
+            except Exception:
+                logger.exception("Failed to close DB session in handle_search_page")
+
+
+@router.callback_query(F.data == "search_cancel")
+async def handle_search_cancel(callback_query: CallbackQuery, state: FSMContext):
+    await state.clear()
+    try:
+        await callback_query.message.delete()
+    except Exception:
+        pass
+    await answer_last(callback_query.answer())
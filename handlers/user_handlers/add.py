@@ -1,5 +1,5 @@
 from .. import main_router as router
-from .. import del_message, admin_require
+from .. import del_message, admin_require, answer_last
 from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from aiogram.filters import Command
 from aiogram import F
@@ -112,11 +112,12 @@ async def view_users(
             await message.answer(t("user_manage_title", user_count=user_count), reply_markup=keyboard)
         else:
             try:
-                await callback_query.message.edit_text(
+                edited = await callback_query.message.edit_text(
                     t("user_manage_title", user_count=user_count),
                     reply_markup=keyboard
                 )
-                await callback_query.answer()
+                # True instead of a Message: nothing changed, the edit was skipped
+                await callback_query.answer(t("user_refresh_success") if edited is True else None)
             except TelegramBadRequest:
                 await callback_query.answer(t("user_refresh_success"))
             except Exception:
@@ -272,7 +273,7 @@ async def handle_toggle_user(callback_query: CallbackQuery):
         # Toggle user role
         res = UserService.toggle_user(db=db, user_ID=user_ID)
         if not res:
-            await callback_query.answer(t("user_toggle_error"))
+            await answer_last(callback_query.answer(t("user_toggle_error")))
             return
 
         await callback_query.answer(t("user_toggle_success"))
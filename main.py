@@ -1,10 +1,22 @@
 import asyncio
 from logger import logger
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 from config import config
-from handlers import main_router
+from handlers import main_router, menu_texts
+from handlers.keyboards import reset_keyboards
+from middlewares import (
+    AdmissionMiddleware,
+    CallbackDedupeMiddleware,
+    ChatOrderMiddleware,
+    GetUpdatesLimit,
+    PrefilterMiddleware,
+    SkipUnchangedEdits,
+    ThrottlingMiddleware,
+    TokenBucket,
+)
 from aiogram.client.default import DefaultBotProperties
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.types import (
@@ -15,12 +27,36 @@ from aiogram.types import (
     BotCommandScopeAllGroupChats,
 )
 from models import User, init_db
+from services.task_archiver import TaskArchiver
 from services.user_services import UserService
 from database import get_db
-from utils.texts import t
+from utils.cache import add_sweep_hook, start_sweeper, stop_sweeper
+from utils.fsm_storage import SQLAlchemyStorage, TrackingStorage
+from utils.metrics import collect_metrics, register_metrics
+from utils.payload_store import payload_store
+from utils.update_queue import QueuedRequestHandler, UpdateQueue
+from utils.webhook_reply import ReplyRequestHandler
+from utils.webhook_cluster import WebhookCluster, consume_updates, report_metrics
+from utils.webhook_guard import WebhookGuard
+from utils.texts import catalog, t
 
 init_db()
 
+# texts.json edits are picked up on the next cache sweep, without a restart
+add_sweep_hook(catalog.reload_if_changed)
+
+# Long-done tasks are archived in batches from the cache sweeper
+if config.ARCHIVE_AFTER_DAYS > 0:
+    task_archiver = TaskArchiver(
+        after_days=config.ARCHIVE_AFTER_DAYS,
+        interval=config.ARCHIVE_INTERVAL,
+        batch_size=config.ARCHIVE_BATCH_SIZE,
+    )
+    add_sweep_hook(task_archiver.run, blocking=True)
+    register_metrics("archive", task_archiver.stats)
+catalog.add_reload_hook(reset_keyboards)
+register_metrics("texts", lambda: {"locales": catalog.locales(), "reloads": catalog.reloads})
+
 
 def ensure_initial_admin():
     """Create or promote the bootstrap admin configured in environment variables."""
@@ -79,6 +115,11 @@ if config.PROXY_URL:
 else:
     bot = Bot(token=config.TELEGRAM_BOT_TOKEN)
 
+# Edits that would leave a message as it is are answered locally
+skip_unchanged_edits = SkipUnchangedEdits(max_size=config.EDIT_CACHE_SIZE)
+bot.session.middleware(skip_unchanged_edits)
+register_metrics("edits", skip_unchanged_edits.stats)
+
 # Set commands
 async def set_commands(bot: Bot):
     """
@@ -94,11 +135,13 @@ async def set_commands(bot: Bot):
         BotCommand(command="/desc", description="ویرایش توضیحات تسک"),
         BotCommand(command="/time", description="تنظیم ددلاین تسک"),
         BotCommand(command="/attach", description="افزودن فایل به تسک"),
+        BotCommand(command="/search", description="جستجوی تسک"),
     ]
 
     group_user_commands = [
         BotCommand(command="/teledo", description="منوی دستورات"),
         BotCommand(command="/attach", description="افزودن فایل به تسک"),
+        BotCommand(command="/search", description="جستجوی تسک"),
     ]
 
     try:
@@ -144,20 +187,86 @@ async def set_commands(bot: Bot):
         except Exception:
             logger.exception("Failed to set admin commands for chat %s", admin_chat_id)
 
-dp = Dispatcher()
+# Conversation state storage, see config.FSM_STORAGE
+if config.FSM_STORAGE == "db":
+    sql_storage = SQLAlchemyStorage(
+        state_ttl=config.FSM_STATE_TTL,
+        flush_delay=config.FSM_FLUSH_DELAY,
+    )
+    # Its record cache is swept with the other caches, the rows in a worker thread
+    add_sweep_hook(sql_storage.purge_expired_rows, blocking=True)
+    storage = TrackingStorage(sql_storage, state_ttl=config.FSM_STATE_TTL)
+    # Conversations that were in progress before a restart
+    storage.seed(sql_storage.active_pairs())
+else:
+    storage = TrackingStorage(MemoryStorage(), state_ttl=config.FSM_STATE_TTL)
+
+# FSM middleware is registered by hand so it runs after the prefilter and inside the per-chat ordering
+dp = Dispatcher(storage=storage, disable_fsm=True)
+prefilter = PrefilterMiddleware(config.BOT_USERNAME, menu_texts(), storage)
+chat_order = ChatOrderMiddleware(max_concurrency=config.UPDATE_CONCURRENCY)
+throttling = ThrottlingMiddleware(
+    limits={
+        "heavy": TokenBucket(config.THROTTLE_HEAVY_RATE, config.THROTTLE_HEAVY_BURST),
+        "callback": TokenBucket(config.THROTTLE_CALLBACK_RATE, config.THROTTLE_CALLBACK_BURST),
+    },
+    chat_factor=config.THROTTLE_CHAT_FACTOR,
+    heavy_texts=menu_texts(),
+    max_keys=config.THROTTLE_MAX_KEYS,
+)
+callback_dedupe = CallbackDedupeMiddleware(ttl=config.CALLBACK_DEDUPE_TTL)
+admission = AdmissionMiddleware(
+    max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+    max_queued=config.ADMISSION_MAX_QUEUED,
+    deadline=config.ADMISSION_DEADLINE,
+)
+dp.update.outer_middleware(prefilter)
+dp.update.outer_middleware(throttling)
+dp.update.outer_middleware(chat_order)
+dp.update.outer_middleware(admission)
+# After the shedding middlewares, so a tap answered with a "retry" toast is not remembered
+dp.update.outer_middleware(callback_dedupe)
+dp.update.outer_middleware(dp.fsm)
+register_metrics("prefilter", prefilter.stats)
+register_metrics("throttling", throttling.stats)
+register_metrics("callback_dedupe", callback_dedupe.stats)
+register_metrics("chat_order", chat_order.stats)
+register_metrics("admission", admission.stats)
 
 # Add router
 dp.include_router(main_router)
 
+# Webhook updates wait here for the dispatcher (WEBHOOK_MODE=queue)
+update_queue = UpdateQueue(
+    dp,
+    bot,
+    maxsize=config.UPDATE_QUEUE_SIZE,
+    consumers=config.UPDATE_QUEUE_CONSUMERS,
+)
+register_metrics("update_queue", update_queue.stats)
+
 async def on_startup(bot: Bot):
+    # Drop callback payloads that expired while the bot was down
+    payload_store.purge_expired()
+    start_sweeper(config.CACHE_SWEEP_INTERVAL)
     if config.MODE.upper() == "PROD" and config.WEBHOOK_URL:
         try:
-            await bot.set_webhook(config.WEBHOOK_URL)
+            # Only the update types our handlers use
+            await bot.set_webhook(
+                config.WEBHOOK_URL,
+                allowed_updates=dp.resolve_used_update_types(),
+                secret_token=config.WEBHOOK_SECRET,
+            )
         except Exception:
             logger.exception("Failed to set webhook on startup")
     logger.info("Bot started!")
 
 async def on_shutdown(bot: Bot):
+    # Finish updates that were already acknowledged to Telegram
+    await update_queue.drain()
+    await stop_sweeper()
+    # Write out pending FSM states before the process exits
+    await dp.storage.close()
     if config.MODE.upper() == "PROD" and config.WEBHOOK_URL:
         try:
             await bot.delete_webhook()
@@ -165,6 +274,28 @@ async def on_shutdown(bot: Bot):
             logger.exception("Failed to delete webhook on shutdown")
     logger.info("Bot stopped!")
 
+def run_webhook_worker(index: int, updates, reports):
+    """Entry point of a webhook worker process (WEBHOOK_WORKERS > 1)."""
+    async def run():
+        start_sweeper(config.CACHE_SWEEP_INTERVAL)
+        reporter = asyncio.create_task(report_metrics(index, reports))
+        logger.info(f"Webhook worker {index} ready")
+        try:
+            await consume_updates(
+                updates,
+                dp,
+                bot,
+                concurrency=config.UPDATE_CONCURRENCY,
+                backlog=config.UPDATE_QUEUE_SIZE,
+            )
+        finally:
+            reporter.cancel()
+            await stop_sweeper()
+            await dp.storage.close()
+            await bot.session.close()
+
+    asyncio.run(run())
+
 def main():
     ensure_initial_admin()
     dp.startup.register(set_commands)
@@ -172,15 +303,51 @@ def main():
     dp.shutdown.register(on_shutdown)
     
     if config.MODE.upper() == "DEV":
-        asyncio.run(dp.start_polling(bot))
+        bot.session.middleware(GetUpdatesLimit(config.POLLING_LIMIT))
+        asyncio.run(dp.start_polling(
+            bot,
+            polling_timeout=config.POLLING_TIMEOUT,
+            allowed_updates=dp.resolve_used_update_types(),
+        ))
     else:
-        app = web.Application()
-        webhook_requests_handler = SimpleRequestHandler(
-            dispatcher=dp,
-            bot=bot,
+        # Secret token check and redelivery filter run before the body is parsed
+        webhook_guard = WebhookGuard(
+            "/webhook",
+            secret_token=config.WEBHOOK_SECRET,
+            seen_size=config.WEBHOOK_SEEN_UPDATES,
         )
-        
-        webhook_requests_handler.register(app, path="/webhook")
+        register_metrics("webhook_guard", webhook_guard.stats)
+        app = web.Application(middlewares=[webhook_guard.middleware])
+        if config.WEBHOOK_WORKERS > 1:
+            # Chat affinity keeps per-chat state on one worker, but only the
+            # database backends keep it across worker restarts
+            if config.FSM_STORAGE != "db" or config.PAYLOAD_STORE_BACKEND != "db":
+                logger.warning("Multi-worker webhook with in-memory FSM or payload store; state is lost when a worker restarts")
+            cluster = WebhookCluster(
+                run_webhook_worker,
+                workers=config.WEBHOOK_WORKERS,
+                queue_size=config.WEBHOOK_WORKER_QUEUE_SIZE,
+            )
+            cluster.register(app, path="/webhook")
+            # Workers handle the updates; their numbers are under webhook_cluster.per_worker
+            register_metrics("webhook_cluster", cluster.stats)
+        elif config.WEBHOOK_MODE == "queue":
+            webhook_requests_handler = QueuedRequestHandler(
+                dispatcher=dp,
+                bot=bot,
+                update_queue=update_queue,
+            )
+            webhook_requests_handler.register(app, path="/webhook")
+        elif config.WEBHOOK_MODE == "reply":
+            webhook_requests_handler = ReplyRequestHandler(dispatcher=dp, bot=bot)
+            webhook_requests_handler.register(app, path="/webhook")
+            register_metrics("webhook_reply", webhook_requests_handler.stats)
+        else:
+            webhook_requests_handler = SimpleRequestHandler(
+                dispatcher=dp,
+                bot=bot,
+            )
+            webhook_requests_handler.register(app, path="/webhook")
         setup_application(app, dp, bot=bot)
 
         async def healthcheck(request: web.Request):
@@ -188,6 +355,10 @@ def main():
             return web.Response(text="Telegram bot webhook is running")
         app.router.add_get("/", healthcheck)
         app.router.add_get("/health", healthcheck)
+
+        async def metrics(request: web.Request):
+            return web.json_response(collect_metrics())
+        app.router.add_get("/metrics", metrics)
         
         web.run_app(app, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
 
@@ -0,0 +1,7 @@
+from .admission import AdmissionMiddleware
+from .chat_order import ChatOrderMiddleware
+from .edits import SkipUnchangedEdits
+from .idempotency import CallbackDedupeMiddleware
+from .polling import GetUpdatesLimit
+from .prefilter import PrefilterMiddleware
+from .throttling import ThrottlingMiddleware, TokenBucket
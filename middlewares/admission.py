@@ -0,0 +1,79 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+
+from logger import logger
+from utils.texts import t
+
+
+class AdmissionMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that caps the number of updates being handled at once,
+    so a burst cannot exhaust the database pool and stall everyone.
+
+    Above `max_in_flight`:
+    - callback queries are shed right away with a short "busy, retry" toast;
+    - other updates wait for a slot for up to `deadline` seconds (at most
+      `max_queued` of them) and are shed when it passes.
+    """
+
+    def __init__(self, max_in_flight: int = 15, max_queued: int = 1000, deadline: float = 10):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.deadline = deadline
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        callback_query = event.callback_query if isinstance(event, Update) else None
+
+        if self._slots.locked():
+            if callback_query is not None:
+                self.shed += 1
+                # Returned to the dispatcher, so it can ride on the webhook response
+                return callback_query.answer(t("busy_retry"))
+            if self.waiting >= self.max_queued:
+                self.shed += 1
+                return UNHANDLED
+            self.queued += 1
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.deadline)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            logger.warning(f"Update shed after waiting {self.deadline}s for an admission slot")
+            return UNHANDLED
+        finally:
+            self.waiting -= 1
+
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
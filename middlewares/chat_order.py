@@ -0,0 +1,101 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class _ChatLane:
+    """Serial lane of one chat; `users` counts updates running or waiting on it."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that runs updates of one chat strictly one after
+    another, in arrival order, while different chats run in parallel.
+
+    - At most `max_concurrency` updates are handled at the same time.
+    - A chat's lane exists only while it has updates in flight and is dropped when it goes idle.
+    - Waiting and handling times are aggregated into `shards` buckets by chat id for `stats()`.
+
+    Must be registered before the FSM middleware, so state is read only after
+    the previous update of the chat has finished.
+
+    The lock is only waited on where every update runs in its own task
+    (polling, background and reply webhooks). `UpdateQueue` orders chats in its
+    own lanes before dispatching, so its consumers never wait here.
+    """
+
+    def __init__(self, max_concurrency: int = 64, shards: int = 16):
+        self.max_concurrency = max_concurrency
+        self.shards = shards
+        self._lanes: dict[int, _ChatLane] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._shard_stats = [
+            {"updates": 0, "wait_total": 0.0, "wait_max": 0.0, "handle_total": 0.0, "handle_max": 0.0}
+            for _ in range(shards)
+        ]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        key = chat.id if chat else user.id if user else None
+        if key is None:
+            async with self._semaphore:
+                return await handler(event, data)
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _ChatLane()
+        lane.users += 1
+        queued_at = time.monotonic()
+        try:
+            async with lane.lock, self._semaphore:
+                started = time.monotonic()
+                try:
+                    return await handler(event, data)
+                finally:
+                    self._record(key, started - queued_at, time.monotonic() - started)
+        finally:
+            lane.users -= 1
+            if lane.users == 0:
+                del self._lanes[key]
+
+    def _record(self, key: int, wait: float, elapsed: float):
+        shard = self._shard_stats[key % self.shards]
+        shard["updates"] += 1
+        shard["wait_total"] += wait
+        shard["wait_max"] = max(shard["wait_max"], wait)
+        shard["handle_total"] += elapsed
+        shard["handle_max"] = max(shard["handle_max"], elapsed)
+
+    def stats(self) -> dict:
+        shards = []
+        for index, shard in enumerate(self._shard_stats):
+            updates = shard["updates"]
+            shards.append({
+                "shard": index,
+                "updates": updates,
+                "wait_avg_ms": round(shard["wait_total"] / updates * 1000, 2) if updates else 0.0,
+                "wait_max_ms": round(shard["wait_max"] * 1000, 2),
+                "handle_avg_ms": round(shard["handle_total"] / updates * 1000, 2) if updates else 0.0,
+                "handle_max_ms": round(shard["handle_max"] * 1000, 2),
+            })
+        return {
+            "active_chats": len(self._lanes),
+            "max_concurrency": self.max_concurrency,
+            "shards": shards,
+        }
@@ -0,0 +1,123 @@
+from __future__ import annotations
+from typing import Any, Hashable
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import (
+    DeleteMessage,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendMessage,
+    TelegramMethod,
+)
+from aiogram.types import Message
+
+from utils.cache import TTLCache
+
+# Telegram refuses to edit messages older than this anyway
+EDITABLE_FOR = 48 * 3600
+
+
+# Shared keyboards (see handlers.keyboards) are serialized for fingerprinting only once
+_markup_fingerprints = TTLCache("markup_fingerprints", max_size=1024, ttl=3600)
+
+
+def _markup_fingerprint(markup: Any) -> int:
+    if markup is None:
+        return hash(None)
+    cached = _markup_fingerprints.get(id(markup))
+    if cached is not None and cached[0] is markup:
+        return cached[1]
+    fingerprint = hash(markup.model_dump_json(exclude_none=True))
+    # The markup is kept alive with its fingerprint, so its id is not reused meanwhile
+    _markup_fingerprints.set(id(markup), (markup, fingerprint))
+    return fingerprint
+
+
+def _text_fingerprint(method: SendMessage | EditMessageText) -> int:
+    entities = tuple(entity.model_dump_json(exclude_none=True) for entity in method.entities or ())
+    return hash((method.text, str(method.parse_mode), entities))
+
+
+class SkipUnchangedEdits(BaseRequestMiddleware):
+    """
+    Bot session middleware that drops message edits which would not change anything.
+
+    - The fingerprint of what each message currently shows (text and keyboard)
+      is kept per (chat_id, message_id) in a bounded LRU, recorded from sent
+      messages and successful edits.
+    - An `editMessageText` / `editMessageReplyMarkup` with the same fingerprint
+      is answered with True without calling the API; `skipped` counts them.
+    - Edits Telegram rejects as "message is not modified" teach the cache too,
+      other failures, caption/media edits and deletions forget the message.
+
+    Only calls that go through the bot session are seen, so methods sent back
+    in a webhook response are not tracked.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl: float = EDITABLE_FOR):
+        self._rendered = TTLCache("rendered_messages", max_size=max_size, ttl=ttl)
+        self.skipped = 0
+        self.sent = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        if isinstance(method, (EditMessageText, EditMessageReplyMarkup)) and method.message_id is not None:
+            return await self._edit(make_request, bot, method)
+
+        if isinstance(method, (EditMessageCaption, EditMessageMedia, DeleteMessage)) and method.message_id is not None:
+            self._rendered.pop((method.chat_id, method.message_id))
+        result = await make_request(bot, method)
+        if isinstance(method, SendMessage) and isinstance(result, Message):
+            self._rendered.set(
+                (result.chat.id, result.message_id),
+                (_text_fingerprint(method), _markup_fingerprint(method.reply_markup)),
+            )
+        return result
+
+    async def _edit(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: EditMessageText | EditMessageReplyMarkup,
+    ) -> Any:
+        key: Hashable = (method.chat_id, method.message_id)
+        current = self._rendered.get(key)
+        markup = _markup_fingerprint(method.reply_markup)
+        if isinstance(method, EditMessageText):
+            rendered = (_text_fingerprint(method), markup)
+        elif current is not None:
+            rendered = (current[0], markup)
+        else:
+            rendered = None
+
+        if rendered is not None and rendered == current:
+            self.skipped += 1
+            return True
+
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message and rendered is not None:
+                self._rendered.set(key, rendered)
+            else:
+                self._rendered.pop(key)
+            raise
+        self.sent += 1
+        if rendered is not None:
+            self._rendered.set(key, rendered)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "skipped": self.skipped,
+            "sent": self.sent,
+            "tracked": len(self._rendered),
+        }
@@ -0,0 +1,62 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+
+from utils.cache import TTLCache
+
+# Callbacks whose second run repeats a destructive action or its notifications
+DESTRUCTIVE_CALLBACK_PREFIXES = ("delete_task|", "delete_user_final|", "del_user|", "change_status|", "cal_pick|")
+
+
+class CallbackDedupeMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that collapses repeated taps on the same button.
+
+    A callback is keyed by (user, message_id, callback_data). While one is being
+    handled, and for `ttl` seconds after it finished, identical callbacks are only
+    acknowledged (to stop the button spinner) and counted in `suppressed`.
+
+    Registered after throttling and admission, so a tap they shed is never
+    recorded; an update that still comes back UNHANDLED is forgotten as well,
+    so the retry runs.
+    """
+
+    def __init__(self, prefixes: Iterable[str] = DESTRUCTIVE_CALLBACK_PREFIXES, ttl: float = 5, max_size: int = 10000):
+        self.prefixes = tuple(prefixes)
+        self.ttl = ttl
+        self._seen = TTLCache("callback_dedupe", max_size=max_size, ttl=ttl)
+        self.suppressed = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        callback_query = event.callback_query if isinstance(event, Update) else None
+        if callback_query is None or not (callback_query.data or "").startswith(self.prefixes):
+            return await handler(event, data)
+
+        message_id = callback_query.message.message_id if callback_query.message else None
+        key = (callback_query.from_user.id, message_id, callback_query.data)
+        if key in self._seen:
+            self.suppressed += 1
+            return callback_query.answer()
+
+        # In flight entries must outlive any handler; the ttl restarts once it is done
+        self._seen.set(key, True, ttl=float("inf"))
+        result = None
+        try:
+            result = await handler(event, data)
+            return result
+        finally:
+            if result is UNHANDLED:
+                self._seen.pop(key)
+            else:
+                self._seen.set(key, True)
+
+    def stats(self) -> dict:
+        return {"suppressed": self.suppressed}
@@ -0,0 +1,26 @@
+from __future__ import annotations
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import GetUpdates, Response, TelegramMethod
+
+
+class GetUpdatesLimit(BaseRequestMiddleware):
+    """
+    Bot session middleware that caps how many updates one long-poll request fetches.
+    aiogram's polling loop does not expose `limit`, so it is set on the way out.
+    """
+
+    def __init__(self, limit: int = 100):
+        self.limit = limit
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Response[Any]:
+        if isinstance(method, GetUpdates) and method.limit is None:
+            method.limit = self.limit
+        return await make_request(bot, method)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.enums import ChatType, ContentType
+from aiogram.types import Message, TelegramObject, Update
+
+from utils.fsm_storage import TrackingStorage
+
+# Ordinary group chatter; service messages always pass
+_DROPPABLE_CONTENT = {
+    ContentType.TEXT,
+    ContentType.PHOTO,
+    ContentType.DOCUMENT,
+    ContentType.VIDEO,
+    ContentType.AUDIO,
+    ContentType.VOICE,
+    ContentType.VIDEO_NOTE,
+    ContentType.ANIMATION,
+    ContentType.STICKER,
+    ContentType.LOCATION,
+    ContentType.CONTACT,
+    ContentType.POLL,
+}
+
+
+class PrefilterMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that drops group messages the bot has nothing to do
+    with, before routers, FSM storage or the database are touched.
+
+    A group message passes when it is a command, mentions the bot, replies to the
+    bot, is a menu button text, or its sender has an active conversation in that
+    chat. Private chats, callbacks and every other update type always pass.
+    """
+
+    def __init__(self, bot_username: str, menu_texts: Iterable[str], storage: TrackingStorage):
+        self.mention = f"@{bot_username.lstrip('@').lower()}" if bot_username else None
+        self.menu_texts = frozenset(menu_texts)
+        self.storage = storage
+        self.passed = 0
+        self.dropped = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        message = event.message if isinstance(event, Update) else None
+        if message is not None and not self.is_relevant(message, data["bot"].id):
+            self.dropped += 1
+            return UNHANDLED
+        self.passed += 1
+        return await handler(event, data)
+
+    def is_relevant(self, message: Message, bot_id: int) -> bool:
+        if message.chat.type == ChatType.PRIVATE or message.content_type not in _DROPPABLE_CONTENT:
+            return True
+
+        text = (message.text or message.caption or "").strip()
+        if text.startswith("/") or text in self.menu_texts:
+            return True
+        if self.mention and self.mention in text.lower():
+            return True
+        reply = message.reply_to_message
+        if reply is not None and reply.from_user is not None and reply.from_user.id == bot_id:
+            return True
+        user = message.from_user
+        return user is not None and self.storage.is_active(message.chat.id, user.id)
+
+    def stats(self) -> dict:
+        return {"passed": self.passed, "dropped": self.dropped}
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+
+from utils.cache import TTLCache
+from utils.texts import t
+
+# Commands and callbacks that build full task or user listings
+HEAVY_COMMANDS = frozenset({"tasks", "tasks_management", "my_tasks", "users_management", "user", "teledo"})
+HEAVY_CALLBACK_PREFIXES = ("refresh_operation|", "back_to_task_list", "view_group|", "view_topic|", "teledo|")
+
+
+class TokenBucket:
+    """Rate in tokens per second and burst size of one throttling class."""
+
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+
+    @property
+    def refill_time(self) -> float:
+        """Seconds until an empty bucket is full again."""
+        return self.burst / self.rate
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Outer update middleware with token buckets per user and per chat.
+
+    Updates are classified as "heavy" (listing commands, menu texts and callbacks),
+    "callback" (other callback queries) or not throttled at all. A user's bucket
+    allows `limits[cls]`; the chat bucket allows `chat_factor` times that, so a
+    whole group cannot hammer listings either. Throttled callbacks get a toast,
+    throttled messages are dropped silently.
+
+    Buckets live in a bounded TTLCache and expire once they would be full again.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, TokenBucket],
+        chat_factor: float = 5,
+        heavy_texts: Iterable[str] = (),
+        max_keys: int = 10000,
+    ):
+        self.limits = limits
+        self.chat_factor = chat_factor
+        self.heavy_texts = frozenset(heavy_texts)
+        self._buckets = TTLCache("throttle_buckets", max_size=max_keys)
+        self.throttled = {name: 0 for name in limits}
+
+    def classify(self, event: Update) -> str | None:
+        if event.callback_query is not None:
+            data = event.callback_query.data or ""
+            return "heavy" if data.startswith(HEAVY_CALLBACK_PREFIXES) else "callback"
+        message = event.message
+        if message is None or not message.text:
+            return None
+        text = message.text.strip()
+        if text in self.heavy_texts:
+            return "heavy"
+        words = text.split()
+        # "@bot /cmd" is handled like "/cmd"
+        if len(words) > 1 and words[0].startswith("@"):
+            words = words[1:]
+        if words and words[0].startswith("/"):
+            command = words[0][1:].split("@")[0].lower()
+            if command in HEAVY_COMMANDS:
+                return "heavy"
+        return None
+
+    def _take(self, key: tuple, bucket: TokenBucket) -> bool:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (bucket.burst, now))
+        tokens = min(bucket.burst, tokens + (now - updated_at) * bucket.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets.set(key, (tokens, now), ttl=bucket.refill_time)
+        return allowed
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        cls = self.classify(event) if isinstance(event, Update) else None
+        bucket = self.limits.get(cls)
+        if bucket is None:
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        allowed = True
+        if user is not None:
+            allowed = self._take((cls, "user", user.id), bucket)
+        if allowed and chat is not None and chat.id != getattr(user, "id", None):
+            chat_bucket = TokenBucket(bucket.rate * self.chat_factor, int(bucket.burst * self.chat_factor))
+            allowed = self._take((cls, "chat", chat.id), chat_bucket)
+        if allowed:
+            return await handler(event, data)
+
+        self.throttled[cls] += 1
+        if event.callback_query is not None:
+            return event.callback_query.answer(t("rate_limited"))
+        return UNHANDLED
+
+    def stats(self) -> dict:
+        return {"throttled": dict(self.throttled), "buckets": len(self._buckets)}
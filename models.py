@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, PickleType, inspect
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, PickleType, event, func, inspect, select, text, update
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import CreateColumn
 from database import Base, engine
 from sqlalchemy.ext.mutable import MutableList
 from datetime import datetime
@@ -50,6 +52,12 @@ class Task(Base):
     start_date = Column(DateTime, nullable=True, default=datetime.now)
     end_date = Column(DateTime, nullable=True)
     status = Column(String(50), default="pending", nullable=False)
+    # Bumped on every edit; edits compare-and-swap on it (see TaskService.edit_task)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Set when the status becomes "done"; done tasks are archived some days later
+    completed_at = Column(DateTime, nullable=True)
+    # Archived tasks are left out of listings (see TaskService.archive_done_tasks)
+    archived_at = Column(DateTime, nullable=True)
     
     group = relationship("Group", back_populates="tasks")
     topic = relationship("Topic", back_populates="tasks")
@@ -58,6 +66,31 @@ class Task(Base):
     
     attachments = relationship("TaskAttachment", back_populates="task", cascade="all, delete")
 
+    __table_args__ = (
+        # Listings only read live tasks, archived rows are kept out of these indexes.
+        # Scope, then the status chip (equality), then the deadline sort (range):
+        # each filtered listing is a single index range scan in deadline order.
+        Index(
+            "ix_tasks_live_group_status_end", "group_id", "status", "end_date",
+            postgresql_where=text("archived_at IS NULL"), sqlite_where=text("archived_at IS NULL"),
+        ),
+        Index(
+            "ix_tasks_live_topic_status_end", "topic_id", "status", "end_date",
+            postgresql_where=text("archived_at IS NULL"), sqlite_where=text("archived_at IS NULL"),
+        ),
+        Index(
+            "ix_tasks_live_status_end", "status", "end_date",
+            postgresql_where=text("archived_at IS NULL"), sqlite_where=text("archived_at IS NULL"),
+        ),
+        # Done tasks waiting to be archived
+        Index(
+            "ix_tasks_archive_due",
+            "completed_at",
+            postgresql_where=text("status = 'done' AND archived_at IS NULL"),
+            sqlite_where=text("status = 'done' AND archived_at IS NULL"),
+        ),
+    )
+
 class UserTask(Base):
     __tablename__ = "users_tasks"
     
@@ -67,6 +100,9 @@ class UserTask(Base):
     user = relationship("User", back_populates="tasks")
     task = relationship("Task", back_populates="assigned_users")
 
+    # (user_id, task_id) is the primary key; this one serves lookups by task
+    __table_args__ = (Index("ix_users_tasks_task", "task_id"),)
+
 
 class TaskAttachment(Base):
     __tablename__ = "task_attachments"
@@ -80,6 +116,124 @@ class TaskAttachment(Base):
     task = relationship("Task", back_populates="attachments")
 
 
+class CallbackPayload(Base):
+    __tablename__ = "callback_payloads"
+
+    # Short token referenced from inline keyboard callback data
+    token = Column(String(32), primary_key=True)
+    # JSON encoded payload that does not fit into Telegram's 64-byte callback data
+    payload = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+
+    # Storage key built from bot, chat, user, thread and destiny
+    key = Column(String(255), primary_key=True)
+    state = Column(String(255), nullable=True)
+    # Compact JSON encoded FSM data
+    data = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now, index=True)
+
+
+# Full-text search over task titles and descriptions (see TaskService.search_tasks).
+# PostgreSQL: GIN expression index over a title-weighted tsvector; the query
+# repeats the same expression so the planner uses the index.
+TASK_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+# SQLite: external-content FTS5 table over `tasks`, kept in sync by triggers
+TASK_SEARCH_TABLE = "tasks_fts"
+_SQLITE_SEARCH_DDL = (
+    f"CREATE VIRTUAL TABLE {TASK_SEARCH_TABLE} USING fts5("
+    "title, description, content='tasks', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+    f"INSERT INTO {TASK_SEARCH_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    f"CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+    f"INSERT INTO {TASK_SEARCH_TABLE}({TASK_SEARCH_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    f"CREATE TRIGGER tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN "
+    f"INSERT INTO {TASK_SEARCH_TABLE}({TASK_SEARCH_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    f"INSERT INTO {TASK_SEARCH_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    # Index the rows of a table that existed before search was added
+    f"INSERT INTO {TASK_SEARCH_TABLE}({TASK_SEARCH_TABLE}) VALUES ('rebuild')",
+)
+
+
+def has_search_table(connection) -> bool:
+    """Whether the SQLite FTS5 search table exists (SQLite may be built without FTS5)."""
+    return bool(connection.execute(text(f"SELECT 1 FROM sqlite_master WHERE name = '{TASK_SEARCH_TABLE}'")).first())
+
+
+def create_search_index(connection):
+    """Create the task search index for the connection's dialect if it is missing."""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_tasks_search ON tasks USING GIN (({TASK_SEARCH_VECTOR}))"))
+    elif dialect == "sqlite" and not has_search_table(connection):
+        try:
+            for ddl in _SQLITE_SEARCH_DDL:
+                connection.execute(text(ddl))
+        except OperationalError:
+            logger.warning("SQLite has no FTS5, task search falls back to LIKE")
+
+
+def _drop_search_table(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(f"DROP TABLE IF EXISTS {TASK_SEARCH_TABLE}"))
+
+
+event.listen(Task.__table__, "after_create", lambda target, connection, **kw: create_search_index(connection))
+event.listen(Task.__table__, "after_drop", _drop_search_table)
+
+
+def _add_missing_columns(inspector):
+    """
+    Add columns that were introduced after the table was created (ALTER TABLE ... ADD COLUMN).
+    The column DDL (quoting, type, server default, NOT NULL) is compiled by SQLAlchemy for the engine's dialect.
+    """
+    preparer = engine.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            with engine.begin() as conn:
+                if not column.nullable and column.server_default is None:
+                    if conn.execute(select(text("1")).select_from(table).limit(1)).first():
+                        raise RuntimeError(
+                            f"Cannot add NOT NULL column {table.name}.{column.name} without a server default "
+                            "to a table that has rows; migrate it by hand"
+                        )
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}"))
+            logger.info(f"Added missing column {table.name}.{column.name}")
+
+
+def _add_missing_indexes():
+    """Create indexes that were introduced after the table was created."""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
+def _backfill_completed_at():
+    """
+    Give done tasks from before `completed_at` existed a completion time (their
+    start date, or now), so archiving can range-scan `completed_at` alone.
+    """
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(Task)
+            .where(Task.status == "done", Task.completed_at.is_(None), Task.archived_at.is_(None))
+            .values(completed_at=func.coalesce(Task.start_date, datetime.now()))
+        )
+    if result.rowcount:
+        logger.info(f"Backfilled completed_at of {result.rowcount} done tasks")
+
+
 def init_db():
     try:
         inspector = inspect(engine)
@@ -90,9 +244,25 @@ def init_db():
             Base.metadata.create_all(bind=engine)
             logger.info("Tables created successfully.")
         else:
-            logger.info("Tables already exist. Skipping creation.")
+            # Tables added after the first deployment still have to be created
+            missing_tables = [
+                table for table in Base.metadata.sorted_tables
+                if table.name not in existing_tables
+            ]
+            if missing_tables:
+                logger.info(f"Creating missing tables: {', '.join(t.name for t in missing_tables)}")
+                Base.metadata.create_all(bind=engine, tables=missing_tables)
+            else:
+                logger.info("Tables already exist. Skipping creation.")
+            _add_missing_columns(inspector)
+            _add_missing_indexes()
+            _backfill_completed_at()
+            with engine.begin() as conn:
+                create_search_index(conn)
     except Exception:
+        # A half-migrated schema must not be served
         logger.exception("Failed to create the tables")
+        raise
 
 if __name__ == "__main__":
     init_db()
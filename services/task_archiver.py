@@ -0,0 +1,59 @@
+from __future__ import annotations
+import time
+from datetime import timedelta
+from typing import Callable
+
+from database import SessionLocal
+from logger import logger
+from services.task_services import TaskService
+
+
+class TaskArchiver:
+    """
+    Moves long-done tasks out of the listings, run as a blocking cache sweep
+    hook (in a worker thread, off the event loop).
+
+    - Every `interval` seconds one batch of tasks done for more than
+      `after_days` days gets `archived_at` set.
+    - While batches come back full the next one runs on the following sweep
+      instead of after a whole interval, so a backlog is worked off in short
+      transactions rather than one long update.
+    """
+
+    def __init__(
+        self,
+        after_days: int = 30,
+        interval: float = 3600,
+        batch_size: int = 500,
+        session_factory: Callable = SessionLocal,
+    ):
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self._next_run = 0.0
+        self.archived = 0
+        self.batches = 0
+
+    def run(self) -> int:
+        """Archive one batch when due. Returns the number of tasks archived."""
+        now = time.monotonic()
+        if now < self._next_run:
+            return 0
+        db = None
+        try:
+            db = self.session_factory()
+            archived = TaskService.archive_done_tasks(db, timedelta(days=self.after_days), self.batch_size) or 0
+        finally:
+            if db is not None:
+                db.close()
+
+        self.batches += 1
+        self.archived += archived
+        self._next_run = now if archived >= self.batch_size else now + self.interval
+        if archived:
+            logger.info(f"Archived {archived} done tasks")
+        return archived
+
+    def stats(self) -> dict:
+        return {"archived": self.archived, "batches": self.batches}
@@ -1,13 +1,51 @@
 from __future__ import annotations
+import re
+from sqlalchemy import case, column, func, literal_column, or_, table, update
 from sqlalchemy.orm import Session
-from models import Group, Topic, User, Task, UserTask, TaskAttachment
-from datetime import datetime
+from models import Group, Topic, User, Task, UserTask, TaskAttachment, TASK_SEARCH_TABLE, TASK_SEARCH_VECTOR, has_search_table
+from datetime import date, datetime, time, timedelta
 from logger import logger
-from typing import List, Literal
+from typing import Dict, List, Literal, NamedTuple
+from config import config
+from utils.cache import TTLCache
 from utils.decorators import exception_decorator
 from utils.date_utils import jalali_to_gregorian
 import uuid
 
+_SEARCH_TERM = re.compile(r"\w+")
+# Words of a query that are matched, the rest is ignored
+MAX_SEARCH_TERMS = 8
+
+
+def search_terms(text: str) -> list[str]:
+    """Lowercased words of `text` as `TaskService.search_tasks` matches them."""
+    return _SEARCH_TERM.findall(text.lower())
+
+_search_table = table(TASK_SEARCH_TABLE, column("rowid"))
+
+
+def _archived_filter(archived: bool):
+    return Task.archived_at.isnot(None) if archived else Task.archived_at.is_(None)
+
+
+def _listing_order(sort: str | None) -> tuple:
+    """Creation order, or nearest deadline first with undated tasks last."""
+    if sort == "deadline":
+        return Task.end_date.asc().nulls_last(), Task.id
+    return (Task.id,)
+
+
+class TaskCounts(NamedTuple):
+    open: int
+    overdue: int
+
+
+# Open/overdue counts per group or topic for the navigation buttons, keyed by
+# (by, group_id). Cleared whenever a task is created, deleted or changes
+# status, deadline or place; the TTL bounds how stale other processes get.
+_task_counts = TTLCache("task_counts", max_size=256, ttl=config.TASK_COUNTS_TTL)
+
+
 class TaskService:
     VALID_STATUSES = {"pending", "in_progress", "done", "blocked"}
 
@@ -152,16 +190,18 @@ class TaskService:
         db.add(task)
         db.commit()
         db.refresh(task)
+        _task_counts.clear()
         return task
     
     @staticmethod
     @exception_decorator
-    def get_task_by_admin_id(db: Session, admin_id: int) -> List[Task] | None:
+    def get_task_by_admin_id(db: Session, admin_id: int, archived: bool = False) -> List[Task] | None:
         """
         Retrieve all tasks created by a specific admin.
         """
         tasks = db.query(Task).filter(
-            Task.admin_id == admin_id
+            Task.admin_id == admin_id,
+            _archived_filter(archived)
         ).all()
         return tasks
     
@@ -184,6 +224,7 @@ class TaskService:
         """
         db.delete(task)
         db.commit()
+        _task_counts.clear()
         return True
 
     @staticmethod
@@ -218,42 +259,60 @@ class TaskService:
 
     @staticmethod
     @exception_decorator
-    def edit_task(db: Session, task_id: int, name: str = None, description: str = None, start_date: str = None, end_date: str = None, status: str = None, group_id: int = None, topic_id: int = None) -> Literal[True, "NOT_EXIST"] | None:
+    def edit_task(db: Session, task_id: int, name: str = None, description: str = None, start_date: str = None, end_date: str = None, status: str = None, group_id: int = None, topic_id: int = None, expected_version: int = None) -> Literal[True, "NOT_EXIST", "CONFLICT"] | None:
         """
         Edit task details such as name, description, start_date, end_date, and status.
         Returns "NOT_EXIST" if the task does not exist.
-        """
-        task = db.query(Task).filter(
-            Task.id == task_id
-        ).first()
-
-        if not task:
-            return "NOT_EXIST"
 
+        With `expected_version` the row is only written while its version still
+        matches (compare-and-swap); otherwise "CONFLICT" is returned and nothing changes.
+        """
+        values = {}
         if name:
-            task.title = name
+            values["title"] = name
         if description:
-            task.description = description
+            values["description"] = description
         if start_date:
-            if isinstance(start_date, str):
-                task.start_date = jalali_to_gregorian(start_date)
-            else:
-                task.start_date = start_date
+            values["start_date"] = jalali_to_gregorian(start_date) if isinstance(start_date, str) else start_date
         if end_date:
-            if isinstance(end_date, str):
-                task.end_date = jalali_to_gregorian(end_date)
-            else:
-                task.end_date = end_date
+            values["end_date"] = jalali_to_gregorian(end_date) if isinstance(end_date, str) else end_date
         if status and status in TaskService.VALID_STATUSES:
-            task.status = status
+            values["status"] = status
+            if status == "done":
+                # Keep the first completion time when "done" is set again
+                values["completed_at"] = case((Task.status == "done", Task.completed_at), else_=datetime.now())
+            else:
+                # Reopening an archived task brings it back to the listings
+                values["completed_at"] = None
+                values["archived_at"] = None
         if group_id is not None:
-            task.group_id = group_id
+            values["group_id"] = group_id
         if topic_id is not None:
-            task.topic_id = topic_id
+            values["topic_id"] = topic_id
 
-        db.commit()
-        db.refresh(task)
-        return True
+        conditions = [Task.id == task_id]
+        if expected_version is not None:
+            conditions.append(Task.version == expected_version)
+
+        if values:
+            # Single UPDATE ... WHERE id = ? AND version = ?, no row lock is held in between
+            result = db.execute(
+                update(Task)
+                .where(*conditions)
+                .values(**values, version=Task.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            if result.rowcount:
+                if values.keys() & {"status", "end_date", "group_id", "topic_id"}:
+                    _task_counts.clear()
+                return True
+        elif db.query(Task.id).filter(*conditions).first():
+            return True
+
+        if not db.query(Task.id).filter(Task.id == task_id).first():
+            return "NOT_EXIST"
+        return "CONFLICT"
 
     @staticmethod
     @exception_decorator
@@ -278,34 +337,141 @@ class TaskService:
     
     @staticmethod
     @exception_decorator
-    def get_all_tasks(db: Session, group_id: int = None, topic_id: int = None) -> List[Task] | None:
+    def get_all_tasks(
+        db: Session,
+        group_id: int = None,
+        topic_id: int = None,
+        archived: bool = False,
+        status: str = None,
+        sort: Literal["deadline"] | None = None,
+    ) -> List[Task] | None:
         """
         Retrieve all tasks.
-        It can be filltered by group_id or topic_id
+        It can be filltered by group_id or topic_id, and by status.
+        Archived tasks are left out, or returned alone with `archived=True`.
+        Tasks come in creation order, or by deadline with `sort="deadline"`.
         """
+        query = db.query(Task).filter(_archived_filter(archived))
+        if status:
+            query = query.filter(Task.status == status)
         if group_id != None and topic_id == False:
-            tasks = db.query(Task).filter(Task.group_id==group_id, Task.topic_id.is_(None)).all()
+            query = query.filter(Task.group_id==group_id, Task.topic_id.is_(None))
         elif group_id:
-            tasks = db.query(Task).filter(Task.group_id == group_id).all()
+            query = query.filter(Task.group_id == group_id)
         elif group_id == False:
-            tasks = db.query(Task).filter(Task.group_id.is_(None)).all()
+            query = query.filter(Task.group_id.is_(None))
         elif topic_id:
-            tasks = db.query(Task).filter(Task.topic_id == topic_id).all()
+            query = query.filter(Task.topic_id == topic_id)
         elif topic_id == False:
-            tasks = db.query(Task).filter(Task.topic_id.is_(None)).all() 
-        else:
-            tasks = db.query(Task).all()
+            query = query.filter(Task.topic_id.is_(None))
+        tasks = query.order_by(*_listing_order(sort)).all()
         return tasks
 
     @staticmethod
     @exception_decorator
-    def get_tasks_for_user(db: Session, user_id: int) -> List[Task]:
+    def get_task_counts(
+        db: Session,
+        by: Literal["group", "topic"] = "group",
+        group_id: int = None,
+    ) -> Dict[int | None, TaskCounts] | None:
         """
-        Retrieve all tasks assigned to a specific user.
+        Open (not done) and overdue live tasks per group, or per topic of
+        `group_id`, in one grouped query. The None key holds the tasks without
+        a group/topic; places without open tasks are missing.
+        Deadlines are dates, so a task is overdue from the day after its deadline.
         """
-        tasks = db.query(Task).join(UserTask).filter(
-            UserTask.user_id == user_id
-        ).all()
+        key = (by, group_id)
+        counts = _task_counts.get(key)
+        if counts is not None:
+            return counts
+
+        place = Task.topic_id if by == "topic" else Task.group_id
+        query = db.query(
+            place,
+            func.count(Task.id),
+            func.sum(case((Task.end_date < datetime.combine(date.today(), time.min), 1), else_=0)),
+        ).filter(_archived_filter(False), Task.status != "done")
+        if by == "topic":
+            query = query.filter(Task.group_id == group_id)
+        counts = {
+            place_id: TaskCounts(open_count, overdue or 0)
+            for place_id, open_count, overdue in query.group_by(place)
+        }
+        _task_counts.set(key, counts)
+        return counts
+
+    @staticmethod
+    @exception_decorator
+    def search_tasks(
+        db: Session,
+        query: str,
+        group_id: int = None,
+        topic_id: int = None,
+        user_id: int = None,
+        limit: int = 10,
+        offset: int = 0,
+        archived: bool = False,
+    ) -> List[Task] | None:
+        """
+        Full-text search over task titles and descriptions, best matches first.
+        Every word of the query has to match, as a word prefix ("گزا" finds "گزارش").
+        Results can be scoped to a topic, a group or the tasks assigned to a user;
+        archived tasks are only searched with `archived=True`.
+
+        - PostgreSQL: `@@` against the GIN-indexed tsvector, ranked by `ts_rank`.
+        - SQLite: FTS5 `MATCH`, ranked by `bm25` with titles weighted above descriptions.
+        - Anything else (or SQLite without FTS5): substring match, newest first.
+        """
+        terms = search_terms(query)[:MAX_SEARCH_TERMS]
+        if not terms:
+            return []
+
+        tasks = db.query(Task).filter(_archived_filter(archived))
+        if topic_id is not None:
+            tasks = tasks.filter(Task.topic_id == topic_id)
+        elif group_id is not None:
+            tasks = tasks.filter(Task.group_id == group_id)
+        if user_id is not None:
+            tasks = tasks.join(UserTask).filter(UserTask.user_id == user_id)
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            vector = literal_column(f"({TASK_SEARCH_VECTOR})")
+            ts_query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+            tasks = tasks.filter(vector.op("@@")(ts_query)).order_by(func.ts_rank(vector, ts_query).desc(), Task.id.desc())
+        elif dialect == "sqlite" and has_search_table(db.connection()):
+            match = " ".join(f'"{term}"*' for term in terms)
+            tasks = (
+                tasks.join(_search_table, _search_table.c.rowid == Task.id)
+                .filter(literal_column(TASK_SEARCH_TABLE).op("MATCH")(match))
+                .order_by(func.bm25(literal_column(TASK_SEARCH_TABLE), 10.0, 1.0), Task.id.desc())
+            )
+        else:
+            for term in terms:
+                tasks = tasks.filter(or_(Task.title.icontains(term, autoescape=True), Task.description.icontains(term, autoescape=True)))
+            tasks = tasks.order_by(Task.id.desc())
+
+        return tasks.limit(limit).offset(offset).all()
+
+    @staticmethod
+    @exception_decorator
+    def get_tasks_for_user(
+        db: Session,
+        user_id: int,
+        archived: bool = False,
+        status: str = None,
+        sort: Literal["deadline"] | None = None,
+    ) -> List[Task]:
+        """
+        Retrieve all tasks assigned to a specific user, optionally with one status.
+        """
+        query = db.query(Task).join(UserTask).filter(
+            UserTask.user_id == user_id,
+            _archived_filter(archived)
+        )
+        if status:
+            query = query.filter(Task.status == status)
+        tasks = query.order_by(*_listing_order(sort)).all()
         return tasks
     
     @staticmethod
@@ -320,11 +486,64 @@ class TaskService:
 
     @staticmethod
     @exception_decorator
-    def update_status(db: Session, task_id: int, status: str) -> Literal[True, "NOT_EXIST"] | None:
+    def update_status(db: Session, task_id: int, status: str, expected_version: int = None) -> Literal[True, "NOT_EXIST", "CONFLICT"] | None:
         """Update task status if valid."""
         if status not in TaskService.VALID_STATUSES:
             return None
-        return TaskService.edit_task(db=db, task_id=task_id, status=status)
+        return TaskService.edit_task(db=db, task_id=task_id, status=status, expected_version=expected_version)
+
+    @staticmethod
+    @exception_decorator
+    def get_archived_tasks(
+        db: Session,
+        group_id: int = None,
+        topic_id: int = None,
+        user_id: int = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> List[Task] | None:
+        """
+        One page of archived tasks, most recently archived first, optionally
+        scoped to a topic, a group or the tasks assigned to a user.
+        """
+        tasks = db.query(Task).filter(Task.archived_at.isnot(None))
+        if topic_id is not None:
+            tasks = tasks.filter(Task.topic_id == topic_id)
+        elif group_id is not None:
+            tasks = tasks.filter(Task.group_id == group_id)
+        if user_id is not None:
+            tasks = tasks.join(UserTask).filter(UserTask.user_id == user_id)
+        return tasks.order_by(Task.archived_at.desc(), Task.id.desc()).limit(limit).offset(offset).all()
+
+    @staticmethod
+    @exception_decorator
+    def archive_done_tasks(db: Session, older_than: timedelta, batch_size: int = 500) -> int | None:
+        """
+        Archive up to `batch_size` tasks that have been done for longer than `older_than`.
+        Returns how many were archived; a full batch means more may be waiting.
+
+        Oldest completions first, a range scan of `ix_tasks_archive_due`; done
+        tasks from before `completed_at` existed are backfilled by `init_db`.
+        """
+        cutoff = datetime.now() - older_than
+        task_ids = [
+            task_id for task_id, in db.query(Task.id).filter(
+                Task.status == "done",
+                Task.archived_at.is_(None),
+                Task.completed_at < cutoff,
+            ).order_by(Task.completed_at).limit(batch_size)
+        ]
+        if not task_ids:
+            return 0
+        # One short transaction per batch; archiving is not an edit, so the version stays
+        result = db.execute(
+            update(Task)
+            .where(Task.id.in_(task_ids), Task.archived_at.is_(None))
+            .values(archived_at=datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount
 
 class TaskAttachmentService:
     
@@ -38,3 +38,22 @@ async def test_set_commands_scopes(db_session, monkeypatch):
     assert isinstance(admin_scope, BotCommandScopeChat)
     assert admin_scope.chat_id == 555
     assert {cmd.command for cmd in admin_commands} == {"/tasks", "/users"}
+
+
+def test_allowed_updates_cut_group_trace_volume():
+    import json
+    from pathlib import Path
+
+    trace = json.loads((Path(__file__).parent / "data" / "group_trace.json").read_text(encoding="utf-8"))
+    kinds = [next(key for key in update if key != "update_id") for update in trace]
+
+    # Without allowed_updates Telegram sends everything except these opt-in types
+    opt_in = {"chat_member", "message_reaction", "message_reaction_count"}
+    before = sum(kind not in opt_in for kind in kinds)
+
+    allowed = main.dp.resolve_used_update_types()
+    after = sum(kind in allowed for kind in kinds)
+
+    assert {"message", "callback_query"} <= set(allowed)
+    assert "edited_message" not in allowed
+    assert (before, after) == (87, 71)
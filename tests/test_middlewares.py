@@ -0,0 +1,322 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from middlewares import ChatOrderMiddleware, PrefilterMiddleware
+from utils.fsm_storage import TrackingStorage
+
+
+def _message_update(update_id: int, chat_id: int, text: str = "hi", chat_type: str = "group", **extra) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": chat_type, "title": "g"},
+            "from": {"id": 1, "is_bot": False, "first_name": "u"},
+            "text": text,
+            **extra,
+        },
+    }
+
+
+def _dispatcher(*middlewares, handler=None) -> Dispatcher:
+    router = Router()
+    if handler is not None:
+        router.message()(handler)
+    dp = Dispatcher()
+    for middleware in middlewares:
+        dp.update.outer_middleware(middleware)
+    dp.include_router(router)
+    return dp
+
+
+@pytest.mark.asyncio
+async def test_chat_order_serializes_a_chat_and_parallelizes_chats():
+    events = []
+
+    async def handler(message):
+        events.append(("start", message.chat.id, message.message_id))
+        await asyncio.sleep(0.02)
+        events.append(("end", message.chat.id, message.message_id))
+
+    chat_order = ChatOrderMiddleware(max_concurrency=8, shards=4)
+    dp = _dispatcher(chat_order, handler=handler)
+    bot = Bot(token="123456:ABCdef")
+
+    await asyncio.gather(
+        dp.feed_raw_update(bot, _message_update(1, -10)),
+        dp.feed_raw_update(bot, _message_update(2, -10)),
+        dp.feed_raw_update(bot, _message_update(3, -11)),
+    )
+
+    # Same chat: the second update starts only after the first has ended, in arrival order
+    same_chat = [event for event in events if event[1] == -10]
+    assert same_chat == [("start", -10, 1), ("end", -10, 1), ("start", -10, 2), ("end", -10, 2)]
+    # Other chat overlaps with the first one
+    assert events.index(("start", -11, 3)) < events.index(("end", -10, 1))
+
+    stats = chat_order.stats()
+    assert stats["active_chats"] == 0
+    assert sum(shard["updates"] for shard in stats["shards"]) == 3
+    assert max(shard["wait_max_ms"] for shard in stats["shards"]) > 0
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_prefilter_drops_irrelevant_group_messages():
+    handled = []
+
+    async def handler(message):
+        handled.append(message.message_id)
+
+    storage = TrackingStorage(MemoryStorage())
+    prefilter = PrefilterMiddleware("@TeledoBot", {"تسک های من"}, storage)
+    dp = _dispatcher(prefilter, handler=handler)
+    bot = Bot(token="123456:ABCdef")
+    reply_to_bot = {"message_id": 99, "date": 0, "chat": {"id": -5, "type": "group"},
+                    "from": {"id": bot.id, "is_bot": True, "first_name": "bot"}}
+
+    updates = [
+        _message_update(1, -5, "just chatting"),              # dropped
+        _message_update(2, -5, "/tasks"),                      # command
+        _message_update(3, -5, "hey @teledobot /add"),         # mention
+        _message_update(4, -5, "ok", reply_to_message=reply_to_bot),
+        _message_update(5, -5, "تسک های من"),                  # menu button
+        _message_update(6, 5, "anything", chat_type="private"),
+        _message_update(7, -5, "still chatting"),              # dropped
+    ]
+    for update in updates:
+        await dp.feed_raw_update(bot, update)
+
+    # An active conversation of the sender lets plain text through
+    await storage.set_state(StorageKey(bot_id=bot.id, chat_id=-5, user_id=1), "AddTaskStates:waiting_for_title")
+    await dp.feed_raw_update(bot, _message_update(8, -5, "task title"))
+    await storage.set_state(StorageKey(bot_id=bot.id, chat_id=-5, user_id=1), None)
+    await dp.feed_raw_update(bot, _message_update(9, -5, "after the conversation"))
+
+    assert handled == [2, 3, 4, 5, 6, 8]
+    assert prefilter.stats() == {"passed": 6, "dropped": 3}
+
+    # Abandoned conversations are forgotten after the state TTL
+    short_lived = TrackingStorage(MemoryStorage(), state_ttl=0.01)
+    await short_lived.update_data(StorageKey(bot_id=bot.id, chat_id=-5, user_id=2), {"title": "x"})
+    assert short_lived.is_active(-5, 2) and short_lived.active_count() == 1
+    await asyncio.sleep(0.02)
+    assert not short_lived.is_active(-5, 2) and short_lived.active_count() == 0
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_get_updates_limit_is_applied_to_polling_requests():
+    from aiogram.methods import GetMe, GetUpdates
+
+    from middlewares import GetUpdatesLimit
+
+    seen = []
+
+    async def make_request(bot, method):
+        seen.append(method)
+
+    middleware = GetUpdatesLimit(limit=20)
+    await middleware(make_request, None, GetUpdates(timeout=30))
+    await middleware(make_request, None, GetUpdates(limit=5))
+    await middleware(make_request, None, GetMe())
+    assert [getattr(method, "limit", None) for method in seen] == [20, 5, None]
+
+
+@pytest.mark.asyncio
+async def test_admission_sheds_callbacks_and_times_out_waiting_messages():
+    from aiogram.methods import AnswerCallbackQuery
+
+    from middlewares import AdmissionMiddleware
+
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(message):
+        handled.append(message.message_id)
+        if message.message_id == 1:
+            await release.wait()
+
+    admission = AdmissionMiddleware(max_in_flight=1, max_queued=10, deadline=0.05)
+    dp = _dispatcher(admission, handler=handler)
+    bot = Bot(token="123456:ABCdef")
+
+    busy = asyncio.create_task(dp.feed_raw_update(bot, _message_update(1, -1)))
+    await asyncio.sleep(0)
+
+    callback = {
+        "update_id": 2,
+        "callback_query": {"id": "7", "chat_instance": "c", "data": "x",
+                           "from": {"id": 1, "is_bot": False, "first_name": "u"}},
+    }
+    toast = await dp.feed_raw_update(bot, callback)
+    assert isinstance(toast, AnswerCallbackQuery) and toast.callback_query_id == "7"
+
+    # Waits past its deadline and is shed
+    await dp.feed_raw_update(bot, _message_update(3, -2))
+    # Waits and is admitted once the slot frees up
+    waiting = asyncio.create_task(dp.feed_raw_update(bot, _message_update(4, -3)))
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(busy, waiting)
+
+    assert handled == [1, 4]
+    stats = admission.stats()
+    assert (stats["admitted"], stats["queued"], stats["shed"]) == (2, 2, 2)
+    assert stats["in_flight"] == 0 and stats["waiting"] == 0
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_throttling_limits_heavy_listings_per_user_and_chat():
+    from aiogram.methods import AnswerCallbackQuery
+
+    from middlewares import ThrottlingMiddleware, TokenBucket
+
+    handled = []
+
+    async def handler(message):
+        handled.append(message.message_id)
+
+    throttling = ThrottlingMiddleware(
+        limits={"heavy": TokenBucket(0.001, 2), "callback": TokenBucket(0.001, 1)},
+        chat_factor=1,
+        heavy_texts={"تسک های من"},
+    )
+    dp = _dispatcher(throttling, handler=handler)
+    bot = Bot(token="123456:ABCdef")
+
+    def from_user(update, user_id):
+        update["message"]["from"]["id"] = user_id
+        return update
+
+    await dp.feed_raw_update(bot, _message_update(1, -1, "/tasks"))
+    await dp.feed_raw_update(bot, _message_update(2, -1, "تسک های من"))
+    await dp.feed_raw_update(bot, _message_update(3, -1, "@TeledoBot /tasks"))   # user bucket empty
+    await dp.feed_raw_update(bot, _message_update(4, -1, "plain text"))          # not throttled
+    await dp.feed_raw_update(bot, from_user(_message_update(5, -1, "/user"), 2))  # chat bucket used up by user 1
+    await dp.feed_raw_update(bot, from_user(_message_update(6, -2, "/user"), 2))  # other chat
+    assert handled == [1, 2, 4, 6]
+
+    callback = {
+        "update_id": 7,
+        "callback_query": {"id": "9", "chat_instance": "c", "data": "view_task|1",
+                           "from": {"id": 3, "is_bot": False, "first_name": "u"}},
+    }
+    assert await dp.feed_raw_update(bot, callback) is not None
+    toast = await dp.feed_raw_update(bot, {**callback, "update_id": 8})
+    assert isinstance(toast, AnswerCallbackQuery)
+
+    assert throttling.stats()["throttled"] == {"heavy": 2, "callback": 1}
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_callback_dedupe_collapses_double_taps():
+    from aiogram.methods import AnswerCallbackQuery
+
+    from middlewares import CallbackDedupeMiddleware
+
+    runs = []
+    release = asyncio.Event()
+    router = Router()
+
+    @router.callback_query()
+    async def on_callback(callback_query):
+        runs.append(callback_query.data)
+        await release.wait()
+
+    dedupe = CallbackDedupeMiddleware(ttl=60)
+    dp = Dispatcher()
+    dp.update.outer_middleware(dedupe)
+    dp.include_router(router)
+    bot = Bot(token="123456:ABCdef")
+
+    def tap(update_id, data, message_id=50):
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "chat_instance": "c", "data": data,
+                "from": {"id": 1, "is_bot": False, "first_name": "u"},
+                "message": {"message_id": message_id, "date": 0, "chat": {"id": -1, "type": "group"}, "text": "t"},
+            },
+        }
+
+    first = asyncio.create_task(dp.feed_raw_update(bot, tap(1, "delete_task|7")))
+    await asyncio.sleep(0)
+    # Second tap while the first is still running, and one after it finished
+    assert isinstance(await dp.feed_raw_update(bot, tap(2, "delete_task|7")), AnswerCallbackQuery)
+    release.set()
+    await first
+    await dp.feed_raw_update(bot, tap(3, "delete_task|7"))
+    # Other message, other action and non-destructive callbacks run normally
+    await dp.feed_raw_update(bot, tap(4, "delete_task|7", message_id=51))
+    await dp.feed_raw_update(bot, tap(5, "change_status|7|done"))
+    await dp.feed_raw_update(bot, tap(6, "view_task|7"))
+    await dp.feed_raw_update(bot, tap(7, "view_task|7"))
+
+    assert runs == ["delete_task|7", "delete_task|7", "change_status|7|done", "view_task|7", "view_task|7"]
+    assert dedupe.stats() == {"suppressed": 2}
+
+    # A tap shed further down the chain is not remembered, so its retry runs
+    from aiogram.dispatcher.event.bases import UNHANDLED
+
+    shed = []
+
+    async def shed_first(handler, event, data):
+        if not shed:
+            shed.append(event.update_id)
+            return UNHANDLED
+        return await handler(event, data)
+
+    dp.update.outer_middleware(shed_first)
+    assert await dp.feed_raw_update(bot, tap(8, "delete_task|9")) is UNHANDLED
+    await dp.feed_raw_update(bot, tap(9, "delete_task|9"))
+    assert runs[-1] == "delete_task|9"
+    assert dedupe.stats() == {"suppressed": 2}
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_unchanged_edits_are_skipped():
+    from aiogram.exceptions import TelegramBadRequest
+    from aiogram.methods import EditMessageReplyMarkup, EditMessageText, SendMessage
+    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+    from middlewares import SkipUnchangedEdits
+
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(type(method).__name__)
+        if isinstance(method, SendMessage):
+            return Message(message_id=7, date=0, chat={"id": -1, "type": "group"}, text=method.text)
+        if method.message_id == 8:
+            raise TelegramBadRequest(method=method, message="Bad Request: message is not modified")
+        return True
+
+    def keyboard(label):
+        return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=label, callback_data="x")]])
+
+    edits = SkipUnchangedEdits(max_size=10)
+    await edits(make_request, None, SendMessage(chat_id=-1, text="list", reply_markup=keyboard("a")))
+    # Same render as the sent message, then a real change, then the changed render again
+    assert await edits(make_request, None, EditMessageText(chat_id=-1, message_id=7, text="list", reply_markup=keyboard("a"))) is True
+    await edits(make_request, None, EditMessageText(chat_id=-1, message_id=7, text="list", reply_markup=keyboard("b")))
+    await edits(make_request, None, EditMessageReplyMarkup(chat_id=-1, message_id=7, reply_markup=keyboard("b")))
+    await edits(make_request, None, EditMessageReplyMarkup(chat_id=-1, message_id=7, reply_markup=keyboard("c")))
+    assert calls == ["SendMessage", "EditMessageText", "EditMessageReplyMarkup"]
+
+    # An unknown message that turns out unchanged is remembered after the first refusal
+    for _ in range(2):
+        try:
+            await edits(make_request, None, EditMessageText(chat_id=-1, message_id=8, text="same"))
+        except TelegramBadRequest:
+            pass
+    assert calls.count("EditMessageText") == 2
+    assert edits.stats()["skipped"] == 3
@@ -1,6 +1,8 @@
 from datetime import datetime
 
 import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
 
 from models import Group, Task, Topic, User, UserTask
 from services.task_services import TaskAttachmentService, TaskService
@@ -104,3 +106,263 @@ def test_attachments(db_session):
 
     attachments = TaskAttachmentService.get_attachments(db_session, task_id=task.id)
     assert attachments == ["file1", "file2"]
+
+
+def test_edit_task_compare_and_swap(db_session):
+    task = Task(title="cas", admin_id=1)
+    db_session.add(task)
+    db_session.commit()
+    assert task.version == 1
+
+    # Two users opened the task at version 1; the first write wins
+    assert TaskService.edit_task(db_session, task_id=task.id, name="first", expected_version=1) is True
+    assert TaskService.update_status(db_session, task_id=task.id, status="done", expected_version=1) == "CONFLICT"
+
+    current = TaskService.get_task_by_id(db_session, task.id)
+    assert (current.title, current.status, current.version) == ("first", "pending", 2)
+
+    # Retrying against the current version goes through; unversioned edits still bump it
+    assert TaskService.update_status(db_session, task_id=task.id, status="done", expected_version=2) is True
+    assert TaskService.edit_task(db_session, task_id=task.id, description="d") is True
+    assert TaskService.get_task_by_id(db_session, task.id).version == 4
+    assert TaskService.edit_task(db_session, task_id=9999, name="x", expected_version=1) == "NOT_EXIST"
+
+
+def test_search_tasks_ranked_scoped_and_paginated(db_session):
+    group = TaskService.create_group(db_session, "g")
+    other_group = TaskService.create_group(db_session, "other")
+    report = TaskService.create_task(db_session, "گزارش فروش ماهانه", group_id=group.id, description="sales report")
+    meeting = TaskService.create_task(db_session, "جلسه تیم", group_id=group.id, description="مرور گزارش فروش هفته")
+    TaskService.create_task(db_session, "گزارش مالی", group_id=other_group.id)
+    deploy = TaskService.create_task(db_session, "deploy", group_id=group.id)
+
+    # Word prefixes match, a title hit ranks above a description hit
+    assert [task.id for task in TaskService.search_tasks(db_session, "گزا فروش")] == [report.id, meeting.id]
+    assert len(TaskService.search_tasks(db_session, "گزارش")) == 3
+    assert len(TaskService.search_tasks(db_session, "گزارش", group_id=group.id)) == 2
+    assert TaskService.search_tasks(db_session, '") OR * (') == []
+
+    # Non-admins only find the tasks assigned to them
+    user = User(username="member", telegram_id="9")
+    db_session.add(user)
+    db_session.commit()
+    db_session.add(UserTask(user_id=user.id, task_id=meeting.id))
+    db_session.commit()
+    assert [task.id for task in TaskService.search_tasks(db_session, "گزارش", user_id=user.id)] == [meeting.id]
+
+    first_page = TaskService.search_tasks(db_session, "گزارش", limit=2)
+    second_page = TaskService.search_tasks(db_session, "گزارش", limit=2, offset=2)
+    assert len(first_page) == 2 and len(second_page) == 1
+    assert not {task.id for task in first_page} & {task.id for task in second_page}
+
+    # The index follows edits and deletions
+    TaskService.edit_task(db_session, task_id=report.id, name="خلاصه خرید")
+    assert [task.id for task in TaskService.search_tasks(db_session, "خرید")] == [report.id]
+    assert report.id not in [task.id for task in TaskService.search_tasks(db_session, "ماهانه")]
+    TaskService.delete_task(db_session, deploy)
+    assert TaskService.search_tasks(db_session, "deploy") == []
+
+
+def test_inline_lookup_narrows_cached_results(db_session, monkeypatch):
+    from handlers.task_handlers import inline
+
+    admin = User(username="boss", telegram_id="7001", is_admin=True)
+    member = User(username="member", telegram_id="7002")
+    db_session.add_all([admin, member])
+    db_session.commit()
+    report = TaskService.create_task(db_session, "گزارش فروش", description="ماهانه")
+    TaskService.create_task(db_session, "گزارش مالی")
+    TaskService.create_task(db_session, "جلسه")
+    db_session.add(UserTask(user_id=member.id, task_id=report.id))
+    db_session.commit()
+
+    searches = []
+    search_tasks = TaskService.search_tasks
+    monkeypatch.setattr(TaskService, "search_tasks", lambda **kwargs: searches.append(kwargs["query"]) or search_tasks(**kwargs))
+
+    # Typing "گز", "گزارش", "گزارش ف" hits the database once; the later keystrokes narrow the cached hits
+    assert len(inline.lookup(db_session, 7001, "گز")) == 2
+    assert len(inline.lookup(db_session, 7001, "گزارش")) == 2
+    assert [hit.id for hit in inline.lookup(db_session, 7001, "گزارش ف")] == [report.id]
+    assert [hit.id for hit in inline.lookup(db_session, 7001, "گزارش فروش ماه")] == [report.id]
+    assert searches == ["گز"]
+    # A different query goes back to the index
+    assert [hit.title for hit in inline.lookup(db_session, 7001, "جلس")] == ["جلسه"]
+    assert searches == ["گز", "جلس"]
+
+    # Members only find their own tasks, unknown users nothing
+    assert [hit.id for hit in inline.lookup(db_session, 7002, "گزارش")] == [report.id]
+    assert inline.lookup(db_session, 7999, "گزارش") == []
+
+    article = inline._article(inline.lookup(db_session, 7002, "گزارش")[0])
+    assert article.id == str(report.id) and article.title == "گزارش فروش"
+    assert article.reply_markup.inline_keyboard[0][0].callback_data == f"show_task|{report.id}"
+
+
+def test_archive_done_tasks_in_batches(db_session, monkeypatch):
+    from datetime import timedelta
+
+    from services.task_archiver import TaskArchiver
+
+    group = TaskService.create_group(db_session, "archive")
+    user = User(username="archiver", telegram_id="8001")
+    db_session.add(user)
+    db_session.commit()
+    tasks = [TaskService.create_task(db_session, f"old {i}", group_id=group.id) for i in range(3)]
+    fresh = TaskService.create_task(db_session, "fresh", group_id=group.id)
+    live = TaskService.create_task(db_session, "live", group_id=group.id)
+    db_session.add(UserTask(user_id=user.id, task_id=tasks[0].id))
+    db_session.commit()
+
+    for task in tasks + [fresh]:
+        assert TaskService.update_status(db_session, task_id=task.id, status="done") is True
+    # Setting "done" again keeps the first completion time
+    completed_at = TaskService.get_task_by_id(db_session, fresh.id).completed_at
+    TaskService.update_status(db_session, task_id=fresh.id, status="done")
+    assert TaskService.get_task_by_id(db_session, fresh.id).completed_at == completed_at
+    db_session.query(Task).filter(Task.id.in_([task.id for task in tasks])).update(
+        {Task.completed_at: datetime.now() - timedelta(days=40)}, synchronize_session=False
+    )
+    db_session.commit()
+
+    # A full batch runs the next one on the following sweep, a short one waits for the interval
+    archiver = TaskArchiver(after_days=30, interval=3600, batch_size=2, session_factory=lambda: db_session)
+    monkeypatch.setattr(db_session, "close", lambda: None)
+    assert [archiver.run(), archiver.run(), archiver.run()] == [2, 1, 0]
+    assert archiver.stats() == {"archived": 3, "batches": 2}
+
+    listed = {task.id for task in TaskService.get_all_tasks(db_session, group_id=group.id)}
+    assert listed == {fresh.id, live.id}
+    assert TaskService.get_tasks_for_user(db_session, user_id=user.id) == []
+    assert [task.id for task in TaskService.get_tasks_for_user(db_session, user_id=user.id, archived=True)] == [tasks[0].id]
+    assert len(TaskService.get_archived_tasks(db_session, group_id=group.id)) == 3
+    assert len(TaskService.get_archived_tasks(db_session, group_id=group.id, limit=2, offset=2)) == 1
+    assert TaskService.search_tasks(db_session, "old") == []
+
+    # Reopening brings a task back to the listings
+    TaskService.update_status(db_session, task_id=tasks[1].id, status="in_progress")
+    reopened = TaskService.get_task_by_id(db_session, tasks[1].id)
+    assert (reopened.archived_at, reopened.completed_at) == (None, None)
+    assert tasks[1].id in {task.id for task in TaskService.get_all_tasks(db_session, group_id=group.id)}
+
+
+def test_listing_filters_and_deadline_sort(db_session):
+    from handlers.task_handlers.edit import filter_chip_rows, parse_list_filter
+
+    group = TaskService.create_group(db_session, "filters")
+    user = User(username="filterer", telegram_id="8101")
+    db_session.add(user)
+    db_session.commit()
+    late = TaskService.create_task(db_session, "late", group_id=group.id, end_date=datetime(2024, 5, 1))
+    undated = TaskService.create_task(db_session, "undated", group_id=group.id)
+    soon = TaskService.create_task(db_session, "soon", group_id=group.id, end_date=datetime(2024, 3, 1))
+    done = TaskService.create_task(db_session, "done", group_id=group.id, end_date=datetime(2024, 1, 1))
+    TaskService.update_status(db_session, task_id=done.id, status="done")
+    for task in (late, done):
+        db_session.add(UserTask(user_id=user.id, task_id=task.id))
+    db_session.commit()
+
+    pending = TaskService.get_all_tasks(db_session, group_id=group.id, status="pending")
+    assert [task.id for task in pending] == [late.id, undated.id, soon.id]
+    # Deadline order puts tasks without one last
+    by_deadline = TaskService.get_all_tasks(db_session, group_id=group.id, status="pending", sort="deadline")
+    assert [task.id for task in by_deadline] == [soon.id, late.id, undated.id]
+    assert [task.id for task in TaskService.get_tasks_for_user(db_session, user_id=user.id, status="done")] == [done.id]
+    assert [task.id for task in TaskService.get_tasks_for_user(db_session, user_id=user.id, sort="deadline")] == [done.id, late.id]
+
+    # Each chip is one query on the composite index, sorted by it as well
+    query = db_session.query(Task).filter(
+        Task.archived_at.is_(None), Task.group_id == group.id, Task.status == "pending"
+    ).order_by(Task.end_date.asc().nulls_last(), Task.id)
+    compiled = query.statement.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_tasks_live_group_status_end" in plan
+
+    assert parse_list_filter("ps") == ("ps", "pending", "deadline")
+    assert parse_list_filter("zz") == ("a", None, None)
+    assert parse_list_filter(None) == ("a", None, None)
+    rows = filter_chip_rows("view_group|5", "p")
+    callbacks = [button.callback_data for row in rows for button in row]
+    assert callbacks == ["view_group|5|a", "view_group|5|p", "view_group|5|i", "view_group|5|b", "view_group|5|d", "view_group|5|ps"]
+    assert rows[0][1].text.startswith("• ")
+    # With the sort on, chips keep it and the toggle turns it off
+    callbacks = [button.callback_data for row in filter_chip_rows("my_tasks", "ds") for button in row]
+    assert callbacks[-1] == "my_tasks|d" and callbacks[0] == "my_tasks|as"
+
+
+def test_task_counts_grouped_and_invalidated(db_session):
+    from handlers.task_handlers.edit import counted_label
+    from services.task_services import TaskCounts, _task_counts
+
+    _task_counts.clear()
+    group = TaskService.create_group(db_session, "counted")
+    topic = TaskService.create_topic(db_session, group.id, "topic")
+    overdue = TaskService.create_task(db_session, "overdue", group_id=group.id, topic_id=topic.id, end_date=datetime(2000, 1, 1))
+    # Due today (stored as midnight) is not overdue yet
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    TaskService.create_task(db_session, "due today", group_id=group.id, topic_id=topic.id, end_date=today)
+    done = TaskService.create_task(db_session, "done", group_id=group.id)
+    TaskService.update_status(db_session, task_id=done.id, status="done")
+    loose = TaskService.create_task(db_session, "loose", group_id=group.id)
+
+    counts = TaskService.get_task_counts(db_session, by="group")
+    assert counts[group.id] == TaskCounts(open=3, overdue=1)
+    assert TaskService.get_task_counts(db_session, by="topic", group_id=group.id) == {
+        topic.id: TaskCounts(2, 1),
+        None: TaskCounts(1, 0),
+    }
+
+    # Served from the cache until a task changes through the service
+    db_session.add(Task(title="raw", group_id=group.id))
+    db_session.commit()
+    assert TaskService.get_task_counts(db_session, by="group")[group.id].open == 3
+    TaskService.update_status(db_session, task_id=overdue.id, status="done")
+    assert TaskService.get_task_counts(db_session, by="group")[group.id] == TaskCounts(3, 0)
+    TaskService.delete_task(db_session, TaskService.get_task_by_id(db_session, loose.id))
+    assert TaskService.get_task_counts(db_session, by="group")[group.id] == TaskCounts(2, 0)
+    TaskService.create_task(db_session, "new", group_id=group.id)
+    assert TaskService.get_task_counts(db_session, by="group")[group.id] == TaskCounts(3, 0)
+
+    assert counted_label("g", {1: TaskCounts(3, 0)}, 1) == "g (3 باز)"
+    assert counted_label("g", {1: TaskCounts(3, 2)}, 1) == "g (3 باز · ⏰ 2)"
+    assert counted_label("g", {1: TaskCounts(3, 2)}, 2) == "g"
+
+
+def test_init_db_adds_missing_columns(monkeypatch):
+    import models
+
+    legacy_engine = create_engine("sqlite:///:memory:")
+    with legacy_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, status VARCHAR(50) NOT NULL)"))
+        conn.execute(text("INSERT INTO tasks (id, title, status) VALUES (1, 'old', 'pending')"))
+        conn.execute(text("INSERT INTO tasks (id, title, status) VALUES (2, 'finished', 'done')"))
+    monkeypatch.setattr(models, "engine", legacy_engine)
+
+    models.init_db()
+
+    columns = {column["name"] for column in inspect(legacy_engine).get_columns("tasks")}
+    assert {"version", "completed_at", "archived_at"} <= columns
+    indexes = {index["name"] for index in inspect(legacy_engine).get_indexes("tasks")}
+    assert {"ix_tasks_live_group_status_end", "ix_tasks_archive_due"} <= indexes
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM tasks WHERE id = 1")).scalar() == 1
+        # Done tasks without a completion time get one, so they can be archived
+        completed = dict(conn.execute(text("SELECT id, completed_at FROM tasks")).all())
+        assert completed[1] is None and completed[2] is not None
+    # Rows written before search existed are indexed too
+    with Session(legacy_engine) as session:
+        assert [task.id for task in TaskService.search_tasks(session, "old")] == [1]
+
+
+def test_init_db_refuses_not_null_column_without_default(monkeypatch):
+    import models
+
+    legacy_engine = create_engine("sqlite:///:memory:")
+    with legacy_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE tasks (id INTEGER PRIMARY KEY, status VARCHAR(50) NOT NULL)"))
+        conn.execute(text("INSERT INTO tasks (id, status) VALUES (1, 'pending')"))
+    monkeypatch.setattr(models, "engine", legacy_engine)
+
+    # "title" is NOT NULL without a server default; the failure is raised, not logged away
+    with pytest.raises(RuntimeError, match="tasks.title"):
+        models.init_db()
@@ -1,6 +1,25 @@
+import ast
+import asyncio
+import json
+import os
 from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
 
 from utils import date_utils
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.storage.base import StorageKey
+
+from models import FSMRecord
+from utils.cache import TTLCache, cache_stats, start_sweeper, stop_sweeper
+from utils.fsm_storage import SQLAlchemyStorage
+from utils.payload_store import PayloadStore
+from utils.update_queue import UpdateQueue
+from utils.webhook_guard import SECRET_HEADER, WebhookGuard
+from utils.webhook_reply import ReplyRequestHandler
+from utils.webhook_cluster import WebhookCluster, update_affinity_key
 from utils.texts import t
 
 
@@ -16,9 +35,564 @@ def test_date_utils_round_trip():
     assert date_utils.jalali_to_gregorian("bad-date") is None
 
 
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("1403-05-20", datetime(2024, 8, 10)),
+        ("1403/5/20", datetime(2024, 8, 10)),
+        ("۱۴۰۳.۰۵.۲۰", datetime(2024, 8, 10)),
+        ("٢٠-٠٥-١٤٠٣", datetime(2024, 8, 10)),
+        ("2025-01-05", datetime(2025, 1, 5)),
+        ("05/01/2025", datetime(2025, 1, 5)),
+        ("1403-13-01", None),
+        ("1403-05/20", None),
+        ("tomorrow", None),
+    ],
+)
+def test_parse_flexible_date_layouts(text, expected):
+    assert date_utils.parse_flexible_date(text) == expected
+
+
+def _natural_date_corpus():
+    with open(Path(__file__).resolve().parent / "data" / "natural_dates.json", encoding="utf-8") as f:
+        corpus = json.load(f)
+    today = datetime.strptime(corpus["today"], "%Y-%m-%d").date()
+    return [(today, text, expected) for text, expected in corpus["cases"]]
+
+
+@pytest.mark.parametrize("today, text, expected", _natural_date_corpus())
+def test_parse_deadline_corpus(today, text, expected):
+    from utils.natural_dates import parse_deadline
+
+    parsed = parse_deadline(text, today=today)
+    assert (date_utils.gregorian_to_jalali(parsed) if parsed else None) == expected
+
+
 def test_texts_lookup_and_formatting():
     assert t("cmd_user_tasks_desc").startswith("مشاهده")
     assert t("cmd_admin_tasks_desc")
     assert t("cmd_admin_users_desc")
     assert t("missing_key") == "missing_key"
     assert t("deadline_prompt", title="X")  # ensures formatting does not crash
+
+
+def test_payload_store_bounded_and_expiring():
+    store = PayloadStore(max_size=2, ttl=60)
+    first = store.put("a very long persian title " * 10)
+    second = store.put(["file1", "file2"])
+    assert len(f"short_edit|name|{first}|123456") <= 64
+    assert store.get(second) == ["file1", "file2"]
+
+    # Oldest token is evicted when the store is full
+    store.put("third")
+    assert store.get(first) is None
+    assert len(store) == 2
+
+    assert store.pop(second) == ["file1", "file2"]
+    assert store.get(second) is None
+
+    expired = PayloadStore(ttl=0)
+    token = expired.put("value")
+    assert expired.get(token) is None
+
+
+def test_payload_store_db_backing(engine):
+    session_factory = sessionmaker(bind=engine)
+    writer = PayloadStore(use_db=True, session_factory=session_factory)
+    token = writer.put({"text": "عنوان"})
+
+    # A fresh store (another worker or a restart) resolves the token from the database
+    reader = PayloadStore(use_db=True, session_factory=session_factory)
+    assert reader.get(token) == {"text": "عنوان"}
+    assert reader.pop(token) == {"text": "عنوان"}
+    assert PayloadStore(use_db=True, session_factory=session_factory).get(token) is None
+
+
+def test_ttl_cache_lru_ttl_and_metrics():
+    cache = TTLCache("test_cache", max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.set("short", "lived", ttl=0)
+    assert cache.purge_expired() == 1
+
+    stats = cache.stats()
+    assert stats["size"] == 1
+    assert stats["evictions"] == 2
+    assert stats["hits"] == 3 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.75
+    assert any(s["name"] == "test_cache" for s in cache_stats())
+
+
+def test_ttl_cache_memory_cap():
+    cache = TTLCache("capped_cache", max_size=100, ttl=60, max_bytes=2000)
+    for i in range(10):
+        cache.set(i, "x" * 500)
+    assert len(cache) < 10
+    assert cache.stats()["bytes"] <= 2000
+    assert cache.get(9) == "x" * 500
+
+
+@pytest.mark.asyncio
+async def test_cache_sweeper_purges_expired_entries(monkeypatch):
+    import threading
+
+    from utils import cache as cache_module
+
+    threads = {}
+
+    def record(name):
+        def hook():
+            threads[name] = threading.get_ident()
+        return hook
+
+    monkeypatch.setattr(cache_module, "_sweep_hooks", [])
+    cache_module.add_sweep_hook(record("loop"))
+    # Database work runs in a worker thread, so the loop keeps handling updates
+    cache_module.add_sweep_hook(record("blocking"), blocking=True)
+
+    cache = TTLCache("swept_cache", ttl=0)
+    cache.set("key", "value")
+    start_sweeper(0.01)
+    await asyncio.sleep(0.05)
+    await stop_sweeper()
+    assert len(cache) == 0
+    assert threads["loop"] == threading.get_ident() != threads["blocking"]
+
+
+@pytest.mark.asyncio
+async def test_fsm_storage_batches_writes_and_survives_restart(engine):
+    session_factory = sessionmaker(bind=engine)
+    key = StorageKey(bot_id=1, chat_id=-100, user_id=42)
+    storage = SQLAlchemyStorage(session_factory=session_factory, flush_delay=60)
+
+    await storage.set_state(key, "AddTaskStates:waiting_for_title")
+    await storage.update_data(key, {"title": "گزارش"})
+    await storage.update_data(key, {"group_id": 7})
+    assert await storage.get_data(key) == {"title": "گزارش", "group_id": 7}
+
+    # Nothing is written until the batch is flushed, then all of it in one upsert
+    assert await SQLAlchemyStorage(session_factory=session_factory).get_state(key) is None
+    assert storage.flush() == 1
+
+    restarted = SQLAlchemyStorage(session_factory=session_factory)
+    assert await restarted.get_state(key) == "AddTaskStates:waiting_for_title"
+    assert await restarted.get_data(key) == {"title": "گزارش", "group_id": 7}
+    assert restarted.active_pairs() == [(-100, 42)]
+
+    # Clearing the conversation removes the row
+    await restarted.set_state(key, None)
+    await restarted.set_data(key, {})
+    await restarted.close()
+    db = session_factory()
+    try:
+        assert db.query(FSMRecord).count() == 0
+    finally:
+        db.close()
+
+
+@pytest.mark.asyncio
+async def test_fsm_storage_expires_stale_states(engine):
+    session_factory = sessionmaker(bind=engine)
+    key = StorageKey(bot_id=1, chat_id=5, user_id=5)
+    storage = SQLAlchemyStorage(session_factory=session_factory, state_ttl=0)
+    await storage.set_state(key, "EditTaskStates:waiting_for_title")
+    await storage.close()
+
+    assert await SQLAlchemyStorage(session_factory=session_factory, state_ttl=0).get_state(key) is None
+    assert storage.purge_expired() >= 1
+
+
+def test_webhook_cluster_routes_by_chat_and_applies_backpressure():
+    message = {"update_id": 1, "message": {"chat": {"id": -1001}, "from": {"id": 7}}}
+    callback = {"update_id": 2, "callback_query": {"from": {"id": 7}, "message": {"chat": {"id": -1001}}}}
+    inline = {"update_id": 3, "inline_query": {"from": {"id": 7}, "query": ""}}
+    assert update_affinity_key(message) == update_affinity_key(callback) == -1001
+    assert update_affinity_key(inline) == 7
+
+    cluster = WebhookCluster(target=print, workers=3, queue_size=1)
+    # Every update of one chat goes to the same worker
+    assert cluster.route(message) == cluster.route(callback)
+    assert cluster.dispatch(b"{}", message) is True
+    assert cluster.dispatch(b"{}", callback) is False
+    assert cluster.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_webhook_cluster_merges_worker_metrics():
+    import queue as queue_module
+
+    from utils.metrics import register_metrics
+    from utils.webhook_cluster import report_metrics
+
+    register_metrics("test_worker", lambda: {"handled": 5})
+    reports = queue_module.Queue()
+    reporter = asyncio.create_task(report_metrics(1, reports, interval=60))
+    await asyncio.sleep(0)
+    reporter.cancel()
+    index, snapshot = reports.get_nowait()
+    assert index == 1 and snapshot["test_worker"] == {"handled": 5}
+
+    cluster = WebhookCluster(target=print, workers=2)
+    # Stands in for the process-shared queue the workers report on
+    cluster.reports = queue_module.Queue()
+    cluster.reports.put((1, {"test_worker": {"handled": 3}}))
+    cluster.reports.put((1, snapshot))
+    cluster.reports.put((0, {"test_worker": {"handled": 1}}))
+
+    stats = cluster.stats()
+    assert stats["workers"] == 2 and stats["rejected"] == 0
+    # Only the latest snapshot of each worker is kept
+    assert [stats["per_worker"][i]["test_worker"]["handled"] for i in (0, 1)] == [1, 5]
+    assert stats["per_worker"][1]["age_s"] >= 0
+
+
+def _message_update(update_id: int, chat_id: int = 1) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+            "text": "hi",
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_update_queue_backpressure_metrics_and_drain():
+    handled = []
+    router = Router()
+
+    @router.message()
+    async def handler(message):
+        await asyncio.sleep(0.01)
+        handled.append(message.message_id)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:ABCdef")
+    queue = UpdateQueue(dp, bot, maxsize=2, consumers=1)
+
+    assert queue.put(_message_update(1)) and queue.put(_message_update(2))
+    assert queue.put(_message_update(3)) is False
+    await queue.drain()
+
+    assert sorted(handled) == [1, 2]
+    assert queue.put(_message_update(4)) is False
+    stats = queue.stats()
+    assert stats["processed"] == 2 and stats["rejected"] == 2
+    assert stats["depth"] == 0 and stats["max_depth"] == 2
+    assert stats["lag_max_ms"] > 0
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_update_queue_busy_chat_does_not_stall_other_chats():
+    events = []
+    router = Router()
+
+    @router.message()
+    async def handler(message):
+        events.append(("start", message.chat.id, message.message_id))
+        await asyncio.sleep(0.02)
+        events.append(("end", message.chat.id, message.message_id))
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:ABCdef")
+    queue = UpdateQueue(dp, bot, maxsize=100, consumers=2)
+
+    # A burst from one chat larger than the consumer pool, then another chat
+    for update_id in range(1, 6):
+        assert queue.put(_message_update(update_id, chat_id=-10))
+    assert queue.put(_message_update(6, chat_id=-11))
+    assert queue.stats()["active_chats"] == 2
+    await queue.drain()
+
+    busy = [event for event in events if event[1] == -10]
+    assert busy == [(kind, -10, update_id) for update_id in range(1, 6) for kind in ("start", "end")]
+    # The other chat is served by the free consumer right away
+    assert events.index(("end", -11, 6)) < events.index(("end", -10, 2))
+    assert queue.stats()["active_chats"] == 0
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_cluster_worker_overlaps_chats_and_keeps_chat_order():
+    import queue as queue_module
+
+    from utils.webhook_cluster import consume_updates
+
+    events = []
+    router = Router()
+
+    @router.message()
+    async def handler(message):
+        events.append(("start", message.chat.id, message.message_id))
+        await asyncio.sleep(0.05 if message.chat.id == -10 else 0)
+        events.append(("end", message.chat.id, message.message_id))
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:ABCdef")
+    updates = queue_module.Queue()
+    for update_id, chat_id in ((1, -10), (2, -10), (3, -11), (4, -11)):
+        updates.put(json.dumps(_message_update(update_id, chat_id)))
+    updates.put(None)
+
+    await consume_updates(updates, dp, bot, concurrency=4)
+
+    # A slow handler holds up only its own chat
+    assert events.index(("end", -11, 4)) < events.index(("end", -10, 1))
+    assert [event for event in events if event[1] == -10] == [
+        ("start", -10, 1), ("end", -10, 1), ("start", -10, 2), ("end", -10, 2)
+    ]
+    await bot.session.close()
+
+
+class _FakeRequest:
+    def __init__(self, update: dict):
+        self.update = update
+
+    async def json(self, loads=None):
+        return self.update
+
+
+@pytest.mark.asyncio
+async def test_reply_handler_sends_final_call_in_webhook_response():
+    from handlers.funcs import answer_last
+
+    router = Router()
+
+    @router.callback_query()
+    async def on_callback(callback_query):
+        await answer_last(callback_query.answer("done"))
+
+    @router.message()
+    async def on_message(message):
+        return None
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:ABCdef")
+    handler = ReplyRequestHandler(dispatcher=dp, bot=bot)
+
+    callback = {
+        "update_id": 10,
+        "callback_query": {
+            "id": "1",
+            "chat_instance": "c",
+            "data": "x",
+            "from": {"id": 1, "is_bot": False, "first_name": "u"},
+        },
+    }
+    sent = []
+    build_response = handler._build_response_writer
+    handler._build_response_writer = lambda bot, result: sent.append(result) or build_response(bot, result)
+
+    await handler._handle_request(bot, _FakeRequest(callback))
+    assert sent[0].__api_method__ == "answerCallbackQuery" and sent[0].text == "done"
+
+    await handler._handle_request(bot, _FakeRequest(_message_update(11)))
+    assert sent[1] is None
+    assert handler.stats() == {"updates": 2, "fast_path": 1, "fast_path_ratio": 0.5}
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_guard_rejects_bad_secret_and_redeliveries():
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    handled = []
+
+    async def webhook(request):
+        handled.append((await request.json())["update_id"])
+        return web.json_response({})
+
+    guard = WebhookGuard("/webhook", secret_token="s3cret", seen_size=2)
+    app = web.Application(middlewares=[guard.middleware])
+    app.router.add_post("/webhook", webhook)
+
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post("/webhook", data="not even json", headers={SECRET_HEADER: "wrong"})
+        assert response.status == 401
+        for update_id in (1, 1, 2):
+            response = await client.post(
+                "/webhook", data=f'{{"update_id": {update_id}}}', headers={SECRET_HEADER: "s3cret"}
+            )
+            assert response.status == 200
+
+    assert handled == [1, 2]
+    assert guard.stats() == {"accepted": 2, "rejected": 1, "duplicates": 1}
+
+
+@pytest.mark.asyncio
+async def test_webhook_guard_blocks_racing_redelivery_and_allows_retry_after_failure():
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    handled = []
+    release = asyncio.Event()
+
+    async def webhook(request):
+        update_id = (await request.json())["update_id"]
+        handled.append(update_id)
+        if update_id == 1:
+            await release.wait()
+        if update_id == 2 and handled.count(2) == 1:
+            return web.Response(status=500)
+        return web.json_response({})
+
+    guard = WebhookGuard("/webhook")
+    app = web.Application(middlewares=[guard.middleware])
+    app.router.add_post("/webhook", webhook)
+
+    async with TestClient(TestServer(app)) as client:
+        first = asyncio.create_task(client.post("/webhook", data='{"update_id": 1}'))
+        while not handled:
+            await asyncio.sleep(0)
+        # Redelivered while the first delivery is still being handled
+        response = await asyncio.wait_for(client.post("/webhook", data='{"update_id": 1}'), 5)
+        assert response.status == 200
+        release.set()
+        assert (await first).status == 200
+
+        # A failed delivery is forgotten, so Telegram's retry is handled
+        assert (await client.post("/webhook", data='{"update_id": 2}')).status == 500
+        assert (await client.post("/webhook", data='{"update_id": 2}')).status == 200
+        assert (await client.post("/webhook", data='{"update_id": 2}')).status == 200
+
+    assert handled == [1, 2, 2]
+    assert guard.stats() == {"accepted": 3, "rejected": 0, "duplicates": 2}
+
+
+def test_keyboard_template_reuses_static_buttons():
+    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+    from handlers.keyboards import KeyboardTemplate, reset_keyboards, static_keyboard
+
+    built = []
+
+    @static_keyboard
+    def template(is_admin: bool) -> KeyboardTemplate:
+        built.append(is_admin)
+        return KeyboardTemplate(f"test:{is_admin}", [[("back", "back"), ("edit", "edit|{task_id}|{version}")]])
+
+    first = template(True).render(task_id=7, version=2)
+    assert first == InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="back", callback_data="back"),
+        InlineKeyboardButton(text="edit", callback_data="edit|7|2"),
+    ]])
+    other = template(True).render(task_id=8, version=2)
+    assert other.inline_keyboard[0][1].callback_data == "edit|8|2"
+    # Static buttons are shared, whole keyboards are memoized per ids
+    assert other.inline_keyboard[0][0] is first.inline_keyboard[0][0]
+    assert template(True).render(version=2, task_id=7) is first
+    assert built == [True]
+
+    reset_keyboards()
+    assert template(True).render(task_id=7, version=2) is not first
+    assert built == [True, True]
+
+
+def test_calendar_month_grid_and_payloads():
+    from handlers.calendar import _month_template, calendar_keyboard, parse_calendar_day, parse_calendar_month
+
+    keyboard = calendar_keyboard(2**31 - 1, 2**31 - 1, 1403, 5)
+    buttons = [button for row in keyboard.inline_keyboard for button in row]
+    assert all(len(button.callback_data.encode()) <= 64 for button in buttons)
+    assert keyboard.inline_keyboard[0][1].text == "مرداد 1403"
+
+    # 1 مرداد 1403 is a Monday: the first week starts with two blanks (Saturday, Sunday)
+    days = keyboard.inline_keyboard[2:-1]
+    assert all(len(row) == 7 for row in days)
+    assert [button.text for button in days[0][:3]] == [" ", " ", "1"]
+    picks = [button.callback_data for row in days for button in row if button.callback_data.startswith("cal_pick|")]
+    # The version the calendar was opened at travels with every pick
+    assert len(picks) == 31 and picks[-1] == f"cal_pick|{2**31 - 1}|14030531|{2**31 - 1}"
+    assert parse_calendar_day("14030501") == datetime(2024, 7, 22)
+    assert parse_calendar_day("14031230") == datetime(2025, 3, 20)
+    assert parse_calendar_day("14041230") is None
+    assert parse_calendar_day("1403051") is None
+
+    # Navigation wraps around the year and the grid is built once per month
+    prev_nav, next_nav = keyboard.inline_keyboard[0][0], keyboard.inline_keyboard[0][2]
+    assert (prev_nav.callback_data, next_nav.callback_data) == (
+        f"cal_nav|{2**31 - 1}|140304|{2**31 - 1}", f"cal_nav|{2**31 - 1}|140306|{2**31 - 1}"
+    )
+    assert calendar_keyboard(1, 3, 1403, 12).inline_keyboard[0][2].callback_data == "cal_nav|1|140401|3"
+    assert parse_calendar_month("140401") == (1404, 1)
+    assert calendar_keyboard(1, 1, 9999, 1) is None and calendar_keyboard(1, 1, 1403, 13) is None
+    assert _month_template(1403, 5) is _month_template(1403, 5)
+    assert calendar_keyboard(2, 1, 1403, 5).inline_keyboard[1][0] is keyboard.inline_keyboard[1][0]
+
+
+def test_text_placeholders_match_call_sites():
+    from utils.texts import Template, compile_text
+
+    root = Path(__file__).resolve().parent.parent
+    with open(root / "texts.json", encoding="utf-8") as f:
+        texts = {key: compile_text(value) for key, value in json.load(f).items()}
+
+    problems = []
+    for path in root.rglob("*.py"):
+        if "tests" in path.parts or any(part.startswith(".") or "venv" in part for part in path.parts):
+            continue
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if not (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Name)
+                and node.func.id == "t"
+                and node.args
+                and isinstance(node.args[0], ast.Constant)
+                and isinstance(node.args[0].value, str)
+            ):
+                continue
+            where = f"{path.relative_to(root)}:{node.lineno}"
+            key = node.args[0].value
+            if key not in texts:
+                problems.append(f"{where} unknown text {key}")
+                continue
+            keywords = {keyword.arg for keyword in node.keywords}
+            if None in keywords or not isinstance(texts[key], Template):
+                continue
+            if texts[key].fields - keywords:
+                problems.append(f"{where} {key} lacks {sorted(texts[key].fields - keywords)}")
+    assert problems == []
+
+
+def test_text_catalog_locales_and_hot_reload(tmp_path, monkeypatch):
+    from utils import texts
+
+    (tmp_path / "texts.json").write_text(json.dumps({"hi": "سلام {name}", "bye": "خداحافظ", "raw": "{{x}}"}), encoding="utf-8")
+    (tmp_path / "texts.en.json").write_text(json.dumps({"hi": "Hi {name}"}), encoding="utf-8")
+    monkeypatch.setattr(texts, "TEXTS_DIR", tmp_path)
+    catalog = texts.TextCatalog()
+    catalog.load()
+    monkeypatch.setattr(texts, "catalog", catalog)
+    reloaded = []
+    catalog.add_reload_hook(lambda: reloaded.append(True))
+
+    assert texts.t("hi", name="A") == "سلام A"
+    assert texts.t("hi", locale="en", name="A") == "Hi A"
+    # Missing keys fall back to the default locale, unknown locales to the default catalog
+    assert texts.t("bye", locale="en") == "خداحافظ"
+    assert texts.t("bye", locale="de") == "خداحافظ"
+    assert texts.t("raw") == "{x}"
+    assert texts.t("hi") == "سلام {name}"
+    assert catalog.reload_if_changed() is False
+
+    (tmp_path / "texts.json").write_text(json.dumps({"hi": "درود {name}"}), encoding="utf-8")
+    stat = os.stat(tmp_path / "texts.json")
+    os.utime(tmp_path / "texts.json", (stat.st_atime, stat.st_mtime + 5))
+    assert catalog.reload_if_changed() is True
+    assert texts.t("hi", name="B") == "درود B"
+    assert texts.t("bye", locale="en") == "bye"
+    assert reloaded == [True]
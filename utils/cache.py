@@ -0,0 +1,208 @@
+from __future__ import annotations
+import asyncio
+import sys
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from logger import logger
+from utils.metrics import register_metrics
+
+_MISSING = object()
+
+# Every cache registers itself here so the sweeper and metrics can find it
+_caches: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+# (hook, blocking); blocking hooks run in a worker thread when swept from the event loop
+_sweep_hooks: list[tuple[Callable[[], Any], bool]] = []
+_sweeper_task: asyncio.Task | None = None
+
+
+def approx_sizeof(value: Any, _depth: int = 0) -> int:
+    """Rough memory footprint of a value, following the containers we actually cache."""
+    size = sys.getsizeof(value)
+    if _depth > 3:
+        return size
+    if isinstance(value, dict):
+        size += sum(approx_sizeof(k, _depth + 1) + approx_sizeof(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_sizeof(item, _depth + 1) for item in value)
+    return size
+
+
+class TTLCache:
+    """
+    Bounded in-memory cache for short-lived interactive state.
+
+    - Least recently used entries are evicted once `max_size` entries or
+      `max_bytes` (approximate) are exceeded.
+    - Every entry expires `ttl` seconds after it was written.
+    - Hits, misses, evictions and expirations are counted for `stats()`.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 300, max_bytes: int | None = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        _caches.add(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        if key in self._entries:
+            self._drop(key)
+        size = approx_sizeof(value) if self.max_bytes else 0
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, size, value)
+        self._bytes += size
+        while self._entries and (
+            len(self._entries) > self.max_size
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._drop(key)
+        expires_at, _, value = entry
+        return value if expires_at > time.monotonic() else default
+
+    def remaining_ttl(self, key: Hashable) -> float:
+        """Seconds until `key` expires, 0 when it is missing or already expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0
+        return max(entry[0] - time.monotonic(), 0)
+
+    def purge_expired(self) -> int:
+        """Remove expired entries. Returns how many were dropped."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._drop(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+def cache_stats() -> list[dict]:
+    """Metrics of every live cache, sorted by name."""
+    return sorted((cache.stats() for cache in list(_caches)), key=lambda s: s["name"])
+
+
+register_metrics("caches", cache_stats)
+
+
+def add_sweep_hook(hook: Callable[[], Any], blocking: bool = False):
+    """
+    Run `hook` on every sweep, e.g. to purge state kept outside of memory.
+    Hooks doing database work pass `blocking=True`: the sweeper runs them in a
+    worker thread so they do not pause update handling. Such hooks must not
+    touch the in-memory caches, which are only safe on the event loop.
+    """
+    _sweep_hooks.append((hook, blocking))
+
+
+def _run_hook(hook: Callable[[], Any]) -> int:
+    try:
+        return hook() or 0
+    except Exception:
+        logger.exception("Cache sweep hook failed")
+        return 0
+
+
+def sweep() -> int:
+    """Purge expired entries from all caches and run the sweep hooks once, all in the calling thread."""
+    removed = 0
+    for cache in list(_caches):
+        removed += cache.purge_expired()
+    for hook, _ in list(_sweep_hooks):
+        removed += _run_hook(hook)
+    return removed
+
+
+async def _sweep_once() -> int:
+    """`sweep` for the event loop: blocking hooks run one at a time in a worker thread."""
+    removed = 0
+    for cache in list(_caches):
+        removed += cache.purge_expired()
+    for hook, blocking in list(_sweep_hooks):
+        removed += await asyncio.to_thread(_run_hook, hook) if blocking else _run_hook(hook)
+    return removed
+
+
+async def _sweep_forever(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        removed = await _sweep_once()
+        logger.debug(f"Cache sweep removed {removed} entries; stats: {cache_stats()}")
+
+
+def start_sweeper(interval: float = 60) -> asyncio.Task:
+    """Start the periodic sweeper on the running event loop (idempotent)."""
+    global _sweeper_task
+    if _sweeper_task is None or _sweeper_task.done():
+        _sweeper_task = asyncio.create_task(_sweep_forever(interval))
+    return _sweeper_task
+
+
+async def stop_sweeper():
+    global _sweeper_task
+    if _sweeper_task is None:
+        return
+    _sweeper_task.cancel()
+    try:
+        await _sweeper_task
+    except asyncio.CancelledError:
+        pass
+    _sweeper_task = None
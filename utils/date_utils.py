@@ -1,28 +1,71 @@
 from __future__ import annotations
-from datetime import datetime
+import re
+from datetime import date, datetime
 import jdatetime
 
+from utils.cache import TTLCache
 
-def gregorian_to_jalali(dt: datetime | None) -> str:
+# Persian (۰-۹) and Arabic-Indic (٠-٩) digits typed by users
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "0123456789" * 2)
+# YYYY-MM-DD or DD-MM-YYYY with -, / or . as separator; the layout is known from the match
+_DATE = re.compile(r"(\d{4})([-/.])(\d{1,2})\2(\d{1,2})|(\d{1,2})([-/.])(\d{1,2})\6(\d{4})", re.ASCII)
+# Years below this are Jalali (the Jalali calendar is ~621 years behind)
+GREGORIAN_MIN_YEAR = 1700
+JALALI_MONTH_NAMES = (
+    "فروردین", "اردیبهشت", "خرداد", "تیر", "مرداد", "شهریور",
+    "مهر", "آبان", "آذر", "دی", "بهمن", "اسفند",
+)
+
+# Task lists render the same few deadlines over and over
+_jalali_strings = TTLCache("jalali_dates", max_size=4096, ttl=86400)
+
+
+def normalize_digits(text: str) -> str:
+    """Replace Persian and Arabic-Indic digits with ASCII digits."""
+    return text.translate(_DIGITS)
+
+
+def gregorian_to_jalali(dt: datetime | date | None) -> str:
     """Return Jalali date string (YYYY-MM-DD) or fallback if missing."""
     if not dt:
         return "N/A"
+    day = dt.date() if isinstance(dt, datetime) else dt
+    value = _jalali_strings.get(day)
+    if value is None:
+        try:
+            jd = jdatetime.date.fromgregorian(date=day)
+        except Exception:
+            return "N/A"
+        value = f"{jd.year:04d}-{jd.month:02d}-{jd.day:02d}"
+        _jalali_strings.set(day, value)
+    return value
+
+
+def _split_date(date_str: str) -> tuple[int, int, int] | None:
+    """(year, month, day) of a date string in any supported layout, or None."""
+    match = _DATE.fullmatch(normalize_digits(date_str.strip()))
+    if not match:
+        return None
+    if match.group(1):
+        return int(match.group(1)), int(match.group(3)), int(match.group(4))
+    return int(match.group(8)), int(match.group(7)), int(match.group(5))
+
+
+def _jalali_datetime(year: int, month: int, day: int) -> datetime | None:
     try:
-        jd = jdatetime.datetime.fromgregorian(datetime=dt)
-        return jd.strftime("%Y-%m-%d")
-    except Exception:
-        return "N/A"
+        return datetime.combine(jdatetime.date(year, month, day).togregorian(), datetime.min.time())
+    except ValueError:
+        return None
 
 
 def jalali_to_gregorian(date_str: str) -> datetime | None:
     """Parse a Jalali date string (YYYY-MM-DD) to Gregorian datetime."""
     if not date_str:
         return None
-    try:
-        jd = jdatetime.datetime.strptime(date_str, "%Y-%m-%d")
-        return jd.togregorian()
-    except Exception:
+    match = _DATE.fullmatch(normalize_digits(date_str.strip()))
+    if not match or not match.group(1):
         return None
+    return _jalali_datetime(int(match.group(1)), int(match.group(3)), int(match.group(4)))
 
 
 def is_future_date(dt: datetime | None) -> bool:
@@ -34,33 +77,20 @@ def is_future_date(dt: datetime | None) -> bool:
 
 def parse_flexible_date(date_str: str) -> datetime | None:
     """
-    Try to parse a date string in several common formats.
-    Supports Jalali (YYYY-MM-DD) and a handful of Gregorian layouts.
+    Parse a date in one pass: YYYY-MM-DD or DD-MM-YYYY with -, / or . between
+    the parts, in ASCII, Persian or Arabic-Indic digits. Years before
+    GREGORIAN_MIN_YEAR are read as Jalali, later ones as Gregorian.
     Returns a datetime on success, otherwise None.
     """
     if not date_str:
         return None
-
-    cleaned = date_str.strip()
-
-    # Try Jalali first
-    jalali_dt = jalali_to_gregorian(cleaned)
-    if jalali_dt:
-        return jalali_dt
-
-    formats = (
-        "%Y-%m-%d",
-        "%Y/%m/%d",
-        "%Y.%m.%d",
-        "%d-%m-%Y",
-        "%d/%m/%Y",
-        "%d.%m.%Y",
-    )
-
-    for fmt in formats:
-        try:
-            return datetime.strptime(cleaned, fmt)
-        except Exception:
-            continue
-
-    return None
+    parts = _split_date(date_str)
+    if not parts:
+        return None
+    year, month, day = parts
+    if year < GREGORIAN_MIN_YEAR:
+        return _jalali_datetime(year, month, day)
+    try:
+        return datetime(year, month, day)
+    except ValueError:
+        return None
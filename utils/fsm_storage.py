@@ -0,0 +1,269 @@
+from __future__ import annotations
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Any, Callable, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from database import SessionLocal
+from logger import logger
+from models import FSMRecord
+from utils.cache import TTLCache
+
+
+class SQLAlchemyStorage(BaseStorage):
+    """
+    FSM storage kept in the `fsm_states` table, so conversations survive restarts
+    and can be continued by any worker sharing the database.
+
+    - State and data of one key live in a single row; data is stored as compact JSON.
+    - States untouched for `state_ttl` seconds are treated as gone and purged by `purge_expired`.
+    - Writes land in an in-process record cache first and are upserted in one
+      transaction `flush_delay` seconds later, so the usual burst of
+      `update_data`/`set_state` calls of a handler costs a single round trip.
+    - The record cache assumes a chat is served by one process at a time
+      (a single worker, or workers with chat affinity).
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        state_ttl: int = 86400,
+        flush_delay: float = 0.05,
+        cache_size: int = 10000,
+        key_builder: KeyBuilder | None = None,
+    ):
+        self.session_factory = session_factory
+        self.state_ttl = state_ttl
+        self.flush_delay = flush_delay
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # key -> (state, data)
+        self._records = TTLCache("fsm_records", max_size=cache_size, ttl=state_ttl)
+        self._pending: dict[str, tuple[str | None, dict[str, Any]]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    def _key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key)
+
+    def _load(self, key: str) -> tuple[str | None, dict[str, Any]]:
+        record = self._pending.get(key) or self._records.get(key)
+        if record is not None:
+            return record
+
+        record = (None, {})
+        db = None
+        try:
+            db = self.session_factory()
+            row = db.query(FSMRecord).filter(FSMRecord.key == key).first()
+            if row is not None and row.updated_at > datetime.now() - timedelta(seconds=self.state_ttl):
+                record = (row.state, json.loads(row.data) if row.data else {})
+        except Exception:
+            logger.exception("Failed to load FSM state")
+            # Do not cache a miss caused by a database error
+            return record
+        finally:
+            if db is not None:
+                db.close()
+
+        self._records.set(key, record)
+        return record
+
+    def _store(self, key: str, state: str | None, data: dict[str, Any]):
+        self._records.set(key, (state, data))
+        self._pending[key] = (state, data)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+
+    def flush(self) -> int:
+        """Upsert all pending records in one transaction. Returns the number written."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        db = None
+        try:
+            db = self.session_factory()
+            rows = {
+                row.key: row
+                for row in db.query(FSMRecord).filter(FSMRecord.key.in_(list(pending)))
+            }
+            now = datetime.now()
+            for key, (state, data) in pending.items():
+                row = rows.get(key)
+                # Finished conversations leave nothing behind
+                if state is None and not data:
+                    if row is not None:
+                        db.delete(row)
+                    continue
+                payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+                if row is None:
+                    db.add(FSMRecord(key=key, state=state, data=payload, updated_at=now))
+                else:
+                    row.state = state
+                    row.data = payload
+                    row.updated_at = now
+            db.commit()
+        except Exception:
+            logger.exception("Failed to flush FSM states")
+            if db is not None:
+                db.rollback()
+            # Keep newer writes that arrived meanwhile, retry the rest on next flush
+            self._pending = {**pending, **self._pending}
+            return 0
+        finally:
+            if db is not None:
+                db.close()
+        return len(pending)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        _, data = self._load(storage_key)
+        self._store(storage_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return self._load(self._key(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        storage_key = self._key(key)
+        state, _ = self._load(storage_key)
+        self._store(storage_key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return self._load(self._key(key))[1].copy()
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        storage_key = self._key(key)
+        state, current = self._load(storage_key)
+        merged = {**current, **data}
+        self._store(storage_key, state, merged)
+        return merged.copy()
+
+    def purge_expired(self) -> int:
+        """Delete states untouched for longer than `state_ttl`. Returns the number removed."""
+        return self._records.purge_expired() + self.purge_expired_rows()
+
+    def purge_expired_rows(self) -> int:
+        """The database half of `purge_expired`; safe to run off the event loop."""
+        removed = 0
+        db = None
+        try:
+            db = self.session_factory()
+            removed = db.query(FSMRecord).filter(
+                FSMRecord.updated_at <= datetime.now() - timedelta(seconds=self.state_ttl)
+            ).delete()
+            db.commit()
+        except Exception:
+            logger.exception("Failed to purge expired FSM states")
+        finally:
+            if db is not None:
+                db.close()
+        return removed
+
+    async def close(self) -> None:
+        self.flush()
+
+    def active_pairs(self) -> list[tuple[int, int]]:
+        """
+        (chat_id, user_id) of every stored conversation that has not expired.
+        Relies on the key layout of the default key builder.
+        """
+        db = None
+        try:
+            db = self.session_factory()
+            keys = db.query(FSMRecord.key).filter(
+                FSMRecord.updated_at > datetime.now() - timedelta(seconds=self.state_ttl)
+            ).all()
+        except Exception:
+            logger.exception("Failed to load active FSM keys")
+            return []
+        finally:
+            if db is not None:
+                db.close()
+
+        pairs = []
+        for (key,) in keys:
+            parts = key.split(":")
+            try:
+                pairs.append((int(parts[2]), int(parts[3])))
+            except (IndexError, ValueError):
+                continue
+        return pairs
+
+
+class TrackingStorage(BaseStorage):
+    """
+    Wraps another storage and remembers which (chat, user) pairs have a state or
+    data, so middlewares can ask `is_active` without a storage round trip.
+
+    A pair is forgotten `state_ttl` seconds after its last write, like states
+    expire in `SQLAlchemyStorage`, so abandoned conversations do not pile up
+    or keep letting that user's group chatter through the prefilter.
+    """
+
+    def __init__(self, storage: BaseStorage, state_ttl: float = 86400, max_size: int = 100000):
+        self.storage = storage
+        # (chat_id, user_id) -> (has state, has data)
+        self._active = TTLCache("fsm_active_pairs", max_size=max_size, ttl=state_ttl)
+
+    @staticmethod
+    def _pair(key: StorageKey) -> tuple[int, int]:
+        return key.chat_id, key.user_id
+
+    def seed(self, pairs: list[tuple[int, int]]):
+        """Mark conversations loaded from a persistent storage as active."""
+        for pair in pairs:
+            self._active.set(pair, (True, False))
+
+    def is_active(self, chat_id: int, user_id: int) -> bool:
+        return (chat_id, user_id) in self._active
+
+    def _track(self, key: StorageKey, state: bool | None = None, data: bool | None = None):
+        pair = self._pair(key)
+        has_state, has_data = self._active.get(pair, (False, False))
+        tracked = (has_state if state is None else state, has_data if data is None else data)
+        if any(tracked):
+            self._active.set(pair, tracked)
+        else:
+            self._active.pop(pair)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.storage.set_state(key, state)
+        self._track(key, state=state is not None)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return await self.storage.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.storage.set_data(key, data)
+        self._track(key, data=bool(data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return await self.storage.get_data(key)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        merged = await self.storage.update_data(key, data)
+        self._track(key, data=bool(merged))
+        return merged
+
+    def active_count(self) -> int:
+        self._active.purge_expired()
+        return len(self._active)
+
+    async def close(self) -> None:
+        await self.storage.close()
@@ -0,0 +1,21 @@
+from typing import Any, Callable
+
+from logger import logger
+
+_providers: dict[str, Callable[[], Any]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], Any]):
+    """Expose the result of `provider()` under `name` in `collect_metrics`."""
+    _providers[name] = provider
+
+
+def collect_metrics() -> dict[str, Any]:
+    """Snapshot of every registered metrics provider, served on /metrics."""
+    metrics = {}
+    for name, provider in list(_providers.items()):
+        try:
+            metrics[name] = provider()
+        except Exception:
+            logger.exception(f"Failed to collect metrics for {name}")
+    return metrics
@@ -0,0 +1,201 @@
+"""
+Relative and natural deadline expressions in Persian and English.
+
+The text is split into tokens, phrases are mapped to symbols through the
+tables below (longest phrase first) and the symbol sequence is matched
+against a handful of shapes:
+
+    OFFSET                  فردا, پس‌فردا, today, day after tomorrow
+    NUMBER? UNIT            +3d, 3 روز دیگه, in 2 weeks, next month, هفته بعد
+    WEEKDAY                 شنبه, next saturday, سه‌شنبه آینده
+    END                     آخر ماه, end of month, آخر هفته
+    NUMBER MONTH NUMBER?    ۲۰ مرداد, 20 mordad 1404
+    MONTH NUMBER NUMBER?    mordad 20
+
+Weekdays and month-name dates without a year resolve to their next
+occurrence. Months ("ماه", "end of month") are Jalali months.
+"""
+from __future__ import annotations
+import re
+from datetime import date, datetime, timedelta
+import jdatetime
+
+from utils.date_utils import JALALI_MONTH_NAMES, normalize_digits, parse_flexible_date
+
+
+_TOKEN = re.compile(r"\d+|[a-z]+|[؀-ۿ]+")
+# A minus sign before a number: deadlines are never in the past, and dropping
+# the sign like other separators would turn "-3d" into three days ahead
+_NEGATIVE = re.compile(r"(?<!\w)[-−–]\s*\d")
+# Arabic letters and separators users type instead of the Persian ones
+_NORMALIZE = str.maketrans({"ي": "ی", "ك": "ک", "ة": "ه", "‌": " ", "-": " ", "_": " "})
+
+OFFSET, UNIT, WEEKDAY, END, MONTH, NUMBER = "offset", "unit", "weekday", "end", "month", "number"
+
+# Words that only make a phrase read naturally
+_FILLERS = frozenset({
+    "in", "on", "at", "by", "next", "this", "the", "of", "coming", "until",
+    "بعد", "بعدی", "دیگه", "دیگر", "آینده", "تا", "در", "همین", "ی",
+})
+
+_WEEKDAYS = {
+    "شنبه": 5, "یکشنبه": 6, "دوشنبه": 0, "سهشنبه": 1, "چهارشنبه": 2, "پنجشنبه": 3, "جمعه": 4,
+    "saturday": 5, "sunday": 6, "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4,
+    "sat": 5, "sun": 6, "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4,
+}
+
+_JALALI_MONTHS = {
+    **{name: month for month, name in enumerate(JALALI_MONTH_NAMES, 1)},
+    "farvardin": 1, "ordibehesht": 2, "khordad": 3, "tir": 4, "mordad": 5, "shahrivar": 6,
+    "mehr": 7, "aban": 8, "azar": 9, "dey": 10, "bahman": 11, "esfand": 12,
+}
+
+_NUMBER_WORDS = {
+    "یک": 1, "یه": 1, "دو": 2, "سه": 3, "چهار": 4, "پنج": 5, "شش": 6, "هفت": 7, "هشت": 8, "نه": 9, "ده": 10,
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+_UNITS = {
+    "d": "day", "day": "day", "days": "day",
+    "w": "week", "week": "week", "weeks": "week", "هفته": "week",
+    "m": "month", "month": "month", "months": "month", "ماه": "month",
+}
+
+# Multi-word phrases, matched before single tokens
+_PHRASES: dict[tuple[str, ...], tuple[str, object]] = {
+    ("پس", "فردا"): (OFFSET, 2),
+    ("day", "after", "tomorrow"): (OFFSET, 2),
+    ("آخر", "ماه"): (END, "month"),
+    ("اخر", "ماه"): (END, "month"),
+    ("پایان", "ماه"): (END, "month"),
+    ("end", "month"): (END, "month"),
+    ("month", "end"): (END, "month"),
+    ("آخر", "هفته"): (END, "week"),
+    ("اخر", "هفته"): (END, "week"),
+    ("پایان", "هفته"): (END, "week"),
+    ("end", "week"): (END, "week"),
+    ("یک", "شنبه"): (WEEKDAY, 6),
+    ("سه", "شنبه"): (WEEKDAY, 1),
+    ("چهار", "شنبه"): (WEEKDAY, 2),
+    ("پنج", "شنبه"): (WEEKDAY, 3),
+}
+
+_WORDS: dict[str, tuple[str, object]] = {
+    "امروز": (OFFSET, 0), "today": (OFFSET, 0),
+    "فردا": (OFFSET, 1), "tomorrow": (OFFSET, 1),
+    "پسفردا": (OFFSET, 2),
+    **{word: (WEEKDAY, day) for word, day in _WEEKDAYS.items()},
+    **{word: (MONTH, month) for word, month in _JALALI_MONTHS.items()},
+    **{word: (NUMBER, value) for word, value in _NUMBER_WORDS.items()},
+    **{word: (UNIT, unit) for word, unit in _UNITS.items()},
+}
+_LONGEST_PHRASE = max(len(phrase) for phrase in _PHRASES)
+
+
+def _symbols(text: str) -> list[tuple[str, object]] | None:
+    """Map the text to (kind, value) symbols, or None when a word is unknown or a number is negative."""
+    normalized = normalize_digits(text).lower()
+    if _NEGATIVE.search(normalized):
+        return None
+    normalized = normalized.translate(_NORMALIZE)
+    tokens = [token for token in _TOKEN.findall(normalized) if token not in _FILLERS]
+    symbols = []
+    i = 0
+    while i < len(tokens):
+        for size in range(min(_LONGEST_PHRASE, len(tokens) - i), 1, -1):
+            phrase = _PHRASES.get(tuple(tokens[i:i + size]))
+            if phrase:
+                symbols.append(phrase)
+                i += size
+                break
+        else:
+            token = tokens[i]
+            i += 1
+            if token.isdigit():
+                symbols.append((NUMBER, int(token)))
+            elif token in _WORDS:
+                symbols.append(_WORDS[token])
+            elif token == "روز":
+                # The day unit after a number ("3 روز"), otherwise filler ("روز شنبه")
+                if symbols and symbols[-1][0] == NUMBER:
+                    symbols.append((UNIT, "day"))
+            else:
+                return None
+    return symbols
+
+
+def _add_jalali_months(day: date, months: int) -> date:
+    jd = jdatetime.date.fromgregorian(date=day)
+    index = jd.month - 1 + months
+    year, month = jd.year + index // 12, index % 12 + 1
+    # 31 شهریور + 1 month is 30 مهر
+    for day_of_month in range(jd.day, 0, -1):
+        try:
+            return jdatetime.date(year, month, day_of_month).togregorian()
+        except ValueError:
+            continue
+
+
+def _end_of_jalali_month(day: date) -> date:
+    jd = jdatetime.date.fromgregorian(date=day)
+    first_of_next = jdatetime.date(jd.year + jd.month // 12, jd.month % 12 + 1, 1)
+    return first_of_next.togregorian() - timedelta(days=1)
+
+
+def _jalali_date(day: int, month: int, year: int | None, today: date) -> date | None:
+    try:
+        if year is not None:
+            return jdatetime.date(year, month, day).togregorian()
+        this_year = jdatetime.date.fromgregorian(date=today).year
+        candidate = jdatetime.date(this_year, month, day).togregorian()
+        return candidate if candidate >= today else jdatetime.date(this_year + 1, month, day).togregorian()
+    except ValueError:
+        return None
+
+
+def _resolve(symbols: list[tuple[str, object]], today: date) -> date | None:
+    kinds = tuple(kind for kind, _ in symbols)
+    values = [value for _, value in symbols]
+
+    if kinds == (OFFSET,):
+        return today + timedelta(days=values[0])
+    if kinds in ((UNIT,), (NUMBER, UNIT)):
+        count, unit = (1, values[0]) if len(values) == 1 else values
+        if unit == "day":
+            return today + timedelta(days=count)
+        if unit == "week":
+            return today + timedelta(weeks=count)
+        return _add_jalali_months(today, count)
+    if kinds == (WEEKDAY,):
+        return today + timedelta(days=(values[0] - today.weekday() - 1) % 7 + 1)
+    if kinds == (END,):
+        if values[0] == "week":
+            # The Persian week ends on Friday
+            return today + timedelta(days=(4 - today.weekday()) % 7)
+        return _end_of_jalali_month(today)
+    if kinds in ((NUMBER, MONTH), (NUMBER, MONTH, NUMBER)):
+        return _jalali_date(values[0], values[1], values[2] if len(values) > 2 else None, today)
+    if kinds in ((MONTH, NUMBER), (MONTH, NUMBER, NUMBER)):
+        return _jalali_date(values[1], values[0], values[2] if len(values) > 2 else None, today)
+    return None
+
+
+def parse_natural_date(text: str, today: date | None = None) -> datetime | None:
+    """Resolve a relative or natural date expression against `today`, or return None."""
+    if not text:
+        return None
+    symbols = _symbols(text)
+    if not symbols:
+        return None
+    try:
+        resolved = _resolve(symbols, today or date.today())
+    except (OverflowError, ValueError):
+        # Counts beyond the supported date range, e.g. "99999999d"
+        return None
+    return datetime.combine(resolved, datetime.min.time()) if resolved else None
+
+
+def parse_deadline(text: str, today: date | None = None) -> datetime | None:
+    """A numeric date (see `parse_flexible_date`) or a natural expression such as "فردا" or "+3d"."""
+    return parse_flexible_date(text) or parse_natural_date(text, today)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+import json
+import secrets
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from config import config
+from database import SessionLocal
+from logger import logger
+from models import CallbackPayload
+from utils.cache import TTLCache, add_sweep_hook
+
+
+class PayloadStore:
+    """
+    Keep callback payloads on the server side and hand out short tokens instead.
+
+    Telegram limits callback_data to 64 bytes, which user supplied text (titles,
+    descriptions, file ids) easily exceeds. Handlers store the payload here and put
+    only the token into the button; the callback handler resolves it back.
+
+    - The in-memory tier is a `TTLCache` bounded by entry count and memory
+      (least recently used tokens are dropped first); entries expire after `ttl` seconds.
+    - With `use_db=True` payloads are also written to the `callback_payloads` table,
+      so tokens survive restarts and can be resolved by any webhook worker.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: int = 86400,
+        use_db: bool = False,
+        session_factory: Callable = SessionLocal,
+        max_bytes: int | None = None,
+    ):
+        self.ttl = ttl
+        self.use_db = use_db
+        self.session_factory = session_factory
+        self._cache = TTLCache("payload_store", max_size=max_size, ttl=ttl, max_bytes=max_bytes)
+
+    def put(self, payload: Any) -> str:
+        """Store a JSON serializable payload and return its token."""
+        token = secrets.token_urlsafe(6)
+        self._cache.set(token, payload)
+
+        if self.use_db:
+            db = None
+            try:
+                db = self.session_factory()
+                db.add(CallbackPayload(
+                    token=token,
+                    payload=json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+                    expires_at=datetime.now() + timedelta(seconds=self.ttl),
+                ))
+                db.commit()
+            except Exception:
+                logger.exception("Failed to persist callback payload")
+            finally:
+                if db is not None:
+                    db.close()
+        return token
+
+    def get(self, token: str) -> Any | None:
+        """Resolve a token to its payload, or None if it is unknown or expired."""
+        payload = self._cache.get(token)
+        if payload is not None or not self.use_db:
+            return payload
+
+        db = None
+        try:
+            db = self.session_factory()
+            record = db.query(CallbackPayload).filter(CallbackPayload.token == token).first()
+            if record is None:
+                return None
+            remaining = (record.expires_at - datetime.now()).total_seconds()
+            if remaining <= 0:
+                db.delete(record)
+                db.commit()
+                return None
+            payload = json.loads(record.payload)
+            self._cache.set(token, payload, ttl=remaining)
+            return payload
+        except Exception:
+            logger.exception("Failed to load callback payload")
+            return None
+        finally:
+            if db is not None:
+                db.close()
+
+    def pop(self, token: str) -> Any | None:
+        """Resolve a token and forget it, so the same payload is applied only once."""
+        payload = self.get(token)
+        self._cache.pop(token)
+
+        if self.use_db:
+            db = None
+            try:
+                db = self.session_factory()
+                db.query(CallbackPayload).filter(CallbackPayload.token == token).delete()
+                db.commit()
+            except Exception:
+                logger.exception("Failed to delete callback payload")
+            finally:
+                if db is not None:
+                    db.close()
+        return payload
+
+    def purge_expired(self) -> int:
+        """Drop expired payloads from memory and database. Returns the number removed."""
+        return self._cache.purge_expired() + self.purge_expired_rows()
+
+    def purge_expired_rows(self) -> int:
+        """The database half of `purge_expired`; safe to run off the event loop."""
+        if not self.use_db:
+            return 0
+        removed = 0
+        db = None
+        try:
+            db = self.session_factory()
+            removed = db.query(CallbackPayload).filter(
+                CallbackPayload.expires_at <= datetime.now()
+            ).delete()
+            db.commit()
+        except Exception:
+            logger.exception("Failed to purge expired callback payloads")
+        finally:
+            if db is not None:
+                db.close()
+        return removed
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+payload_store = PayloadStore(
+    max_size=config.PAYLOAD_STORE_MAX_SIZE,
+    ttl=config.PAYLOAD_STORE_TTL,
+    use_db=config.PAYLOAD_STORE_BACKEND == "db",
+    max_bytes=config.PAYLOAD_STORE_MAX_BYTES,
+)
+# The cache sweeper only sees memory; expired rows are purged alongside it, off the event loop
+if payload_store.use_db:
+    add_sweep_hook(payload_store.purge_expired_rows, blocking=True)
@@ -1,23 +1,155 @@
 from __future__ import annotations
 import json
-from functools import lru_cache
+import os
+import string
 from pathlib import Path
+from typing import Callable
 
+from logger import logger
 
-@lru_cache(maxsize=1)
-def _load_texts() -> dict:
-    texts_path = Path(__file__).resolve().parent.parent / "texts.json"
-    try:
-        with open(texts_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+TEXTS_DIR = Path(__file__).resolve().parent.parent
+# texts.json holds the default locale, other locales live in texts.<locale>.json
+DEFAULT_LOCALE = "fa"
+
+_formatter = string.Formatter()
+
+
+class Template:
+    """
+    A text with placeholders, parsed once when the catalog is loaded.
+
+    Plain `{name}` placeholders are compiled to a `%(name)s` pattern, which
+    formats faster than `str.format` re-parsing the text on every call; texts
+    using format specs or conversions keep `str.format_map`.
+    """
+
+    __slots__ = ("text", "fields", "_pattern")
+
+    def __init__(self, text: str, parsed: list[tuple]):
+        self.text = text
+        self.fields = frozenset(name.split(".")[0].split("[")[0] for _, name, _, _ in parsed if name is not None)
+        self._pattern = None
+        if all(name is None or (name.isidentifier() and not spec and not conversion) for _, name, spec, conversion in parsed):
+            self._pattern = "".join(
+                literal.replace("%", "%%") + (f"%({name})s" if name is not None else "")
+                for literal, name, _, _ in parsed
+            )
 
+    def render(self, kwargs: dict) -> str:
+        try:
+            if self._pattern is not None:
+                return self._pattern % kwargs
+            return self.text.format_map(kwargs)
+        except KeyError as e:
+            logger.warning(f"Missing placeholder {e} for text: {self.text[:40]!r}")
+        except (AttributeError, IndexError, TypeError, ValueError):
+            logger.warning(f"Could not format text: {self.text[:40]!r}")
+        return self.text
 
-def t(key: str, **kwargs) -> str:
-    """Fetch a text by key from texts.json and format it."""
-    value = _load_texts().get(key, key)
+
+def compile_text(text: str) -> str | Template:
+    """
+    Plain texts are returned unescaped (`{{` -> `{`) and need no formatting at
+    lookup time; texts with placeholders become a `Template`.
+    """
     try:
-        return value.format(**kwargs)
-    except Exception:
-        return value
+        parsed = list(_formatter.parse(text))
+    except ValueError:
+        logger.warning(f"Malformed text template kept as is: {text[:40]!r}")
+        return text
+    if all(name is None for _, name, _, _ in parsed):
+        return "".join(literal for literal, _, _, _ in parsed)
+    return Template(text, parsed)
+
+
+def _locale_path(locale: str) -> Path:
+    return TEXTS_DIR / ("texts.json" if locale == DEFAULT_LOCALE else f"texts.{locale}.json")
+
+
+class TextCatalog:
+    """
+    Compiled texts of every locale, swapped as a whole on reload.
+
+    - Each locale file is read once and its templates are pre-parsed.
+    - Keys missing in a locale fall back to the default locale, merged at load
+      time so a lookup is a single dict access whatever the locale.
+    - `reload_if_changed` rebuilds the catalog when a file's mtime changed; the
+      new catalog is built aside and then replaces the old one in one assignment.
+    """
+
+    def __init__(self):
+        self._locales: dict[str, dict[str, str | Template]] = {DEFAULT_LOCALE: {}}
+        self._mtimes: dict[Path, float] = {}
+        self._reload_hooks: list[Callable[[], None]] = []
+        self.reloads = 0
+
+    def _scan(self) -> dict[Path, float]:
+        mtimes = {}
+        for path in [_locale_path(DEFAULT_LOCALE), *sorted(TEXTS_DIR.glob("texts.*.json"))]:
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    @staticmethod
+    def _read(path: Path) -> dict[str, str | Template]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except Exception:
+            logger.exception(f"Failed to load texts from {path.name}")
+            return {}
+        return {key: compile_text(value) for key, value in raw.items() if isinstance(value, str)}
+
+    def load(self):
+        mtimes = self._scan()
+        default = self._read(_locale_path(DEFAULT_LOCALE))
+        locales = {DEFAULT_LOCALE: default}
+        for path in mtimes:
+            locale = path.name[len("texts."):-len(".json")]
+            if locale and locale != DEFAULT_LOCALE:
+                locales[locale] = {**default, **self._read(path)}
+        # One assignment, so lookups see either the old or the new catalog
+        self._locales = locales
+        self._mtimes = mtimes
+
+    def reload_if_changed(self) -> bool:
+        """Reload every locale when a texts file was added, removed or modified."""
+        if self._scan() == self._mtimes:
+            return False
+        self.load()
+        self.reloads += 1
+        logger.info("Texts reloaded")
+        for hook in self._reload_hooks:
+            try:
+                hook()
+            except Exception:
+                logger.exception("Texts reload hook failed")
+        return True
+
+    def add_reload_hook(self, hook: Callable[[], None]):
+        """Run `hook` after every reload, e.g. to drop keyboards built from old texts."""
+        self._reload_hooks.append(hook)
+
+    def texts(self, locale: str | None = None) -> dict[str, str | Template]:
+        """Compiled texts of `locale`, the default locale when it is unknown."""
+        locales = self._locales
+        if locale is None:
+            return locales[DEFAULT_LOCALE]
+        return locales.get(locale) or locales[DEFAULT_LOCALE]
+
+    def locales(self) -> list[str]:
+        return list(self._locales)
+
+
+catalog = TextCatalog()
+catalog.load()
+
+
+def t(key: str, locale: str | None = None, **kwargs) -> str:
+    """Fetch a text by key from texts.json (or the `locale` file) and format it."""
+    value = catalog.texts(locale).get(key, key)
+    if value.__class__ is Template:
+        return value.render(kwargs)
+    return value
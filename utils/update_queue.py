@@ -0,0 +1,211 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from logger import logger
+
+# Update fields whose payload carries the chat the update belongs to
+_CHAT_FIELDS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "business_message",
+    "edited_business_message",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+    "message_reaction",
+    "message_reaction_count",
+    "chat_boost",
+    "removed_chat_boost",
+)
+
+
+def update_affinity_key(update: dict) -> int:
+    """
+    Chat id an update belongs to, so every update of one chat is handled in order.
+    Updates without a chat (inline queries, polls, ...) fall back to the sender, then to the update id.
+    """
+    for field in _CHAT_FIELDS:
+        payload = update.get(field)
+        if payload and "chat" in payload:
+            return int(payload["chat"]["id"])
+
+    callback_query = update.get("callback_query")
+    if callback_query:
+        message = callback_query.get("message")
+        if message and "chat" in message:
+            return int(message["chat"]["id"])
+        return int(callback_query["from"]["id"])
+
+    for payload in update.values():
+        if isinstance(payload, dict) and "from" in payload:
+            return int(payload["from"]["id"])
+    return int(update.get("update_id", 0))
+
+
+class UpdateQueue:
+    """
+    Bounded in-process queue between the webhook endpoint and the dispatcher.
+
+    - `put` never waits: it returns False when `maxsize` updates are already
+      waiting, so the endpoint can push back instead of piling up tasks;
+      `put_wait` waits for room instead.
+    - Updates wait in one FIFO lane per chat (`update_affinity_key`). A lane is
+      handed to a consumer only while none of its updates is in flight, so
+      `consumers` updates of different chats run concurrently and a busy chat
+      never holds more than one consumer.
+    - Queue depth, waiting time (lag) and processing time are kept for `stats()`.
+    - `drain` stops intake and waits for queued updates to finish.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, maxsize: int = 1000, consumers: int = 16):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.maxsize = maxsize
+        self.consumers = consumers
+        # Chat lanes with queued or in-flight updates, and the lanes ready for a consumer
+        self._lanes: dict[int, deque] = {}
+        self._ready: asyncio.Queue | None = None
+        self._pending = 0
+        self._room: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+        self.max_depth = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._lag_total = 0.0
+        self.lag_max = 0.0
+        self._processing_total = 0.0
+
+    def start(self):
+        """Start the consumers on the running event loop (idempotent)."""
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._room = asyncio.Event()
+        self._closing = False
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.consumers)]
+
+    def put(self, update: dict[str, Any]) -> bool:
+        """Queue an update. Returns False when the queue is full or shutting down."""
+        if self._closing:
+            self.rejected += 1
+            return False
+        self.start()
+        if self._pending >= self.maxsize:
+            self.rejected += 1
+            return False
+        self._enqueue(update)
+        return True
+
+    async def put_wait(self, update: dict[str, Any]) -> bool:
+        """Queue an update, waiting while the queue is full. Returns False when shutting down."""
+        self.start()
+        while self._pending >= self.maxsize and not self._closing:
+            self._room.clear()
+            await self._room.wait()
+        if self._closing:
+            self.rejected += 1
+            return False
+        self._enqueue(update)
+        return True
+
+    def _enqueue(self, update: dict[str, Any]):
+        key = update_affinity_key(update)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self._ready.put_nowait(key)
+        lane.append((update, time.monotonic()))
+        self._pending += 1
+        self.max_depth = max(self.max_depth, self._pending)
+
+    async def _consume(self):
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes[key]
+            update, enqueued_at = lane.popleft()
+            started = time.monotonic()
+            lag = started - enqueued_at
+            self._lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+            try:
+                result = await self.dispatcher.feed_raw_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(bot=self.bot, result=result)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to process queued update")
+            finally:
+                self._processing_total += time.monotonic() - started
+                self._pending -= 1
+                self._room.set()
+                # The chat's next update goes to the back of the line, behind other chats
+                if lane:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._lanes[key]
+                self._ready.task_done()
+
+    async def drain(self, timeout: float = 30):
+        """Stop accepting updates, wait for the queued ones, then stop the consumers."""
+        if not self._tasks:
+            return
+        self._closing = True
+        self._room.set()
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Update queue drain timed out with {self._pending} updates left")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        handled = self.processed + self.failed
+        return {
+            "depth": self._pending,
+            "active_chats": len(self._lanes),
+            "max_depth": self.max_depth,
+            "capacity": self.maxsize,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "lag_avg_ms": round(self._lag_total / handled * 1000, 2) if handled else 0.0,
+            "lag_max_ms": round(self.lag_max * 1000, 2),
+            "processing_avg_ms": round(self._processing_total / handled * 1000, 2) if handled else 0.0,
+        }
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler that answers Telegram right away and leaves the update to an `UpdateQueue`.
+    A full queue is answered with 503 so Telegram redelivers the update later.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, update_queue: UpdateQueue, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.update_queue = update_queue
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        if not self.update_queue.put(update):
+            return web.Response(status=503)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        # Queued updates still need the bot session
+        await self.update_queue.drain()
+        await super().close()
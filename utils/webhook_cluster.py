@@ -0,0 +1,194 @@
+from __future__ import annotations
+import asyncio
+import json
+import multiprocessing
+import queue as queue_module
+import time
+from typing import Any, Callable
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from logger import logger
+from utils.metrics import collect_metrics, register_metrics
+from utils.update_queue import UpdateQueue, update_affinity_key
+
+
+async def consume_updates(
+    updates: multiprocessing.Queue,
+    dispatcher: Dispatcher,
+    bot: Bot,
+    concurrency: int = 64,
+    backlog: int = 1000,
+):
+    """
+    Feed raw updates from a cluster queue into the dispatcher until the stop sentinel arrives.
+
+    Updates go through an `UpdateQueue`, so a chat's updates are handled in
+    order while up to `concurrency` chats are handled at once; a slow handler
+    only holds up its own chat. Reading from the cluster queue pauses while
+    `backlog` updates are waiting, which leaves the front's 503 to push back.
+    """
+    pending = UpdateQueue(dispatcher, bot, maxsize=backlog, consumers=concurrency)
+    # A worker's updates go through this queue, not the module-level one
+    register_metrics("update_queue", pending.stats)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, updates.get)
+            if raw is None:
+                break
+            # The front only queues bodies it could parse
+            await pending.put_wait(json.loads(raw))
+    finally:
+        await pending.drain()
+
+
+async def report_metrics(index: int, reports: multiprocessing.Queue, interval: float = 5.0):
+    """
+    Send this worker's `collect_metrics()` snapshot to the front every `interval`
+    seconds, so the front's /metrics covers the whole cluster.
+    """
+    while True:
+        try:
+            reports.put_nowait((index, collect_metrics()))
+        except queue_module.Full:
+            # The front drains reports every second; a missed snapshot is replaced by the next one
+            pass
+        await asyncio.sleep(interval)
+
+
+class WebhookCluster:
+    """
+    Front side of the multi-process webhook deployment.
+
+    - `workers` processes are spawned with `target(index, queue, reports, *args)`; each
+      one usually runs `consume_updates` with its own dispatcher and `report_metrics`
+      on the shared `reports` queue.
+    - Incoming updates are routed by `update_affinity_key`, so one chat is always
+      served by the same worker and its updates stay in order.
+    - Each worker queue holds at most `queue_size` updates; when it is full the
+      front answers 503 and Telegram redelivers the update later.
+    - Dead workers are restarted by `supervise` and pick up their queue where it was left.
+    - `stats` carries the latest metrics snapshot reported by each worker.
+    """
+
+    def __init__(
+        self,
+        target: Callable[..., Any],
+        workers: int = 2,
+        queue_size: int = 1000,
+        args: tuple = (),
+    ):
+        self.target = target
+        self.workers = workers
+        self.args = args
+        self._context = multiprocessing.get_context("spawn")
+        self.queues = [self._context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.reports = self._context.Queue(maxsize=workers * 4)
+        self._worker_metrics: dict[int, tuple[float, dict]] = {}
+        self.processes: list[multiprocessing.Process | None] = [None] * workers
+        self.restarts = 0
+        self.rejected = 0
+        self._supervisor: asyncio.Task | None = None
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=self.target,
+            args=(index, self.queues[index], self.reports, *self.args),
+            name=f"webhook-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started webhook worker {index} (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def route(self, update: dict) -> int:
+        """Index of the worker responsible for `update`."""
+        return update_affinity_key(update) % self.workers
+
+    def dispatch(self, raw: bytes, update: dict) -> bool:
+        """Queue a raw update for its worker. Returns False when that worker is saturated."""
+        try:
+            self.queues[self.route(update)].put_nowait(raw)
+            return True
+        except queue_module.Full:
+            self.rejected += 1
+            return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        raw = await request.read()
+        try:
+            update = json.loads(raw)
+        except ValueError:
+            return web.Response(status=400)
+        if not self.dispatch(raw, update):
+            return web.Response(status=503)
+        return web.Response()
+
+    def collect_reports(self):
+        """Keep the latest metrics snapshot of each worker from the reports queue."""
+        while True:
+            try:
+                index, snapshot = self.reports.get_nowait()
+            except queue_module.Empty:
+                return
+            self._worker_metrics[index] = (time.monotonic(), snapshot)
+
+    def stats(self) -> dict:
+        self.collect_reports()
+        now = time.monotonic()
+        return {
+            "workers": self.workers,
+            "restarts": self.restarts,
+            "rejected": self.rejected,
+            "per_worker": {
+                index: {"age_s": round(now - received_at, 1), **snapshot}
+                for index, (received_at, snapshot) in sorted(self._worker_metrics.items())
+            },
+        }
+
+    async def supervise(self, interval: float = 1.0):
+        while True:
+            await asyncio.sleep(interval)
+            self.collect_reports()
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.warning(f"Webhook worker {index} exited with code {process.exitcode}, restarting")
+                    self.restarts += 1
+                    self._spawn(index)
+
+    def stop(self, timeout: float = 10):
+        """Ask workers to finish their queues, then terminate the ones that do not exit in time."""
+        for updates in self.queues:
+            try:
+                updates.put(None, timeout=timeout)
+            except queue_module.Full:
+                pass
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"Webhook worker {process.name} did not stop in time, terminating")
+                process.terminate()
+
+    def register(self, app: web.Application, path: str):
+        """Serve `path` from the front process and tie the workers to the app lifecycle."""
+        app.router.add_post(path, self.handle)
+
+        async def on_startup(app: web.Application):
+            self.start()
+            self._supervisor = asyncio.create_task(self.supervise())
+
+        async def on_cleanup(app: web.Application):
+            if self._supervisor is not None:
+                self._supervisor.cancel()
+            await asyncio.get_running_loop().run_in_executor(None, self.stop)
+
+        app.on_startup.append(on_startup)
+        app.on_cleanup.append(on_cleanup)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+import re
+import secrets
+from typing import Awaitable, Callable
+
+from aiohttp import web
+
+from utils.cache import TTLCache
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Telegram sends update_id as the first field, so it is found without parsing the body
+_UPDATE_ID = re.compile(rb'"update_id"\s*:\s*(\d+)')
+
+
+class WebhookGuard:
+    """
+    aiohttp middleware in front of the webhook route.
+
+    - Requests without the configured secret token are answered 401 before the body is read.
+    - Update ids are remembered in a bounded cache as soon as they are checked, so
+      Telegram redeliveries, even ones racing the first delivery, are acknowledged
+      without being handled again. An id whose handling fails is forgotten, so
+      Telegram's retry of it goes through.
+    """
+
+    def __init__(self, path: str, secret_token: str | None = None, seen_size: int = 10000, seen_ttl: int = 3600):
+        self.path = path
+        self.secret_token = secret_token
+        self._seen = TTLCache("webhook_seen_updates", max_size=seen_size, ttl=seen_ttl)
+        self.accepted = 0
+        self.rejected = 0
+        self.duplicates = 0
+
+    def verify_secret(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        return secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token)
+
+    @web.middleware
+    async def middleware(
+        self,
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        if request.path != self.path or request.method != "POST":
+            return await handler(request)
+
+        if not self.verify_secret(request):
+            self.rejected += 1
+            return web.Response(body="Unauthorized", status=401)
+
+        # aiohttp keeps the body, so the webhook handler reads it again for free
+        match = _UPDATE_ID.search(await request.read(), 0, 64)
+        update_id = int(match.group(1)) if match else None
+        if update_id is not None:
+            if update_id in self._seen:
+                self.duplicates += 1
+                return web.json_response({})
+            # Recorded before the first await, so a concurrent redelivery sees it
+            self._seen.set(update_id, True)
+
+        try:
+            response = await handler(request)
+        except BaseException:
+            if update_id is not None:
+                self._seen.pop(update_id)
+            raise
+        if update_id is not None and response.status >= 300:
+            self._seen.pop(update_id)
+        self.accepted += 1
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "duplicates": self.duplicates,
+        }
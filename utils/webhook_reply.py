@@ -0,0 +1,73 @@
+from __future__ import annotations
+from contextvars import ContextVar
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+
+class ReplySlot:
+    """Holds the one Bot API call that may still ride on the current webhook response."""
+
+    def __init__(self):
+        self.method: TelegramMethod | None = None
+        self.open = True
+
+
+_reply_slot: ContextVar[ReplySlot | None] = ContextVar("webhook_reply_slot", default=None)
+
+
+def current_reply_slot() -> ReplySlot | None:
+    """Slot of the update being handled, or None when it is not answered through the webhook."""
+    slot = _reply_slot.get()
+    return slot if slot is not None and slot.open else None
+
+
+class ReplyRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler that waits for the dispatcher and sends the final Bot API
+    call of the update back as the HTTP response instead of a separate request.
+
+    The call comes either from the handler's return value or from `answer_last`.
+    `fast_path` counts updates answered this way, `updates` all handled updates.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=False, **kwargs)
+        self.updates = 0
+        self.fast_path = 0
+
+    async def _handle_request(self, bot: Bot, request: web.Request) -> web.Response:
+        slot = ReplySlot()
+        token = _reply_slot.set(slot)
+        try:
+            result = await self.dispatcher.feed_webhook_update(
+                bot,
+                await request.json(loads=bot.session.json_loads),
+                **self.data,
+            )
+        finally:
+            # Anything deferred after this point (slow handler moved to background) is sent directly
+            slot.open = False
+            _reply_slot.reset(token)
+
+        deferred = slot.method
+        if isinstance(result, TelegramMethod):
+            if deferred is not None:
+                await self.dispatcher.silent_call_request(bot=bot, result=deferred)
+        else:
+            result = deferred
+
+        self.updates += 1
+        if result is not None:
+            self.fast_path += 1
+        return web.Response(body=self._build_response_writer(bot=bot, result=result))
+
+    def stats(self) -> dict:
+        return {
+            "updates": self.updates,
+            "fast_path": self.fast_path,
+            "fast_path_ratio": round(self.fast_path / self.updates, 4) if self.updates else 0.0,
+        }